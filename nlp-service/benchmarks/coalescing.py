@@ -0,0 +1,58 @@
+"""
+Bursts of identical concurrent queries, as when a shared dashboard loads in many browsers,
+with and without request coalescing. Reports the pipeline runs and the wall time per burst.
+The result cache is disabled so every run parses.
+
+    python benchmarks/coalescing.py [--burst 50] [--bursts 20] [--tables 500]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# Must be set before main is imported
+os.environ["RESULT_CACHE_MAX_ENTRIES"] = "0"
+
+from synthetic import CORPUS, main, synthetic_context  # noqa: E402
+
+
+async def measure(process, texts, burst, bursts, fingerprint, args):
+    completed = main.pipeline_executor.completed
+    started = time.perf_counter()
+    for i in range(bursts):
+        text = texts[i % len(texts)]
+        await asyncio.gather(*(process(text, fingerprint, args, False) for _ in range(burst)))
+    elapsed = time.perf_counter() - started
+    return main.pipeline_executor.completed - completed, elapsed / bursts * 1e3
+
+
+async def run(args):
+    context = synthetic_context(args.tables)
+    relationships = [main.TableRelationship(**rel) for rel in context["relationships"]]
+    schema_args = (context["schema"], relationships, context["tableAliases"], context["columnAliases"],
+                   context["businessMetrics"])
+    fingerprint = main.schema_fingerprint(*schema_args)
+    main.load_nlp_resources()
+    await main.pipeline_executor.start()
+    try:
+        texts = [text for lang, text in CORPUS if lang == "en"]
+        await main.process_text(texts[0], fingerprint, schema_args)  # Build the parser
+
+        print(f"{'mode':<12} {'burst':>6} {'pipeline runs':>14} {'ms/burst':>9}")
+        for name, process in (("independent", main.compute_response), ("coalesced", main.process_text)):
+            runs, per_burst = await measure(process, texts, args.burst, args.bursts, fingerprint, schema_args)
+            print(f"{name:<12} {args.burst:>6} {runs:>14} {per_burst:>9.1f}")
+    finally:
+        main.pipeline_executor.shutdown()
+
+
+def main_cli():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--burst", type=int, default=50, help="identical concurrent requests per burst")
+    arg_parser.add_argument("--bursts", type=int, default=20)
+    arg_parser.add_argument("--tables", type=int, default=500, help="size of the synthetic schema")
+    asyncio.run(run(arg_parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
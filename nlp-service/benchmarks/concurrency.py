@@ -0,0 +1,113 @@
+"""
+Multi-core scaling of the CPU-bound query pipeline (clean, parse, generate) under concurrent
+load, inline on the event loop and on thread and process pools of growing size.
+
+For each pool size, reports throughput, the speedup over one worker of the same mode and the
+scaling efficiency (speedup per worker; 1.0 is linear). Pools larger than the CPUs this
+process may run on cannot scale further, so the default sizes stop there. The serving
+process CPU column is its CPU time per wall second: thread pools stay near 1.0 because
+parsing holds the GIL, and for process pools it shows how close the event loop dispatching
+jobs comes to saturating its core. Also reports the worst event loop stall seen while the
+load runs, which is what other connections of the same uvicorn worker experience. The
+result cache is disabled so every query is parsed.
+
+    python benchmarks/concurrency.py [--workers 1,2,4,8] [--tables 500] [--seconds 5]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# Must be set before main is imported, here and in spawned pool processes
+os.environ["RESULT_CACHE_MAX_ENTRIES"] = "0"
+
+from synthetic import CORPUS, main, synthetic_context  # noqa: E402
+
+
+def usable_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+async def loop_stall(stop, interval=0.001):
+    """Longest delay past `interval` seen by a task that only sleeps, in milliseconds"""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst * 1e3
+
+
+async def measure(mode, workers, context, seconds):
+    """(queries per second, serving process CPU per wall second, worst loop stall in ms)"""
+    args = (context["schema"], [main.TableRelationship(**rel) for rel in context["relationships"]],
+            context["tableAliases"], context["columnAliases"], context["businessMetrics"])
+    fingerprint = main.schema_fingerprint(*args)
+    executor = main.PipelineExecutor(mode, workers, queue_depth=0)
+    await executor.start()
+    try:
+        texts = [text for _, text in CORPUS]
+
+        # Warm every worker: NLTK resources and the parser for this schema. Jobs go to
+        # whichever process is free, so send several rounds per worker
+        for _ in range(4):
+            await asyncio.gather(*(executor.run(text, fingerprint, args, False) for text in texts * max(1, workers)))
+
+        # Keep every worker busy: one round in flight per worker until time runs out
+        stop = asyncio.Event()
+        stall = asyncio.create_task(loop_stall(stop))
+        queries = 0
+        cpu_started = time.process_time()
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            batch = texts * max(1, workers)
+            await asyncio.gather(*(executor.run(text, fingerprint, args, False) for text in batch))
+            queries += len(batch)
+        elapsed = time.perf_counter() - started
+        cpu = (time.process_time() - cpu_started) / elapsed
+        stop.set()
+        return queries / elapsed, cpu, await stall
+    finally:
+        executor.shutdown()
+
+
+async def run(args):
+    context = synthetic_context(args.tables)
+    main.load_nlp_resources()
+    cpus = usable_cpus()
+    sizes = [int(n) for n in args.workers.split(",")]
+    print(f"{cpus} usable CPUs, {args.tables} tables, {args.seconds:g} s per measurement\n")
+
+    print(f"{'mode':<8} {'workers':>7} {'qps':>9} {'vs inline':>9} {'speedup':>8} {'efficiency':>10} "
+          f"{'serving cpu':>11} {'max loop stall ms':>18}")
+    inline, cpu, stall = await measure("inline", 1, context, args.seconds)
+    print(f"{'inline':<8} {'-':>7} {inline:>9.1f} {1.0:>9.2f} {'-':>8} {'-':>10} {cpu:>11.2f} {stall:>18.1f}")
+    for mode in ("thread", "process"):
+        single = None
+        for workers in sizes:
+            qps, cpu, stall = await measure(mode, workers, context, args.seconds)
+            if single is None:
+                single = qps / workers  # Per-worker throughput of the smallest pool
+            speedup = qps / single
+            print(f"{mode:<8} {workers:>7} {qps:>9.1f} {qps / inline:>9.2f} {speedup:>8.2f} "
+                  f"{speedup / workers:>10.2f} {cpu:>11.2f} {stall:>18.1f}")
+    if max(sizes) > cpus:
+        print(f"\npools of more than {cpus} workers share CPUs, so their speedup is capped at {cpus}")
+
+
+def main_cli():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    cpus = usable_cpus()
+    default_workers = sorted({1, cpus} | {n for n in (2, 4, 8, 16) if n < cpus})
+    arg_parser.add_argument("--workers", default=",".join(str(n) for n in default_workers),
+                            help="pool sizes to measure, smallest first (default: powers of two up to the usable CPUs)")
+    arg_parser.add_argument("--tables", type=int, default=500, help="size of the synthetic schema")
+    arg_parser.add_argument("--seconds", type=float, default=5.0, help="minimum duration of each measurement")
+    asyncio.run(run(arg_parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,63 @@
+"""
+Per-query latency and accuracy of LanguageDetector over the shared corpus and native-script
+samples of the other Indic languages it recognizes.
+
+    python benchmarks/language_detection.py [--repeat 2000]
+"""
+import argparse
+import time
+
+from synthetic import CORPUS, main
+
+SAMPLES = [
+    ("ta", "அனைத்து வாடிக்கையாளர்களையும் காட்டு"),
+    ("te", "అన్ని ఆర్డర్లను చూపించు"),
+    ("bn", "সব গ্রাহক দেখাও"),
+    ("gu", "બધા ગ્રાહકો બતાવો"),
+    ("ml", "എല്ലാ ഉപഭോക്താക്കളെയും കാണിക്കുക"),
+    ("pa", "ਸਾਰੇ ਗਾਹਕ ਦਿਖਾਓ"),
+    ("hi-Latn", "pichhle hafte kitni bikri hui"),
+    ("hi-Latn", "delhi wale customers ka total nikalo"),
+    # English with Indian names and brands stays on the English path
+    ("en", "show mahindra tata and bajaj vehicles"),
+    ("en", "show karan johar films"),
+    ("en", "list customers in pune chennai and bengaluru"),
+    ("en", "orders placed by priya sharma last month"),
+]
+
+# Romanized Hindi is sent for translation as Hindi; romanized Kannada has no model and
+# stays on the English path
+EXPECTED = {"hi-Latn": "hi", "kn-Latn": "en"}
+
+
+def main_cli():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=2000, help="timed detections per query")
+    args = arg_parser.parse_args()
+
+    started = time.perf_counter()
+    detector = main.LanguageDetector()
+    build_ms = (time.perf_counter() - started) * 1e3
+    print(f"detector built in {build_ms:.1f} ms\n")
+
+    print(f"{'label':<8} {'detected':<9} {'confidence':>10} {'us/query':>9}  text")
+    samples = []
+    correct = 0
+    queries = CORPUS + SAMPLES
+    for label, text in queries:
+        detector.detect(text)  # Warm the word votes, as for a repeated query
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            language, confidence = detector.detect(text)
+        per_query = (time.perf_counter() - started) / args.repeat * 1e6
+        samples.append(per_query)
+        correct += language == EXPECTED.get(label, label)
+        print(f"{label:<8} {language:<9} {confidence:>10.2f} {per_query:>9.2f}  {text}")
+
+    samples.sort()
+    print(f"\naccuracy {correct}/{len(queries)}, mean {sum(samples) / len(samples):.2f} us, "
+          f"max {samples[-1]:.2f} us per query")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,54 @@
+"""
+Coverage and latency of the offline phrase-table translation tier over the non-English
+corpus, and the share of those queries it would serve without calling the translation API.
+
+    python benchmarks/local_translation.py [--repeat 2000] [--min-coverage 0.8]
+"""
+import argparse
+import time
+
+from synthetic import CORPUS, main
+
+SAMPLES = [
+    ("hi", "स्थिति के अनुसार ऑर्डर गिनें"),
+    ("hi", "श्रेणी के अनुसार उत्पादों की औसत कीमत"),
+    ("hi", "इस साल के लंबित ऑर्डर दिखाओ"),
+    ("hi", "जिनकी कुल राशि 150 से ज़्यादा है वे ऑर्डर दिखाओ"),
+    ("kn", "ಸ್ಥಿತಿ ಪ್ರಕಾರ ಆರ್ಡರ್‌ಗಳನ್ನು ಎಣಿಸಿ"),
+    ("kn", "ವರ್ಗದ ಪ್ರಕಾರ ಉತ್ಪನ್ನಗಳ ಸರಾಸರಿ ಬೆಲೆ"),
+    ("kn", "ಈ ವರ್ಷದ ಬಾಕಿ ಆರ್ಡರ್‌ಗಳನ್ನು ತೋರಿಸಿ"),
+    ("hi-Latn", "pichhle mahine ke orders dikhao"),
+]
+
+
+def main_cli():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=2000, help="timed translations per query")
+    arg_parser.add_argument("--min-coverage", type=float, default=main.LOCAL_TRANSLATION_MIN_COVERAGE)
+    args = arg_parser.parse_args()
+
+    detector = main.LanguageDetector()
+    translator = main.PhraseTranslator(detector=detector)
+
+    print(f"{'label':<8} {'coverage':>8} {'tier':<6} {'us/query':>9}  translation")
+    local = total = 0
+    for label, text in [(label, text) for label, text in CORPUS if label != "en"] + SAMPLES:
+        language, _ = detector.detect(text)
+        if language == "en":
+            continue
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            result = translator.translate(text, language)
+        per_query = (time.perf_counter() - started) / args.repeat * 1e6
+
+        translation, coverage = result if result is not None else (text, 0.0)
+        tier = "local" if coverage >= args.min_coverage else "remote"
+        local += tier == "local"
+        total += 1
+        print(f"{label:<8} {coverage:>8.2f} {tier:<6} {per_query:>9.2f}  {translation}")
+
+    print(f"\nserved locally: {local}/{total} ({100 * local / total:.0f}%) at min coverage {args.min_coverage}")
+
+
+if __name__ == "__main__":
+    main_cli()
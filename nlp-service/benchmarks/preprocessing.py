@@ -0,0 +1,72 @@
+"""
+Per-query cost of TextPreprocessor.clean_text with the NLTK and regex tokenizer backends,
+with and without the lemma cache, and a check that every backend produces the same cleaned
+text as nltk.word_tokenize without caching on the corpus and generated queries.
+
+    python benchmarks/preprocessing.py [--rounds 50] [--generated 2000]
+"""
+import argparse
+import random
+import time
+
+from synthetic import CORPUS, main
+
+# Words and symbols mixed into generated queries, including the comparison characters the
+# cleaner keeps and the contractions the Treebank tokenizer splits
+VOCABULARY = ("show list count the top 10 customers orders products by revenue total amount >= <= != = > < ! "
+              "greater than less from last month this year where status is pending cannot gonna wanna , . ? "
+              "( ) 's don't average price per category having more 150 1,000 order_date total_amount").split()
+
+
+def generated_queries(count, seed=7):
+    rng = random.Random(seed)
+    joiners = [" ", " ", " ", ""]
+    queries = []
+    for _ in range(count):
+        words = [rng.choice(VOCABULARY) for _ in range(rng.randint(1, 12))]
+        queries.append("".join(word + rng.choice(joiners) for word in words).strip())
+    return queries
+
+
+def time_backend(preprocessor, queries, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for query in queries:
+            preprocessor.clean_text(query)
+    return (time.perf_counter() - started) / (rounds * len(queries)) * 1e6
+
+
+def main_cli():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--rounds", type=int, default=50, help="timed passes over the corpus")
+    arg_parser.add_argument("--generated", type=int, default=2000, help="generated queries in the identity check")
+    args = arg_parser.parse_args()
+
+    main.ensure_nltk_resources()
+    corpus = [text for _, text in CORPUS]
+    backends = {
+        "nltk, no cache": main.TextPreprocessor("nltk", lemma_cache_size=0),
+        "nltk, cached": main.TextPreprocessor("nltk"),
+        "regex, no cache": main.TextPreprocessor("regex", lemma_cache_size=0),
+        "regex, cached": main.TextPreprocessor("regex"),
+    }
+    reference = backends["nltk, no cache"]
+    for preprocessor in backends.values():
+        preprocessor.clean_text(corpus[0])  # Load WordNet outside the timings
+
+    checked = corpus + generated_queries(args.generated)
+    expected = [reference.clean_text(query) for query in checked]
+
+    print(f"{'backend':<16} {'us/query':>9} {'speedup':>8} {'mismatches':>11}")
+    baseline = None
+    for name, preprocessor in backends.items():
+        mismatches = [query for query, cleaned in zip(checked, expected) if preprocessor.clean_text(query) != cleaned]
+        per_query = time_backend(preprocessor, corpus, args.rounds)
+        baseline = baseline or per_query
+        print(f"{name:<16} {per_query:>9.1f} {baseline / per_query:>8.1f} {len(mismatches):>7}/{len(checked)}")
+        for query in mismatches[:3]:
+            print(f"  {query!r}: {preprocessor.clean_text(query)!r} != {reference.clean_text(query)!r}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,86 @@
+"""
+Condition rule tables against searching each pattern on its own, over the shared corpus and
+amount range queries ("amount at least 100 and at most 500") whose rules overlap. Reports
+the queries where a RuleSet disagrees with the per-pattern scan, and the time per query.
+
+    python benchmarks/rule_tables.py [--repeat 200]
+"""
+import argparse
+import itertools
+import re
+import sys
+import time
+
+from synthetic import CORPUS, main
+
+BOUNDS = ["greater than", "more than", "above", "exceeds", "less than", "below", "under", "at least",
+          "no less than", "at most", "no more than", ">", "<", ">=", "<="]
+SUBJECTS = ["show order amount", "list order value", "total amount", "orders with price",
+            "show orders where total amount", "products where price"]
+
+# Kinds whose first match wins; every other kind reports all of its matches
+FIRST_MATCH = {"direct_amount"}
+
+
+def range_queries():
+    return [f"{subject} {low} 100 and {high} 500"
+            for subject in SUBJECTS for low, high in itertools.permutations(BOUNDS, 2)]
+
+
+def per_pattern(rules, text, first):
+    """Reference scan: each pattern searched on its own, in table order"""
+    found = []
+    for pattern, output in rules:
+        for match in re.finditer(pattern, text, re.IGNORECASE):
+            if first:
+                return [(output, match.groups())]
+            found.append((output, match.groups()))
+    return found
+
+
+def rule_set(rules, text, first):
+    if first:
+        match = rules.search(text)
+        return [match] if match else []
+    return list(rules.finditer(text))
+
+
+def main_cli():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=200, help="timed passes over the queries")
+    args = arg_parser.parse_args()
+
+    texts = [text for _, text in CORPUS] + range_queries()
+    tables = {
+        "direct_amount": main.DIRECT_AMOUNT_RULES, "amount": main.AMOUNT_RULES,
+        "comparison": main.COMPARISON_RULES, "date_range": main.DATE_RANGE_RULES, "like": main.LIKE_RULES,
+        "status": main.STATUS_RULES, "having": main.HAVING_RULES, "having_count": main.HAVING_COUNT_RULES,
+        "order": main.ORDER_RULES,
+    }
+
+    print(f"{len(texts)} queries\n")
+    print(f"{'kind':<14} {'mismatches':>10} {'pattern us':>11} {'ruleset us':>11}")
+    failed = 0
+    for kind, rules in tables.items():
+        first = kind in FIRST_MATCH
+        compiled = main.RULE_SETS[kind]
+        mismatches = [text for text in texts
+                      if per_pattern(rules, text, first) != rule_set(compiled, text, first)]
+        failed += len(mismatches)
+
+        timings = []
+        for scan, table in ((per_pattern, rules), (rule_set, compiled)):
+            started = time.perf_counter()
+            for _ in range(args.repeat):
+                for text in texts:
+                    scan(table, text, first)
+            timings.append((time.perf_counter() - started) / (args.repeat * len(texts)) * 1e6)
+        print(f"{kind:<14} {len(mismatches):>10} {timings[0]:>11.2f} {timings[1]:>11.2f}")
+        for text in mismatches[:3]:
+            print(f"    {text}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
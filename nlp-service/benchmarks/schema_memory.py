@@ -0,0 +1,52 @@
+"""
+Memory held per cached schema context: the parser cache's own estimate next to the bytes
+tracemalloc sees allocated while building parsers, and the reserve the cache adds for the
+memos a parser fills in use. Covers single schemas of growing size and many distinct
+schema contexts built from the same identifiers (as when one service caches a context per
+tenant database).
+
+    python benchmarks/schema_memory.py [--sizes 10,100,1000,5000] [--contexts 50] [--context-tables 100]
+"""
+import argparse
+import gc
+import tracemalloc
+
+from synthetic import build_parser, main, synthetic_context
+
+
+def traced_build(contexts):
+    """Parsers for the contexts and the bytes still allocated once they are all built"""
+    gc.collect()
+    tracemalloc.start()
+    parsers = [build_parser(context) for context in contexts]
+    gc.collect()
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return parsers, traced
+
+
+def main_cli():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--sizes", default="10,100,1000,5000")
+    arg_parser.add_argument("--contexts", type=int, default=50, help="distinct schema contexts in the shared run")
+    arg_parser.add_argument("--context-tables", type=int, default=100, help="tables per context in the shared run")
+    args = arg_parser.parse_args()
+
+    print(f"{'tables':>7} {'estimate KiB':>13} {'traced KiB':>11} {'traced B/table':>15} {'memo reserve KiB':>17}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        # Schema contexts arrive as parsed JSON, so build the context outside the trace
+        context = synthetic_context(size)
+        (parser,), traced = traced_build([context])
+        print(f"{size:>7} {main.estimate_size(parser) / 1024:>13.1f} {traced / 1024:>11.1f} {traced / size:>15.0f} "
+              f"{parser.memo_reserve() / 1024:>17.1f}")
+
+    # Different seeds give different table mixes over the same identifier vocabulary
+    contexts = [synthetic_context(args.context_tables, seed=seed) for seed in range(args.contexts)]
+    parsers, traced = traced_build(contexts)
+    estimate = sum(main.estimate_size(parser) for parser in parsers) / len(parsers)
+    print(f"\n{args.contexts} contexts of {args.context_tables} tables: "
+          f"estimate {estimate / 1024:.1f} KiB, traced {traced / len(parsers) / 1024:.1f} KiB per cached schema")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,160 @@
+"""
+Parse + SQL generation benchmark over synthetic schemas and a fixed multilingual corpus.
+
+Each configuration builds one parser from a synthetic schema context, then runs
+EnhancedIntentParser.parse_intent and EnhancedSQLGenerator.generate_sql over the corpus.
+Reports throughput, p50/p99 latency and peak traced memory, and writes everything as
+JSON so runs from different commits can be compared:
+
+    python benchmarks/suite.py --output before.json
+    python benchmarks/suite.py --output after.json --compare before.json
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+
+from synthetic import CORPUS, build_parser, main, synthetic_context
+
+# (tables, columns per table, foreign key depth)
+DEFAULT_CONFIGS = [
+    (10, 6, 2),
+    (100, 8, 3),
+    (500, 8, 6),
+    (2000, 12, 6),
+]
+
+
+def percentile(sorted_samples, q):
+    return sorted_samples[min(len(sorted_samples) - 1, int(q * len(sorted_samples)))]
+
+
+def run_corpus(parser, generator):
+    """One pass over the corpus; returns per-query latencies in microseconds by language"""
+    latencies = {}
+    for lang, text in CORPUS:
+        started = time.perf_counter()
+        generator.generate_sql(parser.parse_intent(text.lower()))
+        latencies.setdefault(lang, []).append((time.perf_counter() - started) * 1e6)
+    return latencies
+
+
+def benchmark(tables, columns, depth, rounds, warmup):
+    context = synthetic_context(tables, columns, depth)
+    generator = main.EnhancedSQLGenerator()
+
+    # Peak memory of building the parser and one pass over the corpus, measured in a
+    # separate run because tracing slows everything down
+    gc.collect()
+    tracemalloc.start()
+    parser = build_parser(context)
+    run_corpus(parser, generator)
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    gc.collect()
+    started = time.perf_counter()
+    parser = build_parser(context)
+    build_ms = (time.perf_counter() - started) * 1e3
+
+    for _ in range(warmup):
+        run_corpus(parser, generator)
+
+    by_language = {}
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for lang, samples in run_corpus(parser, generator).items():
+            by_language.setdefault(lang, []).extend(samples)
+    elapsed = time.perf_counter() - started
+
+    samples = sorted(sample for values in by_language.values() for sample in values)
+    return {
+        "name": f"t{tables}-c{columns}-d{depth}",
+        "tables": tables,
+        "columns": columns,
+        "depth": depth,
+        "relationships": len(context["relationships"]),
+        "build_ms": round(build_ms, 3),
+        "queries": len(samples),
+        "throughput_qps": round(len(samples) / elapsed, 1),
+        "p50_us": round(percentile(samples, 0.50), 1),
+        "p99_us": round(percentile(samples, 0.99), 1),
+        "peak_memory_bytes": peak_bytes,
+        "by_language": {
+            lang: {"p50_us": round(percentile(sorted(values), 0.50), 1),
+                   "p99_us": round(percentile(sorted(values), 0.99), 1)}
+            for lang, values in sorted(by_language.items())
+        },
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_comparison(results, baseline):
+    previous = {config["name"]: config for config in baseline["configs"]}
+    print(f"\ncompared with {baseline.get('revision') or 'baseline'}:")
+    for config in results["configs"]:
+        before = previous.get(config["name"])
+        if before is None:
+            continue
+        changes = []
+        for key in ("throughput_qps", "p50_us", "p99_us", "peak_memory_bytes"):
+            if before[key]:
+                changes.append(f"{key} {100 * (config[key] - before[key]) / before[key]:+.1f}%")
+        print(f"  {config['name']:<18} " + "  ".join(changes))
+
+
+def main_cli():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--configs", help="comma separated tables:columns:depth, e.g. 10:6:2,1000:8:4")
+    arg_parser.add_argument("--rounds", type=int, default=40, help="timed passes over the corpus per configuration")
+    arg_parser.add_argument("--warmup", type=int, default=3)
+    arg_parser.add_argument("--output", help="write results as JSON to this path")
+    arg_parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = arg_parser.parse_args()
+
+    configs = DEFAULT_CONFIGS
+    if args.configs:
+        configs = [tuple(int(part) for part in config.split(":")) for config in args.configs.split(",")]
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "corpus_size": len(CORPUS),
+        "rounds": args.rounds,
+        "configs": [],
+    }
+
+    print(f"{'config':<18} {'build ms':>9} {'qps':>9} {'p50 us':>8} {'p99 us':>8} {'peak KiB':>9}")
+    for tables, columns, depth in configs:
+        config = benchmark(tables, columns, depth, args.rounds, args.warmup)
+        results["configs"].append(config)
+        print(f"{config['name']:<18} {config['build_ms']:>9.1f} {config['throughput_qps']:>9.1f} "
+              f"{config['p50_us']:>8.1f} {config['p99_us']:>8.1f} {config['peak_memory_bytes'] / 1024:>9.0f}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_comparison(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,130 @@
+"""
+Synthetic schema contexts and the fixed query corpus shared by the benchmarks.
+
+A schema context is the request-level payload /process-query accepts: schema,
+relationships, tableAliases, columnAliases and businessMetrics.
+"""
+import os
+import random
+import re
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import main  # noqa: E402
+
+BASE_SCHEMA = {
+    "customers": ["customer_id", "name", "email", "city", "created_at"],
+    "orders": ["order_id", "customer_id", "order_date", "total_amount", "status"],
+    "products": ["product_id", "name", "category", "price", "stock_quantity"],
+    "order_items": ["item_id", "order_id", "product_id", "quantity", "price"],
+}
+BASE_RELATIONSHIPS = [
+    {"tables": ["customers", "orders"], "joinCondition": {"left": "customer_id", "right": "customer_id"}},
+    {"tables": ["orders", "order_items"], "joinCondition": {"left": "order_id", "right": "order_id"}},
+    {"tables": ["order_items", "products"], "joinCondition": {"left": "product_id", "right": "product_id"}},
+]
+BASE_TABLE_ALIASES = {"customer": "customers", "client": "customers", "order": "orders", "purchase": "orders",
+                      "product": "products", "item": "order_items"}
+BASE_COLUMN_ALIASES = {"total_amount": ["amount", "total", "revenue"], "status": ["status", "state"],
+                       "city": ["city", "location"], "category": ["category", "type"]}
+BASE_METRICS = {"revenue": "SUM(orders.total_amount)", "average order value": "AVG(orders.total_amount)",
+                "customer count": "COUNT(DISTINCT customers.customer_id)"}
+
+DOMAINS = ["sales", "finance", "hr", "logistics", "marketing", "support", "billing", "inventory", "audit", "web"]
+ENTITIES = ["ledger", "invoice", "shipment", "campaign", "ticket", "employee", "vendor", "warehouse", "session",
+            "payment", "contract", "asset", "region", "forecast", "event"]
+ATTRIBUTES = ["code", "label", "amount", "updated_at", "owner", "score", "region_code", "batch", "notes", "flag",
+              "balance", "quantity", "due_date", "priority", "channel", "currency", "rate", "weight", "source",
+              "created_at"]
+NUMERIC_ATTRIBUTES = {"amount", "score", "balance", "quantity", "rate", "weight"}
+
+# Fixed corpus: (language, text). Non-English entries are fed to the parser untranslated,
+# which is what happens when the translation API is unavailable.
+CORPUS = [
+    ("en", "show all customers"),
+    ("en", "show top 10 customers by revenue"),
+    ("en", "list orders from last month"),
+    ("en", "show orders that have total amount greater than 150"),
+    ("en", "count orders by status"),
+    ("en", "show completed orders"),
+    ("en", "show pending orders this year"),
+    ("en", "customers with more than 5 orders"),
+    ("en", "average price of products by category"),
+    ("en", "list products where category like electronics"),
+    ("en", "sort orders by order date descending"),
+    ("en", "show customers from city = london"),
+    ("en", "total revenue by customer having total amount greater than 1000"),
+    ("en", "bottom 5 products by stock quantity"),
+    ("en", "how many orders were shipped in the past 30 days"),
+    ("en", "show invoice amount by region"),
+    ("hi", "सभी ग्राहक दिखाएं"),
+    ("hi", "पिछले महीने के ऑर्डर दिखाओ"),
+    ("hi", "राजस्व के अनुसार शीर्ष 10 ग्राहक"),
+    ("hi", "स्थिति के अनुसार ऑर्डर गिनें"),
+    ("kn", "ಎಲ್ಲಾ ಗ್ರಾಹಕರನ್ನು ತೋರಿಸಿ"),
+    ("kn", "ಕಳೆದ ತಿಂಗಳ ಆರ್ಡರ್‌ಗಳನ್ನು ತೋರಿಸಿ"),
+    ("kn", "ಆದಾಯದ ಪ್ರಕಾರ ಟಾಪ್ 10 ಗ್ರಾಹಕರು"),
+    ("hi-Latn", "sabhi orders dikhao jinka total amount 150 se zyada hai"),
+    ("kn-Latn", "ella customers na city prakara thorisi"),
+]
+
+
+def synthetic_context(tables, columns=6, depth=3, seed=7):
+    """
+    Request-level schema context with `tables` tables of about `columns` columns each.
+    Generated tables hang off a foreign key tree at most `depth` levels deep, and come
+    with matching table aliases, column aliases and business metrics.
+    """
+    rng = random.Random(seed)
+    schema = {table: list(cols) for table, cols in list(BASE_SCHEMA.items())[:tables]}
+    relationships = [rel for rel in BASE_RELATIONSHIPS if all(t in schema for t in rel["tables"])]
+    table_aliases = {alias: table for alias, table in BASE_TABLE_ALIASES.items() if table in schema}
+    column_aliases = dict(BASE_COLUMN_ALIASES)
+    metrics = {name: expr for name, expr in BASE_METRICS.items() if re.search(r"(\w+)\.", expr).group(1) in schema}
+
+    levels = {}  # generated table -> depth in the foreign key tree
+    i = 0
+    while len(schema) < tables:
+        entity = rng.choice(ENTITIES)
+        table = f"{rng.choice(DOMAINS)}_{entity}_{i}"
+        cols = [f"{table}_id"] + rng.sample(ATTRIBUTES, min(columns - 1, len(ATTRIBUTES)))
+
+        parents = [t for t, level in levels.items() if level < depth]
+        if parents:
+            parent = rng.choice(parents)
+            fk = f"{parent}_id"
+            cols.append(fk)
+            relationships.append({"tables": [parent, table], "joinCondition": {"left": fk, "right": fk}})
+            levels[table] = levels[parent] + 1
+        else:
+            levels[table] = 1
+
+        schema[table] = cols
+        table_aliases.setdefault(f"{entity} {i}", table)
+        for col in cols[1:]:
+            if "_" in col and col not in column_aliases:
+                column_aliases[col] = [col.replace("_", " ")]
+        numeric = [col for col in cols if col in NUMERIC_ATTRIBUTES]
+        if numeric:
+            metrics.setdefault(f"total {entity} {numeric[0]}", f"SUM({table}.{numeric[0]})")
+        i += 1
+
+    return {
+        "schema": [{table: cols} for table, cols in schema.items()],
+        "relationships": relationships,
+        "tableAliases": table_aliases,
+        "columnAliases": column_aliases,
+        "businessMetrics": metrics,
+    }
+
+
+def build_parser(context):
+    """Build an intent parser the same way /process-query does for an inline schema"""
+    return main.build_intent_parser(
+        context["schema"],
+        [main.TableRelationship(**rel) for rel in context["relationships"]],
+        context["tableAliases"],
+        context["columnAliases"],
+        context["businessMetrics"],
+    )
@@ -0,0 +1,68 @@
+"""
+Per-query parse latency as the schema grows from 10 to 5,000 tables, with and without
+candidate-table pruning.
+
+    python benchmarks/table_pruning.py [--sizes 10,100,1000,5000] [--repeat 20]
+"""
+import argparse
+import statistics
+import time
+
+from synthetic import build_parser, main, synthetic_context
+
+QUERIES = [
+    "show all customers",
+    "show top 10 customers by revenue",
+    "show orders that have total amount greater than 150",
+    "count orders by status",
+    "show pending orders this year",
+    "list products where category like electronics",
+    "customers with more than 5 orders",
+    "average price of products by category",
+    "sort orders by order date descending",
+    "show customers from city = london",
+    "sort orders by freshness",
+    "count orders by status having weight greater than 3",
+]
+
+
+def time_queries(parser, repeat):
+    samples = []
+    for _ in range(repeat):
+        for query in QUERIES:
+            # Measure cold column lookups, as for a stream of previously unseen queries
+            parser.column_index._memo.clear()
+            start = time.perf_counter()
+            parser.parse_intent(query)
+            samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def main_cli():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--sizes", default="10,100,1000,5000")
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    print(f"{'tables':>7} {'build ms':>9} {'pruned p50 us':>14} {'pruned p95 us':>14} "
+          f"{'full p50 us':>12} {'full p95 us':>12}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        context = synthetic_context(size)
+        start = time.perf_counter()
+        parser = build_parser(context)
+        build_ms = (time.perf_counter() - start) * 1e3
+
+        parser.table_ranker.limit = main.TABLE_CANDIDATE_LIMIT or 25
+        pruned = sorted(time_queries(parser, args.repeat))
+        parser.table_ranker.limit = 0
+        full = sorted(time_queries(parser, args.repeat))
+
+        def pct(samples, q):
+            return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+        print(f"{size:>7} {build_ms:>9.1f} {statistics.median(pruned):>14.1f} {pct(pruned, 0.95):>14.1f} "
+              f"{statistics.median(full):>12.1f} {pct(full, 0.95):>12.1f}")
+
+
+if __name__ == "__main__":
+    main_cli()
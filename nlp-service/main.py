@@ -1,25 +1,332 @@
 import re
+import sys
+import abc
+import json
+import hashlib
+import bisect
+import math
+import sqlite3
+import unicodedata
+import time
+import asyncio
+import threading
+import itertools
+import queue
+import uuid
+import atexit
+import logging
+import logging.handlers
+import contextvars
+import heapq
+import functools
+import multiprocessing
+import concurrent.futures
+from array import array
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 import nltk
-nltk.download('punkt')
-nltk.download('punkt_tab')
 import fastapi
 import os
-from fastapi import FastAPI, HTTPException, Body
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, Body, WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from pydantic import BaseModel, ValidationError
 from typing import List, Dict,Optional, Any
-import requests
+import httpx
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 
-# Download necessary NLTK resources
-nltk.download('punkt')
-nltk.download('stopwords')
-nltk.download('wordnet')
+# Translation API client settings (point TRANSLATE_API_URL at a stand-in server for local testing)
+TRANSLATE_API_URL = os.getenv("TRANSLATE_API_URL", "https://translation.googleapis.com/language/translate/v2")
+TRANSLATE_CONNECT_TIMEOUT = float(os.getenv("TRANSLATE_CONNECT_TIMEOUT", "2.0"))
+TRANSLATE_READ_TIMEOUT = float(os.getenv("TRANSLATE_READ_TIMEOUT", "5.0"))
+TRANSLATE_MAX_CONNECTIONS = int(os.getenv("TRANSLATE_MAX_CONNECTIONS", "20"))
+TRANSLATE_KEEPALIVE_SECONDS = float(os.getenv("TRANSLATE_KEEPALIVE_SECONDS", "30"))
 
-app = FastAPI(title="Multilingual Voice-to-PostgreSQL Query System")
+# Latin-script text is sent for translation as romanized Hindi only at or above this confidence
+LANGUAGE_MIN_CONFIDENCE = float(os.getenv("LANGUAGE_MIN_CONFIDENCE", "0.6"))
+
+# Local phrase-table translations are used when they cover at least this share of a query's
+# words; with TRANSLATE_OFFLINE set the translation API is never called
+LOCAL_TRANSLATION_MIN_COVERAGE = float(os.getenv("LOCAL_TRANSLATION_MIN_COVERAGE", "0.8"))
+TRANSLATE_OFFLINE = os.getenv("TRANSLATE_OFFLINE", "false").lower() in ("1", "true", "yes")
+# Live transcript sessions translate with the phrase tables only while the speaker talks, and
+# call the translation API once no delta has arrived for this many seconds (or on final)
+SESSION_TRANSLATE_PAUSE_SECONDS = float(os.getenv("SESSION_TRANSLATE_PAUSE_SECONDS", "0.8"))
+
+# Translation cache: in-memory LRU in front of a SQLite file that survives restarts
+# (set TRANSLATION_CACHE_PATH to an empty string to keep the cache in memory only)
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", "translation_cache.sqlite3")
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", "2048"))
+TRANSLATION_CACHE_DISK_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_DISK_MAX_ENTRIES", "100000"))
+TRANSLATION_CACHE_TTL_SECONDS = float(os.getenv("TRANSLATION_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# Parser cache limits (entries and approximate bytes held by cached schema contexts)
+PARSER_CACHE_MAX_ENTRIES = int(os.getenv("PARSER_CACHE_MAX_ENTRIES", "128"))
+PARSER_CACHE_MAX_BYTES = int(os.getenv("PARSER_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Result cache of generated SQL keyed by (schema fingerprint, cleaned query text)
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "4096"))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+
+# Schemas with more tables than this are pruned to the most relevant candidate tables
+# before the column, condition and join stages run (0 disables pruning)
+TABLE_CANDIDATE_LIMIT = int(os.getenv("TABLE_CANDIDATE_LIMIT", "25"))
+
+# Where the CPU-bound part of a query (cleaning, parsing, SQL generation) runs: "inline" on
+# the event loop, or on a "thread" or "process" pool of PIPELINE_WORKERS workers (0 = one per
+# core). Queries beyond PIPELINE_QUEUE_DEPTH queued or running jobs get a 503 (0 = no limit).
+PIPELINE_EXECUTOR = os.getenv("PIPELINE_EXECUTOR", "inline").lower()
+PIPELINE_WORKERS = int(os.getenv("PIPELINE_WORKERS", "0")) or os.cpu_count() or 1
+PIPELINE_QUEUE_DEPTH = int(os.getenv("PIPELINE_QUEUE_DEPTH", "64"))
+# Queries of one non-streaming /process-query/batch request processed at the same time
+BATCH_CONCURRENCY = max(1, int(os.getenv("BATCH_CONCURRENCY", "4")))
+
+# Maximum number of registered schema contexts kept server-side
+SCHEMA_REGISTRY_MAX_ENTRIES = int(os.getenv("SCHEMA_REGISTRY_MAX_ENTRIES", "256"))
+
+# NLTK data location; with NLTK_OFFLINE set, resources are only looked up in this
+# directory and are never downloaded
+NLTK_DATA_DIR = os.getenv("NLTK_DATA_DIR")
+NLTK_OFFLINE = os.getenv("NLTK_OFFLINE", "false").lower() in ("1", "true", "yes")
+# After a failed load, retries back off exponentially from 1 second up to this many seconds
+NLP_RETRY_MAX_SECONDS = float(os.getenv("NLP_RETRY_MAX_SECONDS", "60"))
+
+# Query tokenizer: "regex" (default) or "nltk" (word_tokenize, needs the punkt resources),
+# and the number of distinct tokens whose lemma is memoized
+TOKENIZER_BACKEND = os.getenv("TOKENIZER_BACKEND", "regex").lower()
+LEMMA_CACHE_MAX_ENTRIES = int(os.getenv("LEMMA_CACHE_MAX_ENTRIES", "10000"))
+
+# Logging: level, output format ("json" or "text") and the size of the in-memory queue
+# drained by the background log writer (records are dropped, not blocked on, when full)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Per-stage latency histograms and counters exposed on GET /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Individual extract stages are timed on one in this many parses to keep overhead low
+METRICS_EXTRACTOR_SAMPLE_EVERY = max(1, int(os.getenv("METRICS_EXTRACTOR_SAMPLE_EVERY", "10")))
+
+# -------- LOGGING --------
+# Correlation id of the request being handled, attached to every record logged for it
+request_id_var = contextvars.ContextVar("request_id", default="-")
+
+class RequestIdFilter(logging.Filter):
+    """Stamp records with the current request id; runs in the logging thread of the caller"""
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the log queue is full"""
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonLogFormatter(logging.Formatter):
+    """One JSON object per line, including any fields passed through `extra`"""
+    STANDARD_FIELDS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+    def format(self, record):
+        payload = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        payload.update((key, value) for key, value in vars(record).items() if key not in self.STANDARD_FIELDS)
+        return json.dumps(payload, default=str)
+
+def configure_logging():
+    """Route the service logger through a queue so request handlers never block on log I/O"""
+    output = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        output.setFormatter(JsonLogFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"))
+
+    handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(RequestIdFilter())
+
+    service_logger = logging.getLogger("nlp_service")
+    service_logger.setLevel(LOG_LEVEL)
+    service_logger.addHandler(handler)
+    service_logger.propagate = False
+
+    listener = logging.handlers.QueueListener(handler.queue, output)
+    listener.start()
+    # Flush queued records when the process exits
+    atexit.register(listener.stop)
+    return service_logger, handler, listener
+
+logger, log_handler, log_listener = configure_logging()
+
+# -------- METRICS --------
+# Latency buckets in seconds, from sub-millisecond parser stages to translation round trips
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+def format_labels(labels):
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}" if labels else ""
+
+class Histogram:
+    """
+    Prometheus-style histogram with one label. Each thread updates its own series, so
+    observations take no lock; series are merged when rendered.
+    """
+    def __init__(self, name, help_text, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._local = threading.local()  # .series: label value -> [bucket counts..., +Inf count, sum]
+        self._all_series = []  # (label value, series) of every thread
+        self._lock = threading.Lock()
+
+    def observe(self, value, seconds):
+        if not METRICS_ENABLED:
+            return
+        try:
+            series = self._local.series[value]
+        except (AttributeError, KeyError):
+            series = self._new_series(value)
+        series[bisect.bisect_left(self.buckets, seconds)] += 1
+        series[-1] += seconds
+
+    def _new_series(self, value):
+        series = [0] * (len(self.buckets) + 1) + [0.0]
+        if not hasattr(self._local, "series"):
+            self._local.series = {}
+        self._local.series[value] = series
+        with self._lock:
+            self._all_series.append((value, series))
+        return series
+
+    def observe_since(self, value, started):
+        """Record the time elapsed since `started` and return the current time for chaining"""
+        now = time.perf_counter()
+        self.observe(value, now - started)
+        return now
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        series = {}
+        with self._lock:
+            for value, counts in self._all_series:
+                merged = series.setdefault(value, [0] * len(counts))
+                for i, count in enumerate(counts):
+                    merged[i] += count
+        for value, counts in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{format_labels([(self.label, value), ('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels([(self.label, value)])} {counts[-1]}")
+            lines.append(f"{self.name}_count{format_labels([(self.label, value)])} {cumulative}")
+        return lines
+
+class Counter:
+    """Prometheus-style counter with an optional label"""
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=None, amount=1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[value] = self._values.get(value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for value, total in sorted(values.items(), key=lambda item: str(item[0])):
+            labels = [(self.label, value)] if self.label and value is not None else []
+            lines.append(f"{self.name}{format_labels(labels)} {total}")
+        return lines
+
+STAGE_SECONDS = Histogram("nl2sql_stage_seconds", "Latency of each /process-query pipeline stage", "stage")
+EXTRACTOR_SECONDS = Histogram("nl2sql_extractor_seconds", "Latency of each intent parser extract stage", "extractor")
+QUERIES_TOTAL = Counter("nl2sql_queries_total", "Queries processed, by outcome", "outcome")
+SESSION_UPDATES_TOTAL = Counter("nl2sql_session_updates_total", "Live transcript session refreshes, by outcome", "outcome")
+TRANSLATION_CALLS_TOTAL = Counter("nl2sql_translation_calls_total", "Translation API calls, by outcome", "outcome")
+COALESCED_TOTAL = Counter("nl2sql_coalesced_requests_total",
+                          "Requests served by an identical in-flight computation, by kind", "kind")
+# Histograms observed in run_pipeline, by name; pool processes return their observations
+# to the serving process, which owns /metrics
+PIPELINE_HISTOGRAMS = {histogram.name: histogram for histogram in (STAGE_SECONDS, EXTRACTOR_SECONDS)}
+METRICS = [STAGE_SECONDS, EXTRACTOR_SECONDS, QUERIES_TOTAL, SESSION_UPDATES_TOTAL, TRANSLATION_CALLS_TOTAL,
+           COALESCED_TOTAL]
+
+# -------- REQUEST COALESCING --------
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key on the event loop: the first caller starts
+    the computation as a task and later callers await the same task until it completes.
+    Callers that go away do not cancel the computation for the others.
+    """
+    def __init__(self, kind):
+        self.kind = kind
+        self._inflight = {}  # key -> task
+
+    async def run(self, key, compute):
+        """Result of compute() for the key, shared with every concurrent caller of the same key"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(functools.partial(self._done, key))
+        else:
+            COALESCED_TOTAL.inc(self.kind)
+        return await asyncio.shield(task)
+
+    def _done(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    @property
+    def inflight(self):
+        return len(self._inflight)
+
+@asynccontextmanager
+async def lifespan(app):
+    global nlp_background_retry
+    # Load and warm NLTK corpora once per process, before serving traffic
+    nlp_retry = None
+    try:
+        await asyncio.to_thread(load_nlp_resources)
+    except Exception:
+        # Keep serving so /ready can report the failure instead of crash-looping; queries
+        # get a 503 until the background retry succeeds
+        nlp_background_retry = True
+        nlp_retry = asyncio.create_task(retry_nlp_resources())
+    await asyncio.to_thread(translation_cache.open)
+    await pipeline_executor.start()
+    yield
+    if nlp_retry is not None:
+        nlp_retry.cancel()
+    await asyncio.to_thread(pipeline_executor.shutdown)
+    await language_processor.aclose()
+    await asyncio.to_thread(translation_cache.close)
+
+app = FastAPI(title="Multilingual Voice-to-PostgreSQL Query System", lifespan=lifespan)
 
 # Allow CORS for frontend communication
 from fastapi.middleware.cors import CORSMiddleware
@@ -31,24 +338,88 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_id_middleware(request, call_next):
+    """Tag every log record of a request with its X-Request-ID (generated when absent)"""
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
 class TableRelationship(BaseModel):
     tables: List[str]
     joinCondition: Dict[str, str]
 
 # Define request model
+# Either send the full schema context inline, or a schema_id returned by POST /schemas
 class QueryRequest(BaseModel):
     query: str
+    parameterized: Optional[bool] = False  # return SQL with $1..$n placeholders plus params
+    schema_id: Optional[str] = None
+    schema: Optional[List[Dict[str, Any]]] = None
+    relationships: Optional[List[TableRelationship]] = []
+    tableAliases: Optional[Dict[str, str]] = {}
+    columnAliases: Optional[Dict[str, List[str]]] = {}
+    businessMetrics: Optional[Dict[str, str]] = {}
+
+# Schema context registered once and referenced by schema_id afterwards
+class SchemaRegistration(BaseModel):
+    name: Optional[str] = None  # stable identifier of the database, e.g. its name
     schema: List[Dict[str, Any]]
     relationships: Optional[List[TableRelationship]] = []
     tableAliases: Optional[Dict[str, str]] = {}
     columnAliases: Optional[Dict[str, List[str]]] = {}
     businessMetrics: Optional[Dict[str, str]] = {}
 
+class SchemaRegistrationResponse(BaseModel):
+    schema_id: str
+    name: str
+    version: int
+    fingerprint: str
+
+# Bind value for a $n placeholder of parameterized SQL; type is the PostgreSQL type to bind it as
+class SqlParameter(BaseModel):
+    value: Any
+    type: str
+
 class QueryResponse(BaseModel):
     query: Optional[str] = None  # generated SQL query
     result: Optional[Any] = None  # result from DB execution (optional)
     success: bool
     error: Optional[str] = None
+    # Only set for parameterized requests: the values bound to $1..$n in query, and a hash
+    # of the literal-free query text that is stable across queries of the same shape
+    params: Optional[List[SqlParameter]] = None
+    template_fingerprint: Optional[str] = None
+
+# Many questions against one schema context, e.g. when replaying a saved dashboard
+class BatchQueryRequest(BaseModel):
+    queries: List[str]
+    stream: Optional[bool] = False  # stream results as NDJSON lines as each one finishes
+    parameterized: Optional[bool] = False  # return SQL with $1..$n placeholders plus params
+    schema_id: Optional[str] = None
+    schema: Optional[List[Dict[str, Any]]] = None
+    relationships: Optional[List[TableRelationship]] = []
+    tableAliases: Optional[Dict[str, str]] = {}
+    columnAliases: Optional[Dict[str, List[str]]] = {}
+    businessMetrics: Optional[Dict[str, str]] = {}
+
+class BatchQueryResponse(BaseModel):
+    results: List[QueryResponse]  # in the same order as the submitted queries
+
+# Opening message of a live transcript session on /process-query/session
+class SessionStart(BaseModel):
+    parameterized: Optional[bool] = False
+    schema_id: Optional[str] = None
+    schema: Optional[List[Dict[str, Any]]] = None
+    relationships: Optional[List[TableRelationship]] = []
+    tableAliases: Optional[Dict[str, str]] = {}
+    columnAliases: Optional[Dict[str, List[str]]] = {}
+    businessMetrics: Optional[Dict[str, str]] = {}
 
 TIME_PERIODS = {
     "today": "CURRENT_DATE = order_date",
@@ -77,329 +448,2029 @@ TIME_PERIODS = {
 
 #Text processing
 class TextPreprocessor:
-    def __init__(self):
+    # Everything but word characters, whitespace and the comparison characters <, >, = and !
+    PUNCTUATION_PATTERN = re.compile(r'[^\w\s<>=!]')
+    # On text stripped of other punctuation, nltk.word_tokenize splits off every <, > and !
+    # and splits the apostrophe-free Treebank contractions ("cannot" -> "can not")
+    TOKEN_PATTERN = re.compile(r'[<>!]|[^\s<>!]+')
+    CONTRACTION_PATTERN = re.compile(
+        r'\b(?:(can)(not)|(gim)(me)|(gon)(na)|(got)(ta)|(lem)(me)|(wan)(na)(?=[\s<>!]|$))\b')
+
+    def __init__(self, tokenizer=TOKENIZER_BACKEND, lemma_cache_size=LEMMA_CACHE_MAX_ENTRIES):
         self.stopwords = set(nltk.corpus.stopwords.words('english'))
         # Keep some question words that might be important for queries
         self.query_words = {'show', 'get', 'list', 'find', 'tell', 'give', 'what', 'which', 'when', 'where', 'how', 'many', 'top', 'by', 'in', 'between'}
         self.stopwords = self.stopwords - self.query_words
         self.lemmatizer = nltk.stem.WordNetLemmatizer()
+
+        if tokenizer == "regex":
+            self.tokenize = self.regex_tokenize
+        elif tokenizer == "nltk":
+            self.tokenize = nltk.word_tokenize
+        else:
+            raise ValueError(f"Unknown tokenizer backend {tokenizer!r}; expected 'regex' or 'nltk'")
+        self.tokenizer = tokenizer
+
+        # token -> lemma, or "" for stopwords; queries draw on a small vocabulary, so almost
+        # every token after warm-up is a lookup (a size of 0 disables the cache)
+        self.lemma_cache_size = lemma_cache_size
+        self._lemmas = {}
+
+    def regex_tokenize(self, text):
+        """Same tokens as nltk.word_tokenize for text cleaned of other punctuation"""
+        if self.CONTRACTION_PATTERN.search(text):
+            text = self.CONTRACTION_PATTERN.sub(lambda match: " " + " ".join(filter(None, match.groups())) + " ", text)
+        return self.TOKEN_PATTERN.findall(text)
+
+    def lemma(self, token):
+        """Lemma of a token, or "" when it is a stopword to drop"""
+        lemma = self._lemmas.get(token)
+        if lemma is None:
+            lemma = "" if token in self.stopwords else self.lemmatizer.lemmatize(token)
+            if self.lemma_cache_size:
+                if len(self._lemmas) >= self.lemma_cache_size:
+                    self._lemmas.clear()
+                self._lemmas[token] = lemma
+        return lemma
     
     def clean_text(self, text):
         """Clean and normalize text for processing"""
-        # Lowercase
-        text = text.lower()
-        
-        # Remove punctuation but keep some special characters for SQL syntax
-        text = re.sub(r'[^\w\s<>=!]', ' ', text)
-        
-        # Tokenize
-        tokens = nltk.word_tokenize(text)
-        
-        # Remove stopwords but keep query-specific words
-        filtered_tokens = [token for token in tokens if token not in self.stopwords or token in self.query_words]
-        
-        # Lemmatize
-        lemmatized_tokens = [self.lemmatizer.lemmatize(token) for token in filtered_tokens]
-        
+        # Lowercase, then remove punctuation but keep some special characters for SQL syntax
+        text = self.PUNCTUATION_PATTERN.sub(' ', text.lower())
+
+        # Tokenize, drop stopwords (query-specific words are not among them) and lemmatize
+        lemmas = self._lemmas
+        lemmatized_tokens = []
+        for token in self.tokenize(text):
+            lemma = lemmas.get(token)
+            if lemma is None:
+                lemma = self.lemma(token)
+            if lemma:
+                lemmatized_tokens.append(lemma)
+
         # Rejoin into text
-        cleaned_text = ' '.join(lemmatized_tokens)
-        return cleaned_text
+        return ' '.join(lemmatized_tokens)
+
+    def stats(self):
+        return {"tokenizer": self.tokenizer, "lemma_cache_entries": len(self._lemmas),
+                "lemma_cache_max_entries": self.lemma_cache_size}
+
+# -------- NLTK RESOURCE LOADING --------
+# Resource name -> path checked inside the NLTK data directories
+NLTK_RESOURCES = {
+    "punkt": "tokenizers/punkt",
+    "punkt_tab": "tokenizers/punkt_tab",
+    "stopwords": "corpora/stopwords",
+    "wordnet": "corpora/wordnet",
+}
+# Only needed by the nltk tokenizer backend
+TOKENIZER_RESOURCES = {"punkt", "punkt_tab"}
+
+# Warm-up state reported by /ready
+NLP_STATE = {
+    "tokenizer": False,
+    "stopwords": False,
+    "lemmatizer": False,
+    "load_seconds": None,
+    "error": None,
+}
+
+preprocessor = None  # shared TextPreprocessor, created by load_nlp_resources()
+_nlp_lock = threading.Lock()
+# Backoff after failed loads; in the serving process a background task owns the retries
+_nlp_retry_delay = 1.0
+_nlp_next_retry = 0.0
+nlp_background_retry = False
+
+class ServiceUnavailableError(RuntimeError):
+    """A query cannot be served right now and should be retried; surfaces as HTTP 503"""
+
+class NLPResourcesUnavailable(ServiceUnavailableError):
+    """NLTK resources failed to load and the next retry is not due yet"""
+
+def ensure_nltk_resources():
+    """Make sure every NLTK resource is available, downloading only when not offline"""
+    if NLTK_DATA_DIR:
+        if NLTK_OFFLINE:
+            # Pin lookups to the local directory only
+            nltk.data.path[:] = [NLTK_DATA_DIR]
+        elif NLTK_DATA_DIR not in nltk.data.path:
+            nltk.data.path.insert(0, NLTK_DATA_DIR)
+
+    missing = []
+    for name, path in NLTK_RESOURCES.items():
+        if name in TOKENIZER_RESOURCES and TOKENIZER_BACKEND != "nltk":
+            continue
+        try:
+            nltk.data.find(path)
+        except LookupError:
+            missing.append(name)
+
+    if missing and NLTK_OFFLINE:
+        raise RuntimeError(
+            f"Missing NLTK resources {missing} in {nltk.data.path}; "
+            f"install them into NLTK_DATA_DIR before starting in offline mode"
+        )
+    for name in missing:
+        nltk.download(name, download_dir=NLTK_DATA_DIR, quiet=True)
+
+def load_nlp_resources():
+    """Load and warm the tokenizer, stopwords and lemmatizer once per process"""
+    global preprocessor, _nlp_retry_delay, _nlp_next_retry
+    with _nlp_lock:
+        if preprocessor is not None:
+            return preprocessor
+
+        started = time.perf_counter()
+        try:
+            ensure_nltk_resources()
+
+            instance = TextPreprocessor()
+            NLP_STATE["stopwords"] = True
+
+            instance.tokenize("show the top customers")
+            NLP_STATE["tokenizer"] = True
+
+            # WordNet is otherwise loaded lazily on the first lemmatize call of a query
+            nltk.corpus.wordnet.ensure_loaded()
+            instance.clean_text("show the top 10 customers by total orders this month")
+            NLP_STATE["lemmatizer"] = True
+        except Exception as e:
+            NLP_STATE["error"] = str(e)
+            _nlp_next_retry = time.monotonic() + _nlp_retry_delay
+            logger.error("Failed to load NLTK resources (next retry in %ss): %s", _nlp_retry_delay, e)
+            _nlp_retry_delay = min(_nlp_retry_delay * 2, NLP_RETRY_MAX_SECONDS)
+            raise
+
+        NLP_STATE["load_seconds"] = round(time.perf_counter() - started, 3)
+        NLP_STATE["error"] = None
+        _nlp_retry_delay = 1.0
+        preprocessor = instance
+        logger.info("NLTK resources loaded in %ss", NLP_STATE["load_seconds"])
+        return preprocessor
+
+def get_preprocessor():
+    """
+    Return the warmed TextPreprocessor, loading it on first use if startup did not try.
+    After a failed load, raise NLPResourcesUnavailable instead of retrying on the request
+    path; pool processes retry here once the backoff has passed.
+    """
+    if preprocessor is not None:
+        return preprocessor
+    if NLP_STATE["error"] is not None and (nlp_background_retry or time.monotonic() < _nlp_next_retry):
+        raise NLPResourcesUnavailable(f"NLP resources are unavailable: {NLP_STATE['error']}")
+    return load_nlp_resources()
+
+async def retry_nlp_resources():
+    """Retry a failed load in the background, with the backoff set by load_nlp_resources"""
+    while preprocessor is None:
+        await asyncio.sleep(max(0.0, _nlp_next_retry - time.monotonic()))
+        try:
+            await asyncio.to_thread(load_nlp_resources)
+        except Exception:
+            pass
 
 # -------- 2. LANGUAGE DETECTION AND TRANSLATION MODULE --------
-class LanguageProcessor:
-    def detect_language(self, text):
+class TranslationCache:
+    """
+    Two-tier cache of translations keyed by (language, normalized source text).
+    Lookups hit the in-process LRU first, then the SQLite tier; disk hits are promoted.
+    The SQLite file is opened by open() (called from the lifespan, so importing this module
+    touches no file); disk reads run on a worker thread and writes are queued for a single
+    writer thread that commits them in batches, so the event loop never waits on disk.
+    """
+    # Disk pruning (expired rows and size limit) runs once per this many writes
+    PRUNE_EVERY = 100
+    # Writes queued beyond this are dropped from the disk tier (they stay in memory)
+    WRITE_QUEUE_SIZE = 10000
+
+    def __init__(self, path=TRANSLATION_CACHE_PATH, max_entries=TRANSLATION_CACHE_MAX_ENTRIES,
+                 disk_max_entries=TRANSLATION_CACHE_DISK_MAX_ENTRIES, ttl_seconds=TRANSLATION_CACHE_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()  # (lang, text) -> (translation, expires_at)
+        self._lock = threading.Lock()  # guards the memory tier and the counters
+        self._db_lock = threading.Lock()  # serializes use of the SQLite connection
+        self._writes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.dropped_writes = 0
+
+        self._db = None
+        self._disk_entries = None
+        self._write_queue = queue.Queue(maxsize=self.WRITE_QUEUE_SIZE)  # rows to insert, None to stop
+        self._writer = None
+
+    def open(self):
+        """Open the SQLite tier and start its writer thread; blocking, call off the event loop"""
+        if not self.path or self._db is not None:
+            return
+        try:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "lang TEXT NOT NULL, source TEXT NOT NULL, translated TEXT NOT NULL, "
+                "created_at REAL NOT NULL, PRIMARY KEY (lang, source))"
+            )
+            db.commit()
+        except sqlite3.Error as e:
+            logger.warning("Translation cache disabled on disk (%s): %s", self.path, e)
+            return
+        with self._db_lock:
+            self._db = db
+            self._prune_disk()
+        self._writer = threading.Thread(target=self._write_loop, name="translation-cache-writer", daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def normalize(text):
+        """Normalize source text so trivially different utterances share an entry"""
+        return " ".join(unicodedata.normalize("NFC", text).casefold().split())
+
+    async def get(self, text, lang):
+        key = (lang, self.normalize(text))
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[0]
+                del self._memory[key]
+
+        row = await asyncio.to_thread(self._disk_get, key) if self._db is not None else None
+        with self._lock:
+            if row is not None and row[1] + self.ttl_seconds > now:
+                self._remember(key, row[0], row[1] + self.ttl_seconds)
+                self.disk_hits += 1
+                return row[0]
+            self.misses += 1
+            return None
+
+    def _disk_get(self, key):
+        with self._db_lock:
+            if self._db is None:
+                return None
+            try:
+                return self._db.execute(
+                    "SELECT translated, created_at FROM translations WHERE lang = ? AND source = ?",
+                    key
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning("Translation cache read failed: %s", e)
+                return None
+
+    def put(self, text, lang, translation):
+        key = (lang, self.normalize(text))
+        now = time.time()
+        with self._lock:
+            self._remember(key, translation, now + self.ttl_seconds)
+        if self._writer is not None:
+            try:
+                self._write_queue.put_nowait((key[0], key[1], translation, now))
+            except queue.Full:
+                with self._lock:
+                    self.dropped_writes += 1
+
+    def _remember(self, key, translation, expires_at):
+        self._memory[key] = (translation, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _write_loop(self):
+        """Writer thread: commit whatever rows are queued as one batch, until told to stop"""
+        while True:
+            rows = [self._write_queue.get()]
+            while True:
+                try:
+                    rows.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = None in rows
+            rows = [row for row in rows if row is not None]
+            if rows:
+                self._write(rows)
+            if stop:
+                return
+
+    def _write(self, rows):
+        with self._db_lock:
+            if self._db is None:
+                return
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO translations (lang, source, translated, created_at) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                self._db.commit()
+                previous, self._writes = self._writes, self._writes + len(rows)
+                if self._writes // self.PRUNE_EVERY != previous // self.PRUNE_EVERY:
+                    self._prune_disk()
+                else:
+                    self._count_disk()
+            except sqlite3.Error as e:
+                logger.warning("Translation cache write failed: %s", e)
+
+    def _prune_disk(self):
+        """Drop expired rows, then the oldest rows beyond the disk size limit"""
+        self._db.execute("DELETE FROM translations WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self._db.execute(
+            "DELETE FROM translations WHERE rowid IN ("
+            "SELECT rowid FROM translations ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max_entries,)
+        )
+        self._db.commit()
+        self._count_disk()
+
+    def _count_disk(self):
+        # Kept for stats(), which is read on the event loop
+        self._disk_entries = self._db.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    def close(self):
+        """Flush queued writes and close the SQLite tier; blocking, call off the event loop"""
+        if self._writer is not None:
+            self._write_queue.put(None)
+            self._writer.join()
+            self._writer = None
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "disk_entries": self._disk_entries if self._db is not None else None,
+                "disk_max_entries": self.disk_max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "dropped_writes": self.dropped_writes,
+                "hit_ratio": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+# Seed vocabulary of the character n-gram models that tell romanized Hindi from English
+ROMANIZED_HINDI_WORDS = """
+    sabhi sab saare saara dikhao dikhaao dikhaiye dikhayen dikhado batao bataiye bataye chahiye
+    kitne kitna kitni kaun kaunse kaunsa kya kab kahan kaise jinka jinki jinke jiska jiski jiske
+    jo jab tak se ka ki ke ko ne mein me par pe hai hain tha the thi aur ya nahi nahin zyada jyada
+    adhik kam sabse upar neeche pehle baad pichhle pichle agle is us yeh ye woh wo wale wali vale
+    mahine mahina saal hafte hafta din aaj kal abhi samay tarikh grahak grahakon utpad utpadon
+    aadesh kharid kharidari bikri kamai rakam kul ausat keemat kimat daam sankhya ginti gino ginein
+    shahar naam sthiti shreni anusar hisaab hisab dwara liye saath bina lagbhag keval sirf wala
+    mujhe hume humein dekhna dekho nikalo laao lao karo kijiye dijiye dena lena hua hue hui gaya
+    gaye gayi raha rahe rahi bhi hi toh lekin magar kyunki isliye jaise waise koi kuch bahut
+    """.split()
+# Postpositions, particles, pronouns and command verbs of romanized Hindi. Latin-script text
+# is only read as Hindi when it has one of these: English queries naming Indian people,
+# places or brands ("show karan johar films") contain none of them
+ROMANIZED_HINDI_FUNCTION_WORDS = """
+    dikhao dikhaao dikhaiye dikhayen dikhado batao bataiye bataye chahiye kitne kitna kitni kaun
+    kaunse kaunsa kya kab kahan kaise jinka jinki jinke jiska jiski jiske jab se ka ki ke ko ne
+    mein par pe hai hain tha the thi aur ya nahi nahin wale wali vale wala mujhe hume humein
+    dekhna dekho nikalo laao lao karo kijiye dijiye hua hue hui gaya gaye gayi raha rahe rahi bhi
+    toh lekin kyunki isliye
+    """.split()
+ENGLISH_QUERY_WORDS = """
+    show list get find give display fetch count sum total average mean minimum maximum top bottom
+    all each every by from with where which what who when how many much more less than greater
+    lower higher between and or not the a an of in on at to for per is are was were be been have
+    has had that this these those last next first past previous current recent latest today
+    yesterday week month year quarter day days months years order orders customer customers
+    product products item items sale sales revenue amount price cost value status city category
+    name email date created updated id quantity stock inventory invoice payment shipment region
+    sort sorted ascending descending group grouped having like equal equals above below over under
+    least most highest lowest number distinct unique new old pending completed shipped cancelled
+    active paid unpaid open closed employee vendor ticket campaign ledger session contract asset
+    """.split()
+
+class LanguageDetector:
+    """
+    Language of a query, detected in one pass over its characters. Native-script text is
+    classified by the Unicode block of its Indic letters; Latin-script text by the seed words
+    of romanized Hindi and English it contains. Character trigram models of both score words
+    outside the seed lists for the phrase translator's coverage (word_vote). Built once per
+    process.
+    """
+    # The Indic blocks are contiguous, 128 code points each, from U+0900 to U+0D7F
+    INDIC_START = 0x0900
+    SCRIPT_LANGUAGES = (
+        "hi",  # Devanagari
+        "bn",  # Bengali
+        "pa",  # Gurmukhi
+        "gu",  # Gujarati
+        "or",  # Oriya
+        "ta",  # Tamil
+        "te",  # Telugu
+        "kn",  # Kannada
+        "ml",  # Malayalam
+    )
+    # Words outside both seed lists need this mean log-likelihood ratio per trigram to count
+    # as evidence for either language; closer calls are left out of the vote
+    TRIGRAM_MARGIN = 0.5
+    MAX_MEMO_ENTRIES = 4096
+
+    def __init__(self, romanized_words=ROMANIZED_HINDI_WORDS, english_words=ENGLISH_QUERY_WORDS,
+                 function_words=ROMANIZED_HINDI_FUNCTION_WORDS, min_confidence=LANGUAGE_MIN_CONFIDENCE):
+        self.min_confidence = min_confidence
+        # Seed words are classified by lookup; English wins for words in both lists ("is", "to")
+        self.seed_votes = {word: 1 for word in romanized_words}
+        self.seed_votes.update((word, -1) for word in english_words)
+        self.function_words = frozenset(word for word in function_words if self.seed_votes.get(word) == 1)
+        self.indic_end = self.INDIC_START + 128 * len(self.SCRIPT_LANGUAGES)
+        self.latin_words = re.compile(r"[a-z]+")
+
+        # Log-likelihood ratio of each trigram, romanized Hindi over English (add-one smoothing)
+        hindi, english = self.trigram_counts(romanized_words), self.trigram_counts(english_words)
+        hindi_total, english_total = sum(hindi.values()), sum(english.values())
+        vocabulary = len(set(hindi) | set(english)) + 1
+        self.trigram_scores = {
+            trigram: math.log((hindi.get(trigram, 0) + 1) / (hindi_total + vocabulary))
+                     - math.log((english.get(trigram, 0) + 1) / (english_total + vocabulary))
+            for trigram in set(hindi) | set(english)
+        }
+        # Unseen trigrams carry the ratio of the two smoothed zero counts
+        self.unseen_score = math.log((english_total + vocabulary) / (hindi_total + vocabulary))
+        # word -> 1 (romanized Hindi), -1 (English) or 0 (undecided); seeded, then memoized
+        self._votes = dict(self.seed_votes)
+
+    @staticmethod
+    def trigrams(word):
+        padded = f" {word} "
+        return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+    @classmethod
+    def trigram_counts(cls, words):
+        counts = {}
+        for word in words:
+            for trigram in cls.trigrams(word):
+                counts[trigram] = counts.get(trigram, 0) + 1
+        return counts
+
+    def word_vote(self, word):
+        """1 when a lowercase word reads as romanized Hindi, -1 as English, 0 when undecided"""
+        vote = self._votes.get(word)
+        if vote is None:
+            scores, unseen = self.trigram_scores, self.unseen_score
+            trigrams = self.trigrams(word)
+            score = sum(scores.get(trigram, unseen) for trigram in trigrams) / len(trigrams)
+            vote = 1 if score > self.TRIGRAM_MARGIN else -1 if score < -self.TRIGRAM_MARGIN else 0
+            if len(self._votes) >= len(self.seed_votes) + self.MAX_MEMO_ENTRIES:
+                self._votes = dict(self.seed_votes)
+            self._votes[word] = vote
+        return vote
+
+    def detect(self, text):
         """
-        Detect language of the text using common words or patterns
-        In production, use a library like langdetect or call an API
+        (language, confidence) of the text. Text with Indic letters gets the language of its
+        most used script, with that script's share of the Indic letters as confidence.
+        Latin-script text is romanized Hindi when it has a Hindi function word and at least
+        min_confidence of its seed words are Hindi, and English otherwise. Other words, such
+        as names, do not vote however their trigrams read.
         """
-        # Simplified language detection with expanded language support
-        english_words = {'show', 'get', 'list', 'find', 'what', 'which', 'orders', 'customers', 'products'}
+        if not text.isascii():
+            counts = [0] * len(self.SCRIPT_LANGUAGES)
+            start, end = self.INDIC_START, self.indic_end
+            for ch in text:
+                code = ord(ch)
+                if start <= code < end:
+                    counts[(code - start) >> 7] += 1
+            total = sum(counts)
+            if total:
+                best = max(counts)
+                return self.SCRIPT_LANGUAGES[counts.index(best)], best / total
 
-        hindi_words = {'दिखाओ', 'प्राप्त', 'सूची', 'खोजें', 'क्या', 'कौन', 'आदेश', 'ग्राहक', 'उत्पाद'}
-        kannada_words = {'ತೋರಿಸು', 'ಪಡೆ', 'ಪಟ್ಟಿ', 'ಹುಡುಕು', 'ಏನು', 'ಯಾವ', 'ಆದೇಶಗಳು', 'ಗ್ರಾಹಕರು', 'ಉತ್ಪನ್ನಗಳು'}
-        
-        text_lower = text.lower()
-        tokens = set(text_lower.split())
-        
-        eng_count = len(tokens.intersection(english_words))
-        hindi_count = len(tokens.intersection(hindi_words))
-        kannada_count = len(tokens.intersection(kannada_words))
-        
-        # Detect script patterns (for better Hindi and Kannada detection)
-        devanagari_pattern = re.compile(r'[\u0900-\u097F]')
-        kannada_pattern = re.compile(r'[\u0C80-\u0CFF]')
-        
-        if devanagari_pattern.search(text):
-            return "hi"  # Hindi
-        elif kannada_pattern.search(text):
-            return "kn"  # Kannada
-        elif hindi_count > eng_count  and hindi_count > kannada_count:
-            return "hi"
-        elif kannada_count > eng_count  and kannada_count > hindi_count:
-            return "kn"
-        return "en"  # Default to English
+        seed_votes, function_words = self.seed_votes, self.function_words
+        hindi = english = 0
+        grammatical = False
+        for word in self.latin_words.findall(text.lower()):
+            vote = seed_votes.get(word)
+            if vote is None:
+                continue
+            if vote > 0:
+                hindi += 1
+                grammatical = grammatical or word in function_words
+            else:
+                english += 1
+        if not hindi:
+            return "en", 1.0 if english else 0.0
+        share = hindi / (hindi + english)
+        if grammatical and share >= self.min_confidence:
+            return "hi", share
+        return "en", 1.0 - share
+
+# Query idioms and database vocabulary, source phrase -> English ("" drops particles that
+# carry no meaning for the parser). Hindi covers Devanagari and romanized spellings.
+PHRASE_TABLES = {
+    "hi": {
+        # Commands
+        "दिखाओ": "show", "दिखाएं": "show", "दिखाएँ": "show", "दिखाइए": "show", "दिखाइये": "show",
+        "दिखा": "show", "बताओ": "show", "बताएं": "show", "बताइए": "show", "सूची": "list",
+        "गिनें": "count", "गिनो": "count", "गिनती": "count", "कितने": "how many", "कितनी": "how many",
+        "कितना": "how many",
+        # Database vocabulary
+        "सभी": "all", "सब": "all", "सारे": "all", "ग्राहक": "customers", "ग्राहकों": "customers",
+        "ऑर्डर": "orders", "ऑर्डरों": "orders", "आदेश": "orders", "आदेशों": "orders",
+        "उत्पाद": "products", "उत्पादों": "products", "राजस्व": "revenue", "आय": "revenue",
+        "कमाई": "revenue", "बिक्री": "sales", "कुल": "total", "राशि": "amount", "कुल राशि": "total amount",
+        "औसत": "average", "कीमत": "price", "मूल्य": "price", "दाम": "price", "स्थिति": "status",
+        "शहर": "city", "श्रेणी": "category", "नाम": "name", "मात्रा": "quantity", "स्टॉक": "stock",
+        "शीर्ष": "top", "टॉप": "top", "सबसे ज़्यादा": "highest", "सबसे अधिक": "highest",
+        "सबसे कम": "lowest", "पूर्ण": "completed", "लंबित": "pending", "भेजे गए": "shipped",
+        "रद्द": "cancelled", "नए": "new",
+        # Time periods
+        "पिछले महीने": "last month", "पिछला महीना": "last month", "इस महीने": "this month",
+        "पिछले साल": "last year", "पिछले वर्ष": "last year", "इस साल": "this year", "इस वर्ष": "this year",
+        "पिछले हफ्ते": "last week", "पिछले सप्ताह": "last week", "आज": "today", "दिन": "days",
+        "दिनों": "days", "पिछले": "past", "प्रति माह": "monthly", "मासिक": "monthly",
+        # Particles
+        "के": "", "का": "", "की": "", "को": "", "है": "", "हैं": "", "जो": "", "वे": "", "वो": "", "जिनका": "",
+        "जिनकी": "", "जिनके": "", "वाले": "", "वाली": "", "ने": "", "हुए": "", "गए": "", "में": "",
+        "और": "and", "या": "or", "से": "from", "बराबर": "equals",
+        # Romanized
+        "dikhao": "show", "dikhaao": "show", "dikhaiye": "show", "dikhayen": "show", "dikhado": "show",
+        "batao": "show", "bataiye": "show", "kitne": "how many", "kitni": "how many", "kitna": "how many",
+        "sabhi": "all", "sab": "all", "saare": "all", "grahak": "customers", "grahakon": "customers",
+        "aadesh": "orders", "utpad": "products", "utpadon": "products", "kamai": "revenue",
+        "bikri": "sales", "kul": "total", "rakam": "amount", "ausat": "average", "keemat": "price",
+        "kimat": "price", "daam": "price", "shahar": "city", "naam": "name", "sthiti": "status",
+        "pichhle mahine": "last month", "pichle mahine": "last month", "is mahine": "this month",
+        "pichhle saal": "last year", "pichle saal": "last year", "is saal": "this year",
+        "pichhle hafte": "last week", "aaj": "today", "din": "days", "sabse zyada": "highest",
+        "sabse kam": "lowest", "ka": "", "ki": "", "ke": "", "ko": "", "hai": "", "hain": "",
+        "jo": "", "jinka": "", "jinki": "", "jinke": "", "wale": "", "wali": "", "mein": "",
+        "aur": "and", "ya": "or",
+    },
+    "kn": {
+        # Commands
+        "ತೋರಿಸು": "show", "ತೋರಿಸಿ": "show", "ತೋರಿಸಿರಿ": "show", "ಪಟ್ಟಿ": "list", "ಎಣಿಸಿ": "count",
+        "ಎಷ್ಟು": "how many",
+        # Database vocabulary
+        "ಎಲ್ಲಾ": "all", "ಎಲ್ಲ": "all", "ಗ್ರಾಹಕ": "customers", "ಗ್ರಾಹಕರು": "customers", "ಗ್ರಾಹಕರ": "customers",
+        "ಆರ್ಡರ್": "orders", "ಆದೇಶ": "orders", "ಉತ್ಪನ್ನ": "products", "ಆದಾಯ": "revenue",
+        "ಮಾರಾಟ": "sales", "ಒಟ್ಟು": "total", "ಮೊತ್ತ": "amount", "ಒಟ್ಟು ಮೊತ್ತ": "total amount",
+        "ಸರಾಸರಿ": "average", "ಬೆಲೆ": "price", "ಸ್ಥಿತಿ": "status", "ನಗರ": "city", "ವರ್ಗ": "category",
+        "ಹೆಸರು": "name", "ಪ್ರಮಾಣ": "quantity", "ಟಾಪ್": "top", "ಅಗ್ರ": "top", "ಅತಿ ಹೆಚ್ಚು": "highest",
+        "ಅತಿ ಕಡಿಮೆ": "lowest", "ಪೂರ್ಣಗೊಂಡ": "completed", "ಬಾಕಿ": "pending", "ರದ್ದಾದ": "cancelled",
+        "ಹೊಸ": "new",
+        # Time periods
+        "ಕಳೆದ ತಿಂಗಳು": "last month", "ಕಳೆದ ತಿಂಗಳ": "last month", "ಈ ತಿಂಗಳು": "this month",
+        "ಈ ತಿಂಗಳ": "this month", "ಕಳೆದ ವರ್ಷ": "last year", "ಕಳೆದ ವರ್ಷದ": "last year", "ಈ ವರ್ಷ": "this year",
+        "ಈ ವರ್ಷದ": "this year", "ಕಳೆದ ವಾರ": "last week", "ಕಳೆದ ವಾರದ": "last week",
+        "ಇಂದು": "today", "ದಿನ": "days", "ದಿನಗಳು": "days", "ಕಳೆದ": "past", "ಮಾಸಿಕ": "monthly",
+        # Particles
+        "ಮತ್ತು": "and", "ಅಥವಾ": "or", "ಇರುವ": "", "ಇದೆ": "", "ಆಗಿರುವ": "", "ಅವರ": "", "ಸಮಾನ": "equals",
+    },
+}
+
+# Postpositions follow the word or number they govern; their English preposition is moved
+# in front of it ("राजस्व के अनुसार" -> "by revenue", "150 से ज़्यादा" -> "greater than 150")
+PHRASE_POSTPOSITIONS = {
+    "hi": {
+        "के अनुसार": "by", "के हिसाब से": "by", "द्वारा": "by", "से ज़्यादा": "greater than",
+        "से ज्यादा": "greater than", "से अधिक": "greater than", "से कम": "less than",
+        "ke anusar": "by", "ke hisaab se": "by", "se zyada": "greater than", "se jyada": "greater than",
+        "se adhik": "greater than", "se kam": "less than",
+    },
+    "kn": {
+        "ಪ್ರಕಾರ": "by", "ಅನುಸಾರ": "by", "ಕ್ಕಿಂತ ಹೆಚ್ಚು": "greater than", "ಗಿಂತ ಹೆಚ್ಚು": "greater than",
+        "ಕ್ಕಿಂತ ಕಡಿಮೆ": "less than", "ಗಿಂತ ಕಡಿಮೆ": "less than",
+    },
+}
+
+# Case and plural suffixes stripped from words missing from the table, longest first
+PHRASE_SUFFIXES = {
+    "kn": ("ಗಳನ್ನು", "ಗಳಲ್ಲಿ", "ಗಳಿಂದ", "ಗಳಿಗೆ", "ಗಳು", "ಗಳ", "ನ್ನು", "ದಿಂದ", "ಕ್ಕೆ", "ಲ್ಲಿ", "ದ", "ರು"),
+}
+
+class PhraseTranslator:
+    """
+    Offline translation of query idioms and database vocabulary by longest-match phrase
+    substitution over words. Reports the share of the query's words it accounted for, so
+    callers can fall back to the translation API for queries the tables do not cover.
+    """
+    # Punctuation separates words; zero-width (non-)joiners only shape the glyphs of one
+    IGNORED_CHARS = {**dict.fromkeys(map(ord, "?.,!;:।॥\"'()"), " "), 0x200C: None, 0x200D: None}
+    # Hindi and Kannada put the verb last and "by" phrases first; English queries lead with
+    # the command and end with the grouping or ordering
+    COMMANDS = frozenset({"show", "list", "count", "how many"})
+
+    def __init__(self, tables=PHRASE_TABLES, postpositions=PHRASE_POSTPOSITIONS, suffixes=PHRASE_SUFFIXES,
+                 detector=None):
+        # language -> {word tuple: (English, is postposition)}
+        self.phrases = {}
+        for language in set(tables) | set(postpositions):
+            phrases = {}
+            for source, english in tables.get(language, {}).items():
+                phrases[tuple(self.words(source))] = (english, False)
+            for source, english in postpositions.get(language, {}).items():
+                phrases[tuple(self.words(source))] = (english, True)
+            self.phrases[language] = phrases
+        self.max_words = max((len(words) for phrases in self.phrases.values() for words in phrases), default=0)
+        self.suffixes = suffixes
+        self.detector = detector
+
+    def words(self, text):
+        """Lowercase NFC words of the text, with nukta spellings and digits normalized"""
+        text = unicodedata.normalize("NFC", text.translate(self.IGNORED_CHARS)).lower()
+        return [str(int(word)) if word.isdecimal() else word for word in text.split()]
+
+    def lookup(self, phrases, language, words):
+        """(English, is postposition, words consumed) of the longest phrase starting the words"""
+        for size in range(min(self.max_words, len(words)), 0, -1):
+            hit = phrases.get(tuple(words[:size]))
+            if hit is not None:
+                return hit + (size,)
+        for suffix in self.suffixes.get(language, ()):
+            if words[0].endswith(suffix) and len(words[0]) > len(suffix):
+                hit = phrases.get((words[0][:-len(suffix)],))
+                if hit is not None:
+                    return hit + (1,)
+        return None
+
+    def is_english(self, word):
+        """Latin-script words pass through unless they read as romanized Hindi"""
+        if not word.isascii():
+            return False
+        return self.detector is None or all(
+            self.detector.word_vote(part) <= 0 for part in self.detector.latin_words.findall(word))
+
+    def translate(self, text, language):
+        """(English text, covered share of words), or None for languages without a table"""
+        phrases = self.phrases.get(language)
+        if phrases is None:
+            return None
+        words = self.words(text)
+        if not words:
+            return text, 1.0
+
+        # Each unit is the English of one source phrase or word, in source order
+        units = []
+        by_units = []
+        covered = 0
+        i = 0
+        while i < len(words):
+            hit = self.lookup(phrases, language, words[i:])
+            if hit is not None:
+                english, postposition, size = hit
+                if postposition and units:
+                    governed = units.pop()
+                    if english == "by":
+                        by_units.append(f"by {governed}")
+                    else:
+                        units.append(f"{english} {governed}")
+                elif english:
+                    units.append(english)
+                covered += size
+                i += size
+                continue
+            word = words[i]
+            if word.isdecimal() or self.is_english(word):
+                covered += 1
+            units.append(word)
+            i += 1
+
+        commands = [unit for unit in units if unit in self.COMMANDS]
+        units = commands + [unit for unit in units if unit not in self.COMMANDS] + by_units
+        return " ".join(units), covered / len(words)
+
+class LanguageProcessor:
+    def __init__(self, api_url=TRANSLATE_API_URL, api_key=GOOGLE_API_KEY, cache=None, detector=None,
+                 phrases=None, min_coverage=LOCAL_TRANSLATION_MIN_COVERAGE, offline=TRANSLATE_OFFLINE):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.cache = cache
+        self.detector = detector or LanguageDetector()
+        self.phrases = phrases or PhraseTranslator(detector=self.detector)
+        self.min_coverage = min_coverage
+        self.offline = offline
+        # Translations served by each tier: local phrase tables, translation cache, translation
+        # API, and fallbacks to the local or untranslated text when the API is unavailable
+        self.served = {"local": 0, "cache": 0, "remote": 0, "fallback": 0}
+        self.inflight = SingleFlight("translation")
+        self._client = None
+
+    def get_client(self):
+        """Persistent pooled HTTP client with keep-alive, shared by all translation calls"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(TRANSLATE_READ_TIMEOUT, connect=TRANSLATE_CONNECT_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=TRANSLATE_MAX_CONNECTIONS,
+                    max_keepalive_connections=TRANSLATE_MAX_CONNECTIONS,
+                    keepalive_expiry=TRANSLATE_KEEPALIVE_SECONDS
+                )
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def detect_language(self, text):
+        """(language, confidence) of the text; see LanguageDetector.detect"""
+        return self.detector.detect(text)
     
-    def translate_to_english(self, text, source_lang):
-        """Translate text to English if needed using Google Translate API"""
+    async def translate_to_english(self, text, source_lang):
+        """
+        Translate text to English if needed: locally when the phrase tables cover the query,
+        otherwise through the translation cache and the Google Translate API
+        """
         if source_lang == "en":
             return text
-            
+
+        translation, tier = self.translate_locally(text, source_lang)
+        if tier is not None:
+            self.served[tier] += 1
+            return translation
+
+        # Identical queries arriving together share one cache lookup and API call
+        return await self.inflight.run((source_lang, text), lambda: self.translate_remote(text, source_lang, translation))
+
+    def translate_locally(self, text, source_lang):
+        """
+        Translation without the API, as (text, tier): tier is "local" when the phrase tables
+        cover the query, "fallback" when they do not and the API is disabled, and None when
+        the API should translate it; the text is then the partial local translation, or the
+        untranslated text
+        """
+        local = self.phrases.translate(text, source_lang)
+        if local is not None and (local[1] >= self.min_coverage or self.offline):
+            return local[0], "local"
+        if self.offline:
+            return text, "fallback"
+        return (local[0] if local is not None else text), None
+
+    async def translate_remote(self, text, source_lang, fallback):
+        """Translation from the cache or the Google Translate API, or `fallback` when unavailable"""
+        # Repeated voice commands are served from the translation cache
+        if self.cache is not None:
+            cached = await self.cache.get(text, source_lang)
+            if cached is not None:
+                self.served["cache"] += 1
+                return cached
+
         try:
             # Call Google Translate API
-            url = "https://translation.googleapis.com/language/translate/v2"
             params = {
                 "q": text,
                 "source": source_lang,
                 "target": "en",
                 "format": "text",
-                "key": GOOGLE_API_KEY  # Using API key from environment variable
+                "key": self.api_key  # Using API key from environment variable
             }
             
-            response = requests.post(url, params=params)
+            response = await self.get_client().post(self.api_url, params=params)
             if response.status_code == 200:
-                return response.json()["data"]["translations"][0]["translatedText"]
+                translated = response.json()["data"]["translations"][0]["translatedText"]
+                TRANSLATION_CALLS_TOTAL.inc("ok")
+                self.served["remote"] += 1
+                if self.cache is not None:
+                    self.cache.put(text, source_lang, translated)
+                return translated
             else:
-                # Fallback to original text if translation fails
-                print(f"Translation error: {response.status_code}, {response.text}")
-                return text
+                TRANSLATION_CALLS_TOTAL.inc("http_error")
+                logger.warning("Translation error: %s, %s", response.status_code, response.text)
         except Exception as e:
-            print(f"Translation error: {e}")
-            return text  # Return original text if translation fails
+            TRANSLATION_CALLS_TOTAL.inc("exception")
+            logger.warning("Translation error: %s", e)
+        # Without the API, a partial local translation still beats the untranslated text
+        self.served["fallback"] += 1
+        return fallback
+
+    def stats(self):
+        """Translations served by each tier and the share served by the local phrase tables"""
+        total = sum(self.served.values())
+        return {**self.served, "local_share": self.served["local"] / total if total else 0.0}
 
 # -------- 3. ENHANCED INTENT PARSER MODULE --------
+def is_word_char(ch):
+    """Same notion of a word character as the regex \\w class"""
+    return ch.isalnum() or ch == "_"
+
+def column_names(columns):
+    """Column names of a schema table, whose entries may be plain names or {"name": ...} dicts"""
+    return [col.get("name", "") if isinstance(col, dict) else col for col in columns]
+
+class VocabularyMentions:
+    """Word-bounded vocabulary hits found in one text, as (start, end, term, kind) tuples"""
+    __slots__ = ("hits", "terms")
+
+    def __init__(self, hits):
+        self.hits = hits
+        self.terms = frozenset(hit[2].lower() for hit in hits)
+
+    def __contains__(self, term):
+        return term.lower() in self.terms
+
+    def non_overlapping(self, kinds):
+        """Leftmost-longest, non-overlapping hits of the given kinds, in text order"""
+        selected = []
+        last_end = 0
+        for hit in self.hits:
+            if hit[3] in kinds and hit[0] >= last_end:
+                selected.append(hit)
+                last_end = hit[1]
+        return selected
+
+class VocabularyMatcher:
+    """
+    Aho-Corasick automaton over every table, alias, column and business metric of a schema
+    context. One left-to-right pass over the text reports all word-bounded, case-insensitive
+    hits; terms are matched literally, so they need no regex escaping.
+    """
+    # Transitions of all trie nodes live in one dict keyed by node << CHAR_BITS | ord(char)
+    CHAR_BITS = 21
+
+    def __init__(self, vocabulary):
+        # Trie: packed transitions, failure links, and (length, term, kind) outputs per node;
+        # nodes without outputs share the empty tuple
+        self._goto = {}
+        self._fail = array('l', [0])
+        self._out = [()]
+        children = [[]]  # (char, child) per node, only needed to link the automaton
+        for kind, terms in vocabulary:
+            for term in terms:
+                if isinstance(term, str) and term:
+                    self._add(term, kind, children)
+        self._link(children)
+
+    def _add(self, term, kind, children):
+        node = 0
+        for ch in term.lower():
+            key = node << self.CHAR_BITS | ord(ch)
+            nxt = self._goto.get(key)
+            if nxt is None:
+                nxt = len(self._out)
+                self._goto[key] = nxt
+                children[node].append((ch, nxt))
+                children.append([])
+                self._fail.append(0)
+                self._out.append(())
+            node = nxt
+        # First registration of a term wins for a given kind
+        if all(out_kind != kind for _, _, out_kind in self._out[node]):
+            self._out[node] += ((len(term), term, kind),)
+
+    def _link(self, children):
+        """Compute failure links breadth-first and merge outputs along them"""
+        goto, fail, out, bits = self._goto, self._fail, self._out, self.CHAR_BITS
+        queue = [child for _, child in children[0]]
+        for node in queue:
+            for ch, child in children[node]:
+                code = ord(ch)
+                target = fail[node]
+                while target and (target << bits | code) not in goto:
+                    target = fail[target]
+                target = goto.get(target << bits | code, 0)
+                fail[child] = target if target != child else 0
+                out[child] = out[child] + out[fail[child]]
+                queue.append(child)
+
+    def find_all(self, text):
+        """Return a VocabularyMentions with every word-bounded hit, sorted by start then length"""
+        lowered = text.lower()
+        size = len(lowered)
+
+        def at_boundary(pos):
+            before = pos > 0 and is_word_char(lowered[pos - 1])
+            after = pos < size and is_word_char(lowered[pos])
+            return before != after
+
+        goto, fail, out, bits = self._goto, self._fail, self._out, self.CHAR_BITS
+        hits = []
+        node = 0
+        for i, ch in enumerate(lowered):
+            code = ord(ch)
+            while node and (node << bits | code) not in goto:
+                node = fail[node]
+            node = goto.get(node << bits | code, 0)
+            for length, term, kind in out[node]:
+                start = i + 1 - length
+                if at_boundary(start) and at_boundary(i + 1):
+                    hits.append((start, i + 1, term, kind))
+
+        hits.sort(key=lambda hit: (hit[0], hit[0] - hit[1]))
+        return VocabularyMentions(hits)
+
+# Keyword groups evaluated once per query into QueryAnalysis.flags; multi-word entries are
+# matched as word-bounded phrases
+QUERY_KEYWORDS = {
+    # SQL actions, in priority order
+    "select": ("show", "list", "display", "get", "find", "search", "select", "query", "retrieve", "give me", "what are", "what is"),
+    "count": ("count", "how many", "total number", "number of"),
+    "average": ("average", "avg", "mean", "typical"),
+    "sum": ("sum", "total", "add up", "overall"),
+    "min": ("minimum", "min", "smallest", "lowest", "least"),
+    "max": ("maximum", "max", "largest", "highest", "most", "greatest"),
+    # Aggregation functions applied to selected columns
+    "agg_count": ("count", "how many", "number of"),
+    "agg_avg": ("average", "avg", "mean"),
+    "agg_sum": ("sum", "total", "add up"),
+    "agg_min": ("minimum", "min", "smallest", "lowest"),
+    "agg_max": ("maximum", "max", "largest", "highest", "greatest"),
+    # Grouping and aggregation indicators
+    "grouping": ("group by", "grouped by", "per", "by", "categorized by", "segmented by", "broken down by"),
+    "aggregation": ("total", "average", "count", "sum", "min", "max", "mean", "highest", "lowest"),
+    # Sort direction
+    "ascending": ("ascending", "increase", "ascend", "rise"),
+    "descending": ("descending", "decrease", "descend", "drop", "highest", "best", "top"),
+}
+
+# -------- SQL AST --------
+# Intents carry these nodes instead of SQL strings; EnhancedSQLGenerator renders them into
+# a single SqlWriter, so each node is visited once and identifiers are quoted in one place.
+AGGREGATE_FUNCTIONS = frozenset(("COUNT", "SUM", "AVG", "MIN", "MAX"))
+AGGREGATE_PATTERN = re.compile(r'\b(?:COUNT|SUM|AVG|MIN|MAX)\s*\(', re.IGNORECASE)
+NUMBER_PATTERN = re.compile(r'\d+(?:\.\d+)?')
+PLAIN_IDENTIFIER_PATTERN = re.compile(r'[a-z_][a-z0-9_]*')
+
+def quote_identifier(name):
+    """Double-quote a table or column name, escaping embedded quotes"""
+    return '"' + name.replace('"', '""') + '"'
+
+def quote_alias(name):
+    """Output column aliases stay bare when they are plain lowercase identifiers"""
+    return name if PLAIN_IDENTIFIER_PATTERN.fullmatch(name) else quote_identifier(name)
+
+def parameter_type(value):
+    """PostgreSQL type a bind parameter is sent as"""
+    if isinstance(value, bool):
+        return "boolean"
+    if isinstance(value, int):
+        return "bigint"
+    if isinstance(value, float):
+        return "numeric"
+    return "text"
+
+def template_fingerprint(sql, params):
+    """Hash of a parameterized statement and its parameter types; equal for every query of the same shape"""
+    types = ",".join(parameter_type(value) for value in params)
+    return hashlib.sha256(f"{sql}\n{types}".encode("utf-8")).hexdigest()[:32]
+
+def parse_number(text):
+    """int or float for a plain decimal literal such as '150' or '99.5', else None"""
+    if not NUMBER_PATTERN.fullmatch(text):
+        return None
+    return float(text) if "." in text else int(text)
+
+class SqlWriter:
+    """
+    Collects the fragments of one statement; joined once at the end.
+    Given a params list, literals are appended to it and written as $1..$n placeholders.
+    """
+    __slots__ = ("parts", "params")
+
+    def __init__(self, params=None):
+        self.parts = []
+        self.params = params
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def identifier(self, name):
+        self.parts.append(quote_identifier(name))
+
+    def literal(self, value, inline=False):
+        if self.params is not None and not inline:
+            self.params.append(value)
+            self.parts.append(f"${len(self.params)}")
+        elif isinstance(value, str):
+            self.parts.append("'" + value.replace("'", "''") + "'")
+        else:
+            self.parts.append(str(value))
+
+    def nodes(self, nodes, separator):
+        first = True
+        for node in nodes:
+            if not first:
+                self.parts.append(separator)
+            first = False
+            node.render(self)
+
+    def getvalue(self):
+        return "".join(self.parts)
+
+class SqlNode(abc.ABC):
+    __slots__ = ()
+    aggregate = False
+
+    @abc.abstractmethod
+    def render(self, writer):
+        """Write this node's SQL to a SqlWriter"""
+
+    def sql(self):
+        writer = SqlWriter()
+        self.render(writer)
+        return writer.getvalue()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.sql()})"
+
+class ColumnRef(SqlNode):
+    """table.column (table may be None); column '*' renders unquoted"""
+    __slots__ = ("table", "column", "_text")
+
+    def __init__(self, table, column):
+        self.table = table
+        self.column = column
+        # Quoted once here; column references are rendered far more often than built
+        text = "*" if column == "*" else quote_identifier(column)
+        self._text = f"{quote_identifier(table)}.{text}" if table else text
+
+    def __eq__(self, other):
+        return isinstance(other, ColumnRef) and self.table == other.table and self.column == other.column
+
+    def __hash__(self):
+        return hash((self.table, self.column))
+
+    def render(self, writer):
+        writer.write(self._text)
+
+STAR = ColumnRef(None, "*")
+
+class Literal(SqlNode):
+    """A value; inline literals are part of the query shape and are never bound as parameters"""
+    __slots__ = ("value", "inline")
+
+    def __init__(self, value, inline=False):
+        self.value = value
+        self.inline = inline
+
+    def render(self, writer):
+        writer.literal(self.value, self.inline)
+
+class RawSql(SqlNode):
+    """Trusted SQL supplied by configuration: business metric expressions, time period filters"""
+    __slots__ = ("text", "aggregate")
+
+    def __init__(self, text):
+        self.text = text
+        self.aggregate = bool(AGGREGATE_PATTERN.search(text))
+
+    def render(self, writer):
+        writer.write(self.text)
+
+class FunctionCall(SqlNode):
+    __slots__ = ("name", "args", "distinct")
+
+    def __init__(self, name, args, distinct=False):
+        self.name = name
+        self.args = tuple(args)
+        self.distinct = distinct
+
+    @property
+    def aggregate(self):
+        return self.name in AGGREGATE_FUNCTIONS
+
+    def render(self, writer):
+        writer.write(self.name + ("(DISTINCT " if self.distinct else "("))
+        writer.nodes(self.args, ", ")
+        writer.write(")")
+
+class Cast(SqlNode):
+    __slots__ = ("expr", "type_name")
+
+    def __init__(self, expr, type_name):
+        self.expr = expr
+        self.type_name = type_name
+
+    def render(self, writer):
+        self.expr.render(writer)
+        writer.write("::" + self.type_name)
+
+class Comparison(SqlNode):
+    __slots__ = ("left", "operator", "right")
+
+    def __init__(self, left, operator, right):
+        self.left = left
+        self.operator = operator
+        self.right = right
+
+    def render(self, writer):
+        self.left.render(writer)
+        writer.write(f" {self.operator} ")
+        self.right.render(writer)
+
+class Between(SqlNode):
+    __slots__ = ("expr", "low", "high")
+
+    def __init__(self, expr, low, high):
+        self.expr = expr
+        self.low = low
+        self.high = high
+
+    def render(self, writer):
+        self.expr.render(writer)
+        writer.write(" BETWEEN ")
+        self.low.render(writer)
+        writer.write(" AND ")
+        self.high.render(writer)
+
+class SelectItem(SqlNode):
+    __slots__ = ("expr", "alias")
+
+    def __init__(self, expr, alias=None):
+        self.expr = expr
+        self.alias = alias
+
+    @property
+    def aggregate(self):
+        return self.expr.aggregate
+
+    def render(self, writer):
+        self.expr.render(writer)
+        if self.alias:
+            writer.write(" AS " + quote_alias(self.alias))
+
+class OrderItem(SqlNode):
+    __slots__ = ("expr", "direction")
+
+    def __init__(self, expr, direction):
+        self.expr = expr
+        self.direction = direction
+
+    def render(self, writer):
+        self.expr.render(writer)
+        writer.write(" " + self.direction)
+
+class Join(SqlNode):
+    """JOIN right_table ON left_table.left = right_table.right [AND ...]"""
+    __slots__ = ("left_table", "right_table", "conditions", "_text")
+
+    def __init__(self, left_table, right_table, conditions):
+        self.left_table = left_table
+        self.right_table = right_table
+        self.conditions = tuple(conditions)  # (left column, right column) pairs
+        # Joins come from the planner's memo, so the clause is rendered once per plan
+        on = " AND ".join(
+            f"{ColumnRef(left_table, left_col).sql()} = {ColumnRef(right_table, right_col).sql()}"
+            for left_col, right_col in self.conditions
+        )
+        self._text = f" JOIN {quote_identifier(right_table)} ON {on}"
+
+    def render(self, writer):
+        writer.write(self._text)
+
+# -------- PATTERN RULE TABLES --------
+# Each table lists (pattern, output) rows for one kind of clause. Tables are compiled once at
+# import, so adding a rule means adding a row here.
+# Kinds are scanned separately so a match of one kind never hides a match of another
+# (e.g. "price less than 20" is both an amount rule and a column comparison).
+
+# Direct "total amount greater than X" phrasings; the first match wins and ends WHERE extraction
+DIRECT_AMOUNT_RULES = [
+    # Match "orders that have total amount greater than X"
+    (r'orders\s+(?:that|which|with)?\s+(?:have|has)?\s+(?:a\s+)?total\s+amount\s+(?:greater|more|higher|larger|bigger|>)\s+(?:than)?\s+(\d+(?:\.\d+)?)', ">"),
+    # Match simpler patterns like "orders with amount > X"
+    (r'orders\s+(?:with|having)\s+(?:total\s+)?amount\s+(?:>|greater|more|higher|larger)\s+(?:than)?\s+(\d+(?:\.\d+)?)', ">"),
+    # Match "show me orders where total amount exceeds X"
+    (r'(?:show|get|find)\s+(?:me\s+)?orders\s+(?:where|with)\s+(?:total\s+)?amount\s+(?:exceeds|>|greater|more|above)\s+(?:than)?\s+(\d+(?:\.\d+)?)', ">"),
+    # Direct pattern for "total amount greater than X"
+    (r'total\s+amount\s+(?:greater|more|higher|larger|bigger|>)\s+(?:than)?\s+(\d+(?:\.\d+)?)', ">"),
+    # Super general catch-all pattern
+    (r'(?:amount|total).{0,20}(?:greater|more|higher|above|exceeds|>).{0,10}(\d+(?:\.\d+)?)', ">"),
+]
+
+# Generic amount comparisons, always applied to orders.total_amount -> operator
+AMOUNT_RULES = [
+    # Match patterns like "total amount greater than 150" or "amount > 150"
+    (r'(?:total\s+)?(?:amount|price|sum|value)(?:\s+\w+){0,4}\s+(?:greater than|more than|above|exceeds|>)\s+(\d+(?:\.\d+)?)', ">"),
+    # Match patterns like "total amount less than 150" or "amount < 150"
+    (r'(?:total\s+)?(?:amount|price|sum|value)(?:\s+\w+){0,4}\s+(?:less than|below|under|<)\s+(\d+(?:\.\d+)?)', "<"),
+    # Match patterns like "total amount at least 150" or "amount >= 150"
+    (r'(?:total\s+)?(?:amount|price|sum|value)(?:\s+\w+){0,4}\s+(?:at least|no less than|>=)\s+(\d+(?:\.\d+)?)', ">="),
+    # Match patterns like "total amount at most 150" or "amount <= 150"
+    (r'(?:total\s+)?(?:amount|price|sum|value)(?:\s+\w+){0,4}\s+(?:at most|no more than|<=)\s+(\d+(?:\.\d+)?)', "<="),
+]
+
+# Column comparisons: (column term, value) -> operator
+COMPARISON_RULES = [
+    (r'(\w+)\s+is\s+(\w+)', "="),
+    (r'(\w+)\s+equals\s+(\w+)', "="),
+    (r'(\w+)\s+=\s+(\w+)', "="),
+    (r'(\w+)\s+equal to\s+(\w+)', "="),
+    (r'where\s+(\w+)\s+is\s+(\w+)', "="),
+    (r'(\w+)\s+greater than\s+(\d+)', ">"),
+    (r'(\w+)\s+more than\s+(\d+)', ">"),
+    (r'(\w+)\s+above\s+(\d+)', ">"),
+    (r'(\w+)\s+>\s+(\d+)', ">"),
+    (r'(\w+)\s+less than\s+(\d+)', "<"),
+    (r'(\w+)\s+below\s+(\d+)', "<"),
+    (r'(\w+)\s+<\s+(\d+)', "<"),
+    (r'(\w+)\s+at least\s+(\d+)', ">="),
+    (r'(\w+)\s+at most\s+(\d+)', "<="),
+    (r'(\w+)\s+not equal to\s+(\w+)', "!="),
+    (r'(\w+)\s+!=\s+(\w+)', "!="),
+    (r'(\w+)\s+different from\s+(\w+)', "!="),
+]
+
+# Date ranges: (column term, start, end)
+DATE_RANGE_RULES = [
+    (r'(\w+)\s+between\s+(\w+)\s+and\s+(\w+)', "BETWEEN"),
+    (r'(\w+)\s+from\s+(\w+)\s+to\s+(\w+)', "BETWEEN"),
+]
+
+# Text search: (column term, value)
+LIKE_RULES = [
+    (r'(\w+)\s+contains\s+(\w+)', "ILIKE"),
+    (r'(\w+)\s+like\s+(\w+)', "ILIKE"),
+    (r'(\w+)\s+with\s+(\w+)\s+in it', "ILIKE"),
+]
+
+# Order status mentions; the status word is the last captured group
+STATUS_RULES = [
+    (r'(\w+)\s+status\s+is\s+(\w+)', "="),
+    (r'status\s+is\s+(\w+)', "="),
+    (r'(\w+)\s+orders', "="),
+]
+
+STATUS_VALUES = {
+    'complete': 'completed',
+    'completed': 'completed',
+    'pending': 'pending',
+    'shipped': 'shipped',
+    'cancelled': 'cancelled',
+    'canceled': 'cancelled',
+    'processing': 'processing',
+    'new': 'new',
+    'delivered': 'delivered'
+}
+
+# HAVING comparisons: (column term, value) -> (operator, aggregate function or None to infer)
+HAVING_RULES = [
+    (r'having\s+(\w+)\s+greater than\s+(\d+)', (">", None)),
+    (r'having\s+(\w+)\s+>\s+(\d+)', (">", None)),
+    (r'having\s+(\w+)\s+less than\s+(\d+)', ("<", None)),
+    (r'having\s+(\w+)\s+<\s+(\d+)', ("<", None)),
+    (r'having\s+(\w+)\s+at least\s+(\d+)', (">=", None)),
+    (r'having\s+(\w+)\s+at most\s+(\d+)', ("<=", None)),
+    (r'having\s+(\w+)\s+=\s+(\d+)', ("=", None)),
+    (r'having\s+(\w+)\s+equals?\s+(\d+)', ("=", None)),
+    (r'where\s+total\s+(\w+)\s+is\s+greater than\s+(\d+)', (">", "SUM")),
+    (r'where\s+total\s+(\w+)\s+is\s+less than\s+(\d+)', ("<", "SUM")),
+    (r'where\s+average\s+(\w+)\s+is\s+greater than\s+(\d+)', (">", "AVG")),
+    (r'where\s+average\s+(\w+)\s+is\s+less than\s+(\d+)', ("<", "AVG")),
+]
+
+# "more/less than X items/orders" patterns for COUNT aggregates:
+# (value[, item term]) -> (operator, counted (table, column) or None to infer from the item term)
+HAVING_COUNT_RULES = [
+    (r'with\s+more than\s+(\d+)\s+(\w+)', (">", None)),
+    (r'with\s+at least\s+(\d+)\s+(\w+)', (">=", None)),
+    (r'with\s+less than\s+(\d+)\s+(\w+)', ("<", None)),
+    (r'who\s+ordered\s+more than\s+(\d+)\s+times', (">", ("orders", "order_id"))),
+]
+
+# Explicit ordering: (column term)
+ORDER_RULES = [
+    (r'order\s+by\s+(\w+)', "ORDER BY"),
+    (r'sort\s+by\s+(\w+)', "ORDER BY"),
+    (r'arranged\s+by\s+(\w+)', "ORDER BY"),
+    (r'ranked\s+by\s+(\w+)', "ORDER BY"),
+]
+
+class RuleSet:
+    """
+    A rule table with every pattern compiled once at import. Matches are reported as
+    (output, captured groups) of the rule that fired. Each rule scans the text on its own,
+    so overlapping rules ("at least 100 and at most 500") all still fire.
+    """
+    def __init__(self, rules):
+        self.rules = [(re.compile(pattern, re.IGNORECASE), output) for pattern, output in rules]
+
+    def search(self, text):
+        """First match of the first rule that matches anywhere in the text, or None"""
+        for pattern, output in self.rules:
+            match = pattern.search(text)
+            if match:
+                return output, match.groups()
+        return None
+
+    def finditer(self, text):
+        """Every non-overlapping match of each rule, rule by rule in table order"""
+        for pattern, output in self.rules:
+            for match in pattern.finditer(text):
+                yield output, match.groups()
+
+RULE_SETS = {
+    "direct_amount": RuleSet(DIRECT_AMOUNT_RULES),
+    "amount": RuleSet(AMOUNT_RULES),
+    "comparison": RuleSet(COMPARISON_RULES),
+    "date_range": RuleSet(DATE_RANGE_RULES),
+    "like": RuleSet(LIKE_RULES),
+    "status": RuleSet(STATUS_RULES),
+    "having": RuleSet(HAVING_RULES),
+    "having_count": RuleSet(HAVING_COUNT_RULES),
+    "order": RuleSet(ORDER_RULES),
+}
+
+# Default measure for amount comparisons and top/bottom rankings
+TOTAL_AMOUNT = ColumnRef("orders", "total_amount")
+
+# Time-based grouping using PostgreSQL date functions; the truncation unit is part of
+# the query shape, so it stays inline in parameterized SQL
+TIME_GROUPS = {
+    'daily': FunctionCall("DATE", (ColumnRef("orders", "order_date"),)),
+    'day': FunctionCall("DATE", (ColumnRef("orders", "order_date"),)),
+    'monthly': FunctionCall("DATE_TRUNC", (Literal("month", inline=True), ColumnRef("orders", "order_date"))),
+    'month': FunctionCall("DATE_TRUNC", (Literal("month", inline=True), ColumnRef("orders", "order_date"))),
+    'yearly': FunctionCall("DATE_TRUNC", (Literal("year", inline=True), ColumnRef("orders", "order_date"))),
+    'year': FunctionCall("DATE_TRUNC", (Literal("year", inline=True), ColumnRef("orders", "order_date"))),
+    'quarterly': FunctionCall("DATE_TRUNC", (Literal("quarter", inline=True), ColumnRef("orders", "order_date"))),
+    'quarter': FunctionCall("DATE_TRUNC", (Literal("quarter", inline=True), ColumnRef("orders", "order_date"))),
+    'weekly': FunctionCall("DATE_TRUNC", (Literal("week", inline=True), ColumnRef("orders", "order_date"))),
+    'week': FunctionCall("DATE_TRUNC", (Literal("week", inline=True), ColumnRef("orders", "order_date"))),
+}
+
+class QueryAnalysis:
+    """
+    Cleaned query text tokenized and normalized once and shared by every extract stage:
+    lowercase text, word tokens and their spans, keyword flags, numeric literals and
+    schema vocabulary mentions.
+    """
+    __slots__ = ("text", "lower", "tokens", "spans", "token_set", "numbers", "flags", "mentions", "candidate_tables",
+                 "_number_after")
+
+    TOKEN_PATTERN = re.compile(r'\w+')
+
+    def __init__(self, text, vocabulary=None):
+        self.text = text
+        self.lower = text.lower()
+        self.tokens = []
+        self.spans = []
+        for match in self.TOKEN_PATTERN.finditer(self.lower):
+            self.tokens.append(match.group())
+            self.spans.append(match.span())
+        self.token_set = frozenset(self.tokens)
+
+        # Numeric literals with their spans, and the word each one directly follows
+        self.numbers = []
+        self._number_after = []
+        for i, token in enumerate(self.tokens):
+            if token.isdecimal():
+                self.numbers.append((token, self.spans[i]))
+                if i and self.lower[self.spans[i - 1][1]:self.spans[i][0]].isspace():
+                    self._number_after.append((self.tokens[i - 1], token))
+
+        self.flags = frozenset(name for name, phrases in QUERY_KEYWORDS.items() if self.has_any(phrases))
+        self.mentions = vocabulary.find_all(text) if vocabulary is not None else VocabularyMentions([])
+        self.candidate_tables = None  # filled in lazily by the parser
+
+    def _at_boundary(self, pos):
+        before = pos > 0 and is_word_char(self.lower[pos - 1])
+        after = pos < len(self.lower) and is_word_char(self.lower[pos])
+        return before != after
+
+    def has_phrase(self, phrase):
+        """Word-bounded, case-insensitive search; single words are looked up in the token set"""
+        if " " not in phrase:
+            return phrase in self.token_set
+        start = self.lower.find(phrase)
+        while start != -1:
+            if self._at_boundary(start) and self._at_boundary(start + len(phrase)):
+                return True
+            start = self.lower.find(phrase, start + 1)
+        return False
+
+    def has_any(self, phrases):
+        return any(self.has_phrase(phrase) for phrase in phrases)
+
+    def number_after(self, word):
+        """First numeric literal that directly follows the given word, e.g. 'top 10' -> '10'"""
+        for previous, number in self._number_after:
+            if previous == word:
+                return number
+        return None
+
+class SchemaModel:
+    """
+    Compact, read-only tables and columns of a schema context, shared by every structure of
+    its parser. A table's id is its position in `tables`, and `table_columns` holds each
+    table's column names by table id, with a frozenset of them per table id for membership
+    tests. Identifiers are interned, so the many schema contexts cached in one process share
+    a single copy of every name.
+    """
+    __slots__ = ("tables", "table_ids", "table_columns", "table_column_sets", "column_tables",
+                 "column_positions", "_refs")
+
+    def __init__(self, schema):
+        intern = sys.intern
+        columns_by_table = {}
+        for table_dict in schema:
+            for table_name, columns in table_dict.items():
+                columns_by_table[intern(table_name)] = tuple(intern(col) for col in column_names(columns) if col)
+        self.tables = tuple(columns_by_table)
+        self.table_ids = {table: table_id for table_id, table in enumerate(self.tables)}
+        self.table_columns = tuple(columns_by_table.values())
+        self.table_column_sets = tuple(frozenset(columns) for columns in self.table_columns)
+
+        # Owning tables of every column in schema order, and the column's position in each
+        owners = {}
+        positions = {}
+        for table, columns in columns_by_table.items():
+            for position, col in enumerate(columns):
+                owners.setdefault(col, []).append(table)
+                positions.setdefault(col, []).append(position)
+        self.column_tables = {col: tuple(tables) for col, tables in owners.items()}
+        self.column_positions = {col: tuple(cols) for col, cols in positions.items()}
+
+        self._refs = {}  # (table, column) -> ColumnRef, for schema columns only
+
+    def __contains__(self, table):
+        return table in self.table_ids
+
+    def __len__(self):
+        return len(self.tables)
+
+    def columns(self, table):
+        """Column names of a table in schema order; empty for unknown tables"""
+        table_id = self.table_ids.get(table)
+        return () if table_id is None else self.table_columns[table_id]
+
+    def has_column(self, table, column):
+        table_id = self.table_ids.get(table)
+        return table_id is not None and column in self.table_column_sets[table_id]
+
+    def ref(self, table, column):
+        """ColumnRef for table.column; those of schema columns are built once and shared"""
+        key = (table, column)
+        ref = self._refs.get(key)
+        if ref is None:
+            ref = ColumnRef(table, column)
+            # Free-form terms that resolve to no column are not kept, so the map stays bounded
+            if (column == "*" and table in self.table_ids) or self.has_column(table, column):
+                self._refs[key] = ref
+        return ref
+
+    def memo_reserve(self):
+        """Approximate bytes _refs holds once every schema column has been referenced"""
+        if not self.tables:
+            return 0
+        table, columns = self.tables[0], self.table_columns[0]
+        sample = ((table, columns[0] if columns else "*"), ColumnRef(table, columns[0] if columns else "*"))
+        capacity = len(self.tables) + sum(len(columns) for columns in self.table_columns)
+        # Names are shared with the schema, so only the key tuple and the reference count
+        return capacity * (MEMO_SLOT_BYTES + estimate_size(sample, {id(table), *map(id, columns[:1])}))
+
+class JoinPlanner:
+    """
+    Relationship graph of a schema context, built once per parser. Join paths connecting all
+    mentioned tables are found with a shortest-path Steiner tree heuristic (repeatedly attach
+    the nearest remaining table to the tree) and memoized per table list.
+    """
+    MAX_MEMO_ENTRIES = 1024
+
+    def __init__(self, relationships):
+        # table -> {neighbor: join conditions oriented from table to neighbor}; a relationship
+        # declared in the traversal direction is preferred over the reverse one
+        adjacency = {}
+        for left, right in relationships:
+            if left != right:
+                adjacency.setdefault(left, {})[right] = self.oriented_conditions(relationships, (left, right), left)
+        for left, right in relationships:
+            if left != right and left not in adjacency.setdefault(right, {}):
+                adjacency[right][left] = self.oriented_conditions(relationships, (left, right), right)
+
+        # Frozen to table -> ((neighbor, conditions), ...) sorted by neighbor, so ties between
+        # equally short paths always break the same way
+        self.adjacency = {table: tuple(sorted(neighbors.items(), key=lambda item: item[0]))
+                          for table, neighbors in adjacency.items()}
+        self._memo = {}
+
+    @staticmethod
+    def oriented_conditions(relationships, key, from_table):
+        """
+        Convert a relationship's joinCondition items into (column, column) pairs with the
+        first column on from_table. Accepts {"left": col, "right": col} conditions as well
+        as qualified {"table.col": "other_table.col"} pairs.
+        """
+        items = dict(relationships[key])
+        if set(items) == {'left', 'right'}:
+            left_col, right_col = items['left'], items['right']
+            if from_table != key[0]:
+                left_col, right_col = right_col, left_col
+            return ((sys.intern(left_col), sys.intern(right_col)),)
+
+        conditions = []
+        for first, second in items.items():
+            first_table, _, first_col = first.rpartition('.')
+            _, _, second_col = second.rpartition('.')
+            first_col, second_col = sys.intern(first_col), sys.intern(second_col)
+            if first_table == from_table or (not first_table and from_table == key[0]):
+                conditions.append((first_col, second_col))
+            else:
+                conditions.append((second_col, first_col))
+        return tuple(conditions)
+
+    def plan(self, tables):
+        """Joins connecting the tables, each attaching one new table to those already joined"""
+        key = tuple(tables)
+        joins = self._memo.get(key)
+        if joins is None:
+            joins = self._steiner_joins(key)
+            if len(self._memo) >= self.MAX_MEMO_ENTRIES:
+                self._memo.clear()
+            self._memo[key] = joins
+        return list(joins)
+
+    def memo_reserve(self):
+        """
+        Approximate bytes the plan memo holds when full, taking a plan as 4 tables whose
+        connecting paths on a large schema come to about 8 joins
+        """
+        plan = sys.getsizeof([])
+        for table, neighbors in self.adjacency.items():
+            neighbor, conditions = neighbors[0]
+            plan += 8 * estimate_size(Join(table, neighbor, conditions), {id(table), id(neighbor), id(conditions)})
+            break
+        return self.MAX_MEMO_ENTRIES * (MEMO_SLOT_BYTES + sys.getsizeof((None,) * 4) + plan)
+
+    def _steiner_joins(self, tables):
+        joins = []
+        if len(tables) < 2:
+            return joins
+
+        # Insertion ordered, so the search below starts from the tree's tables in join order
+        tree = {tables[0]: None}
+        remaining = [table for table in tables[1:] if table not in tree]
+        while remaining:
+            path = self._shortest_path(tree, set(remaining))
+            if path is None:
+                # Tables with no relationship path to the tree are left unjoined
+                break
+            for left, right, conditions in path:
+                joins.append(Join(left, right, conditions))
+                tree[right] = None
+            remaining = [table for table in remaining if table not in tree]
+        return joins
+
+    def _shortest_path(self, sources, targets):
+        """
+        Breadth-first search from every table in the tree to the nearest target table;
+        returns the path as (table, next table, conditions) steps. Sources are expanded in
+        the order given and neighbors in adjacency order, so the result is deterministic.
+        """
+        parents = dict.fromkeys(sources)
+        frontier = list(parents)
+        while frontier:
+            next_frontier = []
+            for table in frontier:
+                for neighbor, conditions in self.adjacency.get(table, ()):
+                    if neighbor in parents:
+                        continue
+                    parents[neighbor] = (table, conditions)
+                    if neighbor in targets:
+                        path = []
+                        step = neighbor
+                        while parents[step] is not None:
+                            previous, step_conditions = parents[step]
+                            path.append((previous, step, step_conditions))
+                            step = previous
+                        return path[::-1]
+                    next_frontier.append(neighbor)
+            frontier = next_frontier
+        return None
+
+class ColumnIndex:
+    """
+    Column lookup structures for one schema context, built once per parser: an exact
+    alias -> column map, column -> owning tables, and a token index for partial matches.
+    Partial matches are ranked (exact, whole token, prefix/suffix, substring, then the
+    closest length and schema order), so "id" prefers an id column over customer_id.
+    """
+    MAX_MEMO_ENTRIES = 4096
+
+    def __init__(self, model, column_aliases):
+        self.model = model
+        self.tables = model.tables
+        self.column_tables = model.column_tables
+        self.column_positions = model.column_positions
+
+        # Exact alias map; the first column (in alias map order) claiming a term wins
+        self.alias_to_column = {}
+        for col, aliases in column_aliases.items():
+            for alias in [col] + list(aliases):
+                self.alias_to_column.setdefault(alias, col)
+
+        # Column name token -> columns containing it as a whole "_"-separated token
+        token_columns = {}
+        for col in self.column_tables:
+            for token in col.split("_"):
+                if token:
+                    token_columns.setdefault(sys.intern(token), []).append(col)
+        self.token_columns = {token: tuple(columns) for token, columns in token_columns.items()}
+
+        self._memo = {}
+
+    @staticmethod
+    def _rank(term, col):
+        """Lower is better; None if the column does not match the term at all"""
+        if col == term:
+            return 0
+        if term in col.split("_") or col in term.split("_"):
+            return 1
+        if col.startswith(term) or col.endswith(term) or term.startswith(col) or term.endswith(col):
+            return 2
+        if term in col or col in term:
+            return 3
+        return None
+
+    def _token_candidates(self, term):
+        """Columns that equal the term or share a whole token with it"""
+        candidates = set()
+        if term in self.column_tables:
+            candidates.add(term)
+        for token in term.split("_"):
+            candidates.update(self.token_columns.get(token, ()))
+        return candidates
+
+    def _best(self, term, tables):
+        # Exact and whole-token matches outrank everything else, so the scan over the
+        # columns in scope is only needed when none of them belongs to those tables
+        return (self._best_of(term, tables, self._token_candidates(term))
+                or self._best_of(term, tables, {col for table in tables for col in self.model.columns(table)}))
+
+    def _best_of(self, term, tables, candidates):
+        best_score, best = None, None
+        for col in candidates:
+            rank = self._rank(term, col)
+            if rank is None:
+                continue
+            for table, position in zip(self.column_tables[col], self.column_positions[col]):
+                if table not in tables:
+                    continue
+                score = (rank, abs(len(col) - len(term)), tables[table], position)
+                if best_score is None or score < best_score:
+                    best_score, best = score, (table, col)
+        return best
+
+    def best_match(self, term, tables=None):
+        """(table, column) best matching a free-form term, within the given tables or the whole schema"""
+        tables = tuple(self.tables if tables is None else tables)
+        key = (term, tables)
+        if key in self._memo:
+            return self._memo[key]
+
+        normalized = term.replace(" ", "_")
+        scope = {name: position for position, name in enumerate(tables) if name in self.model}
+        result = self._best(normalized, scope) if normalized and scope else None
+
+        if len(self._memo) >= self.MAX_MEMO_ENTRIES:
+            self._memo.clear()
+        self._memo[key] = result
+        return result
+
+    def locate(self, term, tables=None):
+        """(table, column) for a term, preferring the given tables: aliases first, then partial matches"""
+        col = self.alias_to_column.get(term)
+        if col in self.column_tables:
+            owners = self.column_tables[col]
+            return next((table for table in owners if tables is None or table in tables), owners[0]), col
+        return self.best_match(term, tables)
+
+    def has_column(self, table, col):
+        return self.model.has_column(table, col)
+
+    def memo_reserve(self):
+        """Approximate bytes the best_match memo holds when full"""
+        # Keys are a term and the tables in scope, at most the pruned candidate tables
+        scope = min(len(self.tables), TABLE_CANDIDATE_LIMIT) if TABLE_CANDIDATE_LIMIT else len(self.tables)
+        entry = (sys.getsizeof((None, None)) + sys.getsizeof("x" * 16) + sys.getsizeof((None,) * scope)
+                 + sys.getsizeof((None, None)))
+        return self.MAX_MEMO_ENTRIES * (MEMO_SLOT_BYTES + entry)
+
+class TableRanker:
+    """
+    Token -> table inverted index with BM25 scoring. On schemas with more than `limit`
+    tables only the top-scoring candidates (plus any explicitly mentioned table) are
+    handed to the later stages; smaller schemas are never pruned.
+    """
+    K1 = 1.2
+    B = 0.75
+
+    # Table names and aliases count for more than column names and column aliases
+    NAME_WEIGHT = 3
+
+    # Terms found in more than this share of the tables carry no signal (e.g. "id")
+    MAX_DOC_FREQ_RATIO = 0.5
+
+    TERM_PATTERN = re.compile(r'[a-z0-9]+')
+
+    def __init__(self, model, table_aliases, column_aliases, limit=TABLE_CANDIDATE_LIMIT):
+        self.tables = model.tables
+        self.positions = model.table_ids
+        self.limit = limit
+        self.prunes = bool(limit) and len(self.tables) > limit
+
+        names = {table: [table] for table in self.tables}
+        for alias, table in table_aliases.items():
+            if table in names:
+                names[table].append(alias)
+
+        # Weighted term frequencies of every table "document"
+        documents = []
+        for table, columns in zip(self.tables, model.table_columns):
+            freqs = {}
+            for name in names[table]:
+                for term in self.terms(name):
+                    freqs[term] = freqs.get(term, 0) + self.NAME_WEIGHT
+            for col in columns:
+                for phrase in [col] + list(column_aliases.get(col, [])):
+                    for term in self.terms(phrase):
+                        freqs[term] = freqs.get(term, 0) + 1
+            documents.append(freqs)
+
+        doc_freqs = {}
+        for freqs in documents:
+            for term in freqs:
+                doc_freqs[term] = doc_freqs.get(term, 0) + 1
+
+        # Scores do not depend on the query beyond which terms it contains, so each
+        # posting stores the finished BM25 contribution of its term to its table
+        total = len(documents)
+        # Schemas whose names have no ASCII terms (e.g. only Devanagari) have empty documents
+        avg_length = max(sum(sum(freqs.values()) for freqs in documents) / total if total else 0, 1)
+        postings = {}
+        for position, freqs in enumerate(documents):
+            length_norm = self.K1 * (1 - self.B + self.B * sum(freqs.values()) / avg_length)
+            for term, tf in freqs.items():
+                df = doc_freqs[term]
+                if total > 1 and df > self.MAX_DOC_FREQ_RATIO * total:
+                    continue
+                idf = math.log(1 + (total - df + 0.5) / (df + 0.5))
+                postings.setdefault(term, []).append((position, idf * tf * (self.K1 + 1) / (tf + length_norm)))
+
+        # Postings are stored flat: a term's id selects the span offsets[id]:offsets[id + 1]
+        # of the table position and weight arrays
+        self.term_ids = {}
+        self._offsets = array('l', [0])
+        self._positions = array('l')
+        self._weights = array('d')
+        for term, entries in postings.items():
+            self.term_ids[sys.intern(term)] = len(self.term_ids)
+            for position, weight in entries:
+                self._positions.append(position)
+                self._weights.append(weight)
+            self._offsets.append(len(self._positions))
+
+    @staticmethod
+    def stem(term):
+        """Crude plural folding so 'customers', 'customer' and 'customer_id' share a term"""
+        if len(term) > 3 and term.endswith('s') and not term.endswith('ss'):
+            return term[:-1]
+        return term
+
+    @classmethod
+    def terms(cls, text):
+        return [cls.stem(term) for term in cls.TERM_PATTERN.findall(text.lower())]
+
+    def scores(self, text):
+        """BM25 score of every table sharing at least one term with the text, keyed by position"""
+        scores = {}
+        offsets, positions, weights = self._offsets, self._positions, self._weights
+        for term in set(self.terms(text)):
+            term_id = self.term_ids.get(term)
+            if term_id is None:
+                continue
+            for i in range(offsets[term_id], offsets[term_id + 1]):
+                position = positions[i]
+                scores[position] = scores.get(position, 0.0) + weights[i]
+        return scores
+
+    def candidates(self, text, required=()):
+        """Tables worth considering for a query, in schema order"""
+        if not self.prunes:
+            return self.tables
+        top = heapq.nlargest(self.limit, self.scores(text).items(), key=lambda item: (item[1], -item[0]))
+        positions = {position for position, _ in top}
+        positions.update(self.positions[table] for table in required if table in self.positions)
+        return tuple(self.tables[position] for position in sorted(positions))
+
 class EnhancedIntentParser:
-    def __init__(self, schema, relationships, table_aliases, column_aliases, business_metrics, time_periods):
-        self.schema = schema
-        self.relationships = relationships
+    # SQL actions checked in priority order
+    ACTIONS = ("select", "count", "average", "sum", "min", "max")
+
+    # Words that introduce a LIMIT, checked in priority order
+    LIMIT_WORDS = ("limit", "top", "first", "bottom", "last", "highest", "lowest", "best", "worst")
+
+    # Common grouping candidates by table
+    GROUPING_CANDIDATES = {
+        'customers': ['name', 'customer_id'],
+        'orders': ['status', 'order_date'],
+        'products': ['category', 'name', 'product_id'],
+        'order_items': ['product_id']
+    }
+
+    # What an extract stage reads from the analysis, for stages that read less than the
+    # whole text; stages whose inputs are unchanged are reused between parses of a session
+    STAGE_INPUTS = {
+        "extract_action": lambda parser, analysis: analysis.flags,
+        "extract_tables": lambda parser, analysis: analysis.mentions.hits,
+        "extract_columns": lambda parser, analysis: (analysis.mentions.terms, analysis.flags),
+    }
+
+    def __init__(self, model, relationships, table_aliases, column_aliases, business_metrics, time_periods):
+        self.model = model
         self.table_aliases = table_aliases
         self.column_aliases = column_aliases
         self.business_metrics = business_metrics
         self.time_periods = time_periods
         
-        # Define action patterns
-        self.action_patterns = {
-            "select": r'\b(show|list|display|get|find|search|select|query|retrieve|give me|what are|what is)\b',
-            "count": r'\b(count|how many|total number|number of)\b',
-            "average": r'\b(average|avg|mean|typical)\b',
-            "sum": r'\b(sum|total|add up|overall)\b',
-            "min": r'\b(minimum|min|smallest|lowest|least)\b',
-            "max": r'\b(maximum|max|largest|highest|most|greatest)\b'
-        }
-        
-        # Compile table name pattern from schema and aliases
-        all_table_terms = list(self.schema.keys()) + list(self.table_aliases.keys())
-        table_names = '|'.join(all_table_terms)
-        self.table_pattern = re.compile(fr'\b({table_names})\b')
+        # Build the vocabulary automaton used to find table, column and metric mentions
+        schema_columns = [col for columns in self.model.table_columns for col in columns]
+        grouping_columns = [col for columns in self.GROUPING_CANDIDATES.values() for col in columns]
+        self.vocabulary = VocabularyMatcher([
+            ("table", self.model.tables),
+            ("table_alias", self.table_aliases.keys()),
+            ("column", schema_columns + list(self.column_aliases.keys()) + grouping_columns),
+            ("column_alias", [alias for aliases in self.column_aliases.values() for alias in aliases]),
+            ("metric", self.business_metrics.keys()),
+        ])
         
-        # Compile join indicators
-        self.join_pattern = re.compile(r'\b(with|along with|including|related|associated|linked to|joined with|from|and their|who have)\b')
+        # Index columns and aliases for column name resolution
+        self.column_index = ColumnIndex(self.model, self.column_aliases)
         
-        # Compile group by indicators
-        self.group_pattern = re.compile(r'\b(group by|grouped by|per|by|categorized by|segmented by|broken down by)\b')
+        # Rank tables by relevance so very large schemas can be pruned per query
+        self.table_ranker = TableRanker(self.model, self.table_aliases, self.column_aliases)
         
-        # Build aggregation indicator pattern
-        self.agg_pattern = re.compile(r'\b(total|average|count|sum|min|max|mean|highest|lowest)\b')
+        # Precompute the relationship graph used to plan joins
+        self.join_planner = JoinPlanner(relationships)
         
-        # Build time period pattern
-        time_period_terms = '|'.join(self.time_periods.keys())
-        self.time_pattern = re.compile(fr'\b({time_period_terms})\b')
-        
-        # Build business metrics pattern
-        metrics_terms = '|'.join(self.business_metrics.keys())
-        self.metrics_pattern = re.compile(fr'\b({metrics_terms})\b')
-    
+        # Counts parses so extract stage latencies can be sampled
+        self._parse_counter = itertools.count()
+
+    def memo_reserve(self):
+        """Approximate bytes the schema, column and join memos hold once they are full"""
+        return self.model.memo_reserve() + self.column_index.memo_reserve() + self.join_planner.memo_reserve()
+
     def normalize_table_name(self, table_term):
         """Convert potential table alias to actual table name"""
-        if table_term in self.schema:
+        if table_term in self.model:
             return table_term
         if table_term in self.table_aliases:
             return self.table_aliases[table_term]
         # Try singular to plural conversion (simple English rule)
-        if table_term + "s" in self.schema:
+        if table_term + "s" in self.model:
             return table_term + "s"
         return None
     
     def normalize_column_name(self, col_term, table=None):
         """Convert potential column alias to actual column name"""
         # Direct match
-        for col, aliases in self.column_aliases.items():
-            if col_term == col or col_term in aliases:
-                return col
+        col = self.column_index.alias_to_column.get(col_term)
+        if col is not None:
+            return col
                 
-        # If table is specified, check columns for that table
-        if table and table in self.schema:
-            for col in self.schema[table]:
-                if col_term in col or col in col_term:
-                    return col
+        # If table is specified, find the best partial match among that table's columns
+        if table:
+            match = self.column_index.best_match(col_term, (table,))
+            if match:
+                return match[1]
                     
         return col_term  # Return as is if no match
     
+    def analyze(self, text):
+        """Tokenize and normalize text once; stages accept either raw text or the analysis"""
+        if isinstance(text, QueryAnalysis):
+            return text
+        return QueryAnalysis(text, self.vocabulary)
+
+    def candidate_tables(self, analysis):
+        """Tables relevant to the query; every table unless the schema is large enough to prune"""
+        if analysis.candidate_tables is None:
+            mentioned = [self.normalize_table_name(term)
+                         for _, _, term, _ in analysis.mentions.non_overlapping(("table", "table_alias"))]
+            analysis.candidate_tables = self.table_ranker.candidates(analysis.lower, mentioned)
+        return analysis.candidate_tables
+
     def extract_action(self, text):
         """Extract the SQL action type (SELECT, COUNT, etc.)"""
-        for action, pattern in self.action_patterns.items():
-            if re.search(pattern, text, re.IGNORECASE):
+        analysis = self.analyze(text)
+        for action in self.ACTIONS:
+            if action in analysis.flags:
                 return action
         return "select"  # Default action
-    
+
     def extract_tables(self, text):
         """Extract all mentioned tables and determine joins"""
-        # Find all table mentions
-        table_mentions = []
-        for match in self.table_pattern.finditer(text):
-            table_term = match.group(1)
+        analysis = self.analyze(text)
+        mentions = analysis.mentions
+
+        # Find all table mentions, in text order
+        tables = []
+        seen = set()
+        for _, _, table_term, _ in mentions.non_overlapping(("table", "table_alias")):
             table_name = self.normalize_table_name(table_term)
-            if table_name and table_name not in [t['name'] for t in table_mentions]:
-                table_mentions.append({
-                    'name': table_name,
-                    'position': match.start()
-                })
+            if table_name and table_name not in seen:
+                seen.add(table_name)
+                tables.append(table_name)
         
         # If no tables found explicitly, try to infer from business metrics
-        if not table_mentions:
+        if not tables:
             for metric, _ in self.business_metrics.items():
-                if metric in text:
+                if metric in mentions:
                     # Map metrics to their primary tables
                     if any(term in metric for term in ['revenue', 'sales', 'income', 'orders', 'average order']):
-                        table_mentions.append({'name': 'orders', 'position': 0})
+                        tables.append('orders')
                     elif any(term in metric for term in ['customer', 'client']):
-                        table_mentions.append({'name': 'customers', 'position': 0})
+                        tables.append('customers')
                     elif any(term in metric for term in ['product', 'inventory']):
-                        table_mentions.append({'name': 'products', 'position': 0})
+                        tables.append('products')
                     break
 
         # If still no tables, look for column names to infer tables
-        if not table_mentions:
+        if not tables:
+            candidates = self.candidate_tables(analysis)
             for col, aliases in self.column_aliases.items():
                 for alias in [col] + aliases:
-                    if re.search(fr'\b{alias}\b', text, re.IGNORECASE):
+                    if alias in mentions:
                         # Find which table this column belongs to
-                        for table, columns in self.schema.items():
+                        owning_tables = self.model.column_tables.get(col)
+                        if owning_tables:
+                            owner = next((table for table in owning_tables if table in candidates), owning_tables[0])
+                            tables.append(owner)
+                            continue
+                        for table in candidates:
+                            columns = self.model.columns(table)
                             if any(c.split('_')[0] in col or col.split('_')[0] in c for c in columns):
-                                table_mentions.append({'name': table, 'position': 0})
+                                tables.append(table)
                                 break
 
-        # If still no tables found, default to most commonly queried table
-        if not table_mentions:
-            table_mentions.append({'name': 'orders', 'position': 0})
-        
-        # Sort by position in text to determine join order
-        table_mentions.sort(key=lambda x: x['position'])
-        
-        # Determine if joins are needed
-        tables = [t['name'] for t in table_mentions]
+        # If still no tables found, default to most commonly queried table
+        if not tables:
+            tables.append('orders')
         
         # Determine join relationships if multiple tables
-        joins = []
-        if len(tables) > 1:
-            for i in range(len(tables) - 1):
-                left = tables[i]
-                right = tables[i + 1]
-                
-                # Check direct relationship
-                rel_key = (left, right)
-                if rel_key in self.relationships:
-                    joins.append({
-                        'left_table': left,
-                        'right_table': right,
-                        'conditions': self.relationships[rel_key]
-                    })
-                    continue
-                
-                # Check reverse relationship
-                rel_key = (right, left)
-                if rel_key in self.relationships:
-                    joins.append({
-                        'left_table': left,
-                        'right_table': right,
-                        'conditions': self.relationships[rel_key]
-                    })
-                    continue
-                
-                # If no direct relationship, try to find intermediate table
-                for middle in self.schema.keys():
-                    if middle not in [left, right]:
-                        left_mid_key = (left, middle)
-                        mid_right_key = (middle, right)
-                        
-                        if left_mid_key in self.relationships and mid_right_key in self.relationships:
-                            # Found intermediate relationship
-                            joins.append({
-                                'left_table': left,
-                                'right_table': middle,
-                                'conditions': self.relationships[left_mid_key]
-                            })
-                            joins.append({
-                                'left_table': middle,
-                                'right_table': right,
-                                'conditions': self.relationships[mid_right_key]
-                            })
-                            break
+        joins = self.join_planner.plan(tables) if len(tables) > 1 else []
         
         return tables, joins
     
     def extract_columns(self, text, tables):
     
         if not tables:
-            return ["*"]
+            return [SelectItem(STAR)]
+
+        analysis = self.analyze(text)
+        mentions = analysis.mentions
             
         columns = []
         aggregations = []
         
         # Extract business metrics first (they have priority)
         for metric, sql_expr in self.business_metrics.items():
-            if re.search(fr'\b{metric}\b', text, re.IGNORECASE):
-                aggregations.append(f"{sql_expr} AS {metric.replace(' ', '_')}")
+            if metric in mentions:
+                aggregations.append(SelectItem(RawSql(sql_expr), metric.replace(' ', '_')))
         
         # Extract explicit columns
         for table in tables:
-            if table in self.schema:
-                for col in self.schema[table]:
-                    # Ensure col is a string
-                    if isinstance(col, dict):
-                        col = col.get("name", "")  # Adjust based on your schema structure
-                    
-                    aliases = self.column_aliases.get(col, [col])
-                    for alias in aliases:
-                        if re.search(fr'\b{alias}\b', text, re.IGNORECASE):
-                            columns.append(f"{table}.{col}")
-                            break
+            for col in self.model.columns(table):
+                aliases = self.column_aliases.get(col, [col])
+                for alias in aliases:
+                    if alias in mentions:
+                        columns.append(SelectItem(self.model.ref(table, col)))
+                        break
 
         # Check for aggregation functions
-        agg_functions = {
-            'count': r'\b(count|how many|number of)\b',
-            'avg': r'\b(average|avg|mean)\b',
-            'sum': r'\b(sum|total|add up)\b',
-            'min': r'\b(minimum|min|smallest|lowest)\b',
-            'max': r'\b(maximum|max|largest|highest|greatest)\b'
-        }
-        
-        for agg_func, pattern in agg_functions.items():
-            if re.search(pattern, text, re.IGNORECASE):
+        for agg_func in ('count', 'avg', 'sum', 'min', 'max'):
+            if f"agg_{agg_func}" in analysis.flags:
                 # If no specific columns for aggregation but we have a target table
                 if not columns and tables:
                     if agg_func == 'count':
-                        aggregations.append(f"COUNT(*) AS total_count")
+                        aggregations.append(SelectItem(FunctionCall("COUNT", (STAR,)), "total_count"))
                     else:
                         # Try to identify what to aggregate
                         for table in tables:
                             # For each table, find numeric columns that might be aggregated
                             numeric_cols = ['total_amount', 'price', 'quantity', 'stock_quantity']
-                            for col in self.schema[table]:
+                            for col in self.model.columns(table):
                                 if col in numeric_cols:
-                                    aggregations.append(f"{agg_func.upper()}({table}.{col}) AS {agg_func}_{col}")
+                                    aggregations.append(SelectItem(
+                                        FunctionCall(agg_func.upper(), (self.model.ref(table, col),)), f"{agg_func}_{col}"))
                 # If we have columns, apply aggregation to them
                 else:
                     new_columns = []
-                    for col in columns:
+                    for item in columns:
                         # Only aggregate numeric columns
-                        col_name = col.split('.')[-1]
+                        col = item.expr
+                        col_name = col.column if isinstance(col, ColumnRef) else None
                         if col_name in ['total_amount', 'price', 'quantity', 'stock_quantity', 'customer_id', 'order_id', 'product_id']:
                             if agg_func == 'count' and 'id' in col_name:
-                                new_columns.append(f"COUNT(DISTINCT {col}) AS count_{col_name}")
+                                new_columns.append(SelectItem(FunctionCall("COUNT", (col,), distinct=True), f"count_{col_name}"))
                             else:
-                                new_columns.append(f"{agg_func.upper()}({col}) AS {agg_func}_{col_name}")
+                                new_columns.append(SelectItem(FunctionCall(agg_func.upper(), (col,)), f"{agg_func}_{col_name}"))
                         else:
-                            new_columns.append(col)
+                            new_columns.append(item)
                     columns = new_columns
         
          # Combine regular columns and aggregations
@@ -407,290 +2478,144 @@ class EnhancedIntentParser:
         
         # If we have tables but no columns were extracted, return all columns from first table
         if tables and not all_columns:
-            return [f"{tables[0]}.*"]
+            return [SelectItem(self.model.ref(tables[0], "*"))]
         
         # If we have aggregations but no regular columns, return just the aggregations
         if aggregations and not columns:
             return aggregations
             
-        return all_columns if all_columns else ["*"]
+        return all_columns if all_columns else [SelectItem(STAR)]
     
     def extract_conditions(self, text, tables):
-        """Extract WHERE clause conditions with enhanced amount detection"""
+        """Extract WHERE clause conditions (ANDed condition nodes) with enhanced amount detection"""
         if not tables:
             return None
+
+        analysis = self.analyze(text)
+        text = analysis.text
             
         conditions = []
         
-        # Debug the input text
-        print(f"Debug - Processing text: '{text}'")
+        logger.debug("Processing text: %r", text)
         
         # CRITICAL FIX: Direct pattern for total amount comparison
-        # This pattern is specifically designed to catch the phrase pattern in your example
-        total_amount_patterns = [
-            # Match "orders that have total amount greater than X"
-            r'orders\s+(?:that|which|with)?\s+(?:have|has)?\s+(?:a\s+)?total\s+amount\s+(?:greater|more|higher|larger|bigger|>)\s+(?:than)?\s+(\d+(?:\.\d+)?)',
-            # Match simpler patterns like "orders with amount > X"
-            r'orders\s+(?:with|having)\s+(?:total\s+)?amount\s+(?:>|greater|more|higher|larger)\s+(?:than)?\s+(\d+(?:\.\d+)?)',
-            # Match "show me orders where total amount exceeds X"
-            r'(?:show|get|find)\s+(?:me\s+)?orders\s+(?:where|with)\s+(?:total\s+)?amount\s+(?:exceeds|>|greater|more|above)\s+(?:than)?\s+(\d+(?:\.\d+)?)',
-            # Direct pattern for "total amount greater than X"
-            r'total\s+amount\s+(?:greater|more|higher|larger|bigger|>)\s+(?:than)?\s+(\d+(?:\.\d+)?)',
-            # Super general catch-all pattern
-            r'(?:amount|total).{0,20}(?:greater|more|higher|above|exceeds|>).{0,10}(\d+(?:\.\d+)?)',
-        ]
-        
-        # Check each pattern for total amount conditions
-        amount_match_found = False
-        for pattern in total_amount_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        # These rules are specifically designed to catch phrasings like "orders with total amount > X"
+        if 'orders' in tables:
+            match = RULE_SETS["direct_amount"].search(text)
             if match:
-                amount = match.group(1)
-                if 'orders' in tables:
-                    conditions.append(f"orders.total_amount > {amount}")
-                    print(f"Debug - Found amount condition: orders.total_amount > {amount}")
-                    amount_match_found = True
-                    break
-        
-        # If we found a direct amount match, return now
-        if amount_match_found and conditions:
-            return " AND ".join(conditions)
+                operator, (amount,) = match
+                conditions.append(Comparison(TOTAL_AMOUNT, operator, Literal(parse_number(amount))))
+                logger.debug("Found amount condition: orders.total_amount %s %s", operator, amount)
+                # If we found a direct amount match, return now
+                return conditions
         
         # If no direct amount match found, continue with other patterns...
         # First check for time period conditions
         for period, condition in self.time_periods.items():
-            if re.search(fr'\b{period}\b', text, re.IGNORECASE):
+            if analysis.has_phrase(period):
                 if 'orders' in tables:
-                    conditions.append(condition)
+                    conditions.append(RawSql(condition))
                     break
         
-        # Generic amount comparison patterns
-        amount_comparison_patterns = [
-            # Match patterns like "total amount greater than 150" or "amount > 150"
-            (r'(?:total\s+)?(?:amount|price|sum|value)(?:\s+\w+){0,4}\s+(greater than|more than|above|exceeds|>)\s+(\d+(?:\.\d+)?)', ">"),
-            # Match patterns like "total amount less than 150" or "amount < 150"
-            (r'(?:total\s+)?(?:amount|price|sum|value)(?:\s+\w+){0,4}\s+(less than|below|under|<)\s+(\d+(?:\.\d+)?)', "<"),
-            # Match patterns like "total amount at least 150" or "amount >= 150"
-            (r'(?:total\s+)?(?:amount|price|sum|value)(?:\s+\w+){0,4}\s+(at least|no less than|>=)\s+(\d+(?:\.\d+)?)', ">="),
-            # Match patterns like "total amount at most 150" or "amount <= 150"
-            (r'(?:total\s+)?(?:amount|price|sum|value)(?:\s+\w+){0,4}\s+(at most|no more than|<=)\s+(\d+(?:\.\d+)?)', "<="),
-        ]
-        
-        for pattern, operator in amount_comparison_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                _, val = match.groups()
-                # For "amount" type comparisons, default to orders.total_amount
-                if 'orders' in tables:
-                    conditions.append(f"orders.total_amount {operator} {val}")
-                    print(f"Debug - Found operator match: orders.total_amount {operator} {val}")
-        # Common comparison patterns (keep original)
-        comparison_patterns = [
-            (r'(\w+)\s+is\s+(\w+)', "="),
-            (r'(\w+)\s+equals\s+(\w+)', "="),
-            (r'(\w+)\s+=\s+(\w+)', "="),
-            (r'(\w+)\s+equal to\s+(\w+)', "="),
-            (r'where\s+(\w+)\s+is\s+(\w+)', "="),
-            (r'(\w+)\s+greater than\s+(\d+)', ">"),
-            (r'(\w+)\s+more than\s+(\d+)', ">"),
-            (r'(\w+)\s+above\s+(\d+)', ">"),
-            (r'(\w+)\s+>\s+(\d+)', ">"),
-            (r'(\w+)\s+less than\s+(\d+)', "<"),
-            (r'(\w+)\s+below\s+(\d+)', "<"),
-            (r'(\w+)\s+<\s+(\d+)', "<"),
-            (r'(\w+)\s+at least\s+(\d+)', ">="),
-            (r'(\w+)\s+at most\s+(\d+)', "<="),
-            (r'(\w+)\s+not equal to\s+(\w+)', "!="),
-            (r'(\w+)\s+!=\s+(\w+)', "!="),
-            (r'(\w+)\s+different from\s+(\w+)', "!="),
-        ]
-        
-        # Extract comparison conditions (keep original logic)
-        for pattern, operator in comparison_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                col_term, val = match.groups()
-                
-                # Find which table this column belongs to
-                col_table = None
-                col_name = None
-                
-                for table in tables:
-                    normalized_col = self.normalize_column_name(col_term, table)
-                    if normalized_col in self.schema.get(table, []):
-                        col_table = table
-                        col_name = normalized_col
-                        break
-                
-                if col_table and col_name:
-                    # Check if value needs quotes (string vs numeric)
-                    try:
-                        float(val)
-                        conditions.append(f"{col_table}.{col_name} {operator} {val}")
-                    except ValueError:
-                        # Handle "status is completed" type queries
-                        conditions.append(f"{col_table}.{col_name} {operator} '{val}'")
+        # Generic amount comparisons; for "amount" type comparisons, default to orders.total_amount
+        for operator, (val,) in RULE_SETS["amount"].finditer(text):
+            if 'orders' in tables:
+                conditions.append(Comparison(TOTAL_AMOUNT, operator, Literal(parse_number(val))))
+                logger.debug("Found operator match: orders.total_amount %s %s", operator, val)
+        
+        # Extract comparison conditions
+        for operator, (col_term, val) in RULE_SETS["comparison"].finditer(text):
+            # Find which table this column belongs to
+            col_table = None
+            col_name = None
+            
+            for table in tables:
+                normalized_col = self.normalize_column_name(col_term, table)
+                if self.column_index.has_column(table, normalized_col):
+                    col_table = table
+                    col_name = normalized_col
+                    break
+            
+            if col_table and col_name:
+                # Numeric values stay numbers; anything else ("status is completed") is a string
+                number = parse_number(val)
+                conditions.append(Comparison(self.model.ref(col_table, col_name), operator,
+                                             Literal(val if number is None else number)))
         
-        # Keep the rest of the original method unchanged
         # Handle date ranges - PostgreSQL specific date functions
-        date_patterns = [
-            r'(\w+)\s+between\s+(\w+)\s+and\s+(\w+)',
-            r'(\w+)\s+from\s+(\w+)\s+to\s+(\w+)',
-        ]
-        
-        for pattern in date_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                col_term, start, end = match.groups()
-                
-                # Find which table this column belongs to
-                for table in tables:
-                    normalized_col = self.normalize_column_name(col_term, table)
-                    if normalized_col in self.schema.get(table, []):
-                        # Use PostgreSQL date format
-                        conditions.append(f"{table}.{normalized_col} BETWEEN '{start}'::date AND '{end}'::date")
-                        break
+        for _, (col_term, start, end) in RULE_SETS["date_range"].finditer(text):
+            # Find which table this column belongs to
+            for table in tables:
+                normalized_col = self.normalize_column_name(col_term, table)
+                if self.column_index.has_column(table, normalized_col):
+                    # Use PostgreSQL date format
+                    conditions.append(Between(self.model.ref(table, normalized_col),
+                                              Cast(Literal(start), "date"), Cast(Literal(end), "date")))
+                    break
         
         # Handle LIKE conditions for text search
-        like_patterns = [
-            r'(\w+)\s+contains\s+(\w+)',
-            r'(\w+)\s+like\s+(\w+)',
-            r'(\w+)\s+with\s+(\w+)\s+in it',
-        ]
-        
-        for pattern in like_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                col_term, val = match.groups()
-                
-                # Find which table this column belongs to
-                for table in tables:
-                    normalized_col = self.normalize_column_name(col_term, table)
-                    if normalized_col in self.schema.get(table, []):
-                        conditions.append(f"{table}.{normalized_col} ILIKE '%{val}%'")  # PostgreSQL uses ILIKE for case-insensitive
-                        break
+        for _, (col_term, val) in RULE_SETS["like"].finditer(text):
+            # Find which table this column belongs to
+            for table in tables:
+                normalized_col = self.normalize_column_name(col_term, table)
+                if self.column_index.has_column(table, normalized_col):
+                    # PostgreSQL uses ILIKE for case-insensitive matching
+                    conditions.append(Comparison(self.model.ref(table, normalized_col), "ILIKE", Literal(f"%{val}%")))
+                    break
         
         # Add status-based conditions
-        status_patterns = [
-            r'(\w+)\s+status\s+is\s+(\w+)',
-            r'status\s+is\s+(\w+)',
-            r'(\w+)\s+orders',
-        ]
-        
-        status_values = {
-            'complete': 'completed',
-            'completed': 'completed',
-            'pending': 'pending',
-            'shipped': 'shipped',
-            'cancelled': 'cancelled',
-            'canceled': 'cancelled',
-            'processing': 'processing',
-            'new': 'new',
-            'delivered': 'delivered'
-        }
-        
-        for pattern in status_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                groups = match.groups()
-                status_val = None
-                
-                if len(groups) == 1:
-                    status_val = groups[0]
-                elif len(groups) == 2:
-                    status_val = groups[1]
-                
-                if status_val and status_val.lower() in status_values:
-                    normalized_status = status_values[status_val.lower()]
-                    if 'orders' in tables:
-                        conditions.append(f"orders.status = '{normalized_status}'")
-        
-        # Handle top/bottom N conditions (these will be moved to LIMIT and ORDER BY later)
-        top_patterns = [
-            r'top\s+(\d+)',
-            r'best\s+(\d+)',
-            r'highest\s+(\d+)',
-        ]
-        
-        bottom_patterns = [
-            r'bottom\s+(\d+)',
-            r'worst\s+(\d+)',
-            r'lowest\s+(\d+)',
-        ]
+        for _, groups in RULE_SETS["status"].finditer(text):
+            status_val = groups[-1]
+            if status_val and status_val.lower() in STATUS_VALUES:
+                normalized_status = STATUS_VALUES[status_val.lower()]
+                if 'orders' in tables:
+                    conditions.append(Comparison(ColumnRef("orders", "status"), "=", Literal(normalized_status)))
         
-        for pattern in top_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                # This will be handled by extract_limit and extract_order
-                pass
-                
-        for pattern in bottom_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                # This will be handled by extract_limit and extract_order
-                pass
+        # Top/bottom N phrases are handled by extract_limit and extract_order
         
-        return " AND ".join(conditions) if conditions else None
+        return conditions or None
     
     def extract_group_by(self, text, tables, columns):
         """Extract GROUP BY clause if present"""
         group_columns = []
+        analysis = self.analyze(text)
+        mentions = analysis.mentions
         
         # Check for grouping indicators
-        has_grouping = self.group_pattern.search(text)
+        has_grouping = "grouping" in analysis.flags
         
         # If no explicit grouping but we have aggregations, try to infer groups
-        has_aggregation = self.agg_pattern.search(text)
+        has_aggregation = "aggregation" in analysis.flags
         
         if has_grouping or has_aggregation:
             # Look for potential grouping columns
             group_candidates = []
             
-            # Common grouping candidates by table
-            grouping_candidates = {
-                'customers': ['name', 'customer_id'],
-                'orders': ['status', 'order_date'],
-                'products': ['category', 'name', 'product_id'],
-                'order_items': ['product_id']
-            }
-            
             # Start by finding mentioned columns that might be groups
             for table in tables:
-                if table in grouping_candidates:
-                    for candidate in grouping_candidates[table]:
+                if table in self.GROUPING_CANDIDATES:
+                    for candidate in self.GROUPING_CANDIDATES[table]:
                         # Check if it's mentioned in the text or in selected columns
-                        col_in_text = any(re.search(fr'\b{alias}\b', text, re.IGNORECASE) 
+                        col_in_text = any(alias in mentions
                                       for alias in self.column_aliases.get(candidate, [candidate]))
                         
-                        col_in_selection = f"{table}.{candidate}" in columns
+                        ref = self.model.ref(table, candidate)
+                        col_in_selection = any(item.expr == ref for item in columns)
                         
                         if col_in_text or col_in_selection:
-                            group_columns.append(f"{table}.{candidate}")
+                            group_columns.append(ref)
             
             # Time-based grouping using PostgreSQL date functions
-            time_groups = {
-                'daily': "DATE(orders.order_date)",
-                'day': "DATE(orders.order_date)",
-                'monthly': "DATE_TRUNC('month', orders.order_date)",
-                'month': "DATE_TRUNC('month', orders.order_date)",
-                'yearly': "DATE_TRUNC('year', orders.order_date)",
-                'year': "DATE_TRUNC('year', orders.order_date)",
-                'quarterly': "DATE_TRUNC('quarter', orders.order_date)",
-                'quarter': "DATE_TRUNC('quarter', orders.order_date)",
-                'weekly': "DATE_TRUNC('week', orders.order_date)",
-                'week': "DATE_TRUNC('week', orders.order_date)"
-            }
-            
-            for term, expr in time_groups.items():
-                if re.search(fr'\b{term}\b', text, re.IGNORECASE) and 'orders' in tables:
+            for term, expr in TIME_GROUPS.items():
+                if analysis.has_phrase(term) and 'orders' in tables:
                     group_columns.append(expr)
             
             # If we still have no groups but need them due to aggregations, use default grouping
             if not group_columns and has_aggregation:
                 # Find non-aggregated columns to group by
-                for col in columns:
-                    if not any(agg in col.lower() for agg in ['count(', 'sum(', 'avg(', 'min(', 'max(']):
-                        group_columns.append(col)
+                for item in columns:
+                    if not item.aggregate:
+                        group_columns.append(item.expr)
         
         return group_columns if group_columns else None
     
@@ -699,486 +2624,1202 @@ class EnhancedIntentParser:
         if not group_by_cols:
             return None
 
+        analysis = self.analyze(text)
+        text = analysis.text
+        lower = analysis.lower
         having_conditions = []
 
-        # Common having patterns
-        having_patterns = [
-            (r'having\s+(\w+)\s+greater than\s+(\d+)', "{} > {}"),
-            (r'having\s+(\w+)\s+>\s+(\d+)', "{} > {}"),
-            (r'having\s+(\w+)\s+less than\s+(\d+)', "{} < {}"),
-            (r'having\s+(\w+)\s+<\s+(\d+)', "{} < {}"),
-            (r'having\s+(\w+)\s+at least\s+(\d+)', "{} >= {}"),
-            (r'having\s+(\w+)\s+at most\s+(\d+)', "{} <= {}"),
-            (r'having\s+(\w+)\s+=\s+(\d+)', "{} = {}"),
-            (r'having\s+(\w+)\s+equals?\s+(\d+)', "{} = {}"),
-            (r'where\s+total\s+(\w+)\s+is\s+greater than\s+(\d+)', "SUM({}) > {}"),
-            (r'where\s+total\s+(\w+)\s+is\s+less than\s+(\d+)', "SUM({}) < {}"),
-            (r'where\s+average\s+(\w+)\s+is\s+greater than\s+(\d+)', "AVG({}) > {}"),
-            (r'where\s+average\s+(\w+)\s+is\s+less than\s+(\d+)', "AVG({}) < {}")
-        ]
-
-        for pattern, template in having_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                col_term, val = match.groups()
-
-                # Infer aggregation function from pattern
-                agg_func = None
-                if 'total' in pattern:
-                    agg_func = 'SUM'
-                elif 'average' in pattern:
-                    agg_func = 'AVG'
-                elif 'count' in pattern:
-                    agg_func = 'COUNT'
-
-                # Try to map column to an actual column
-                for table in self.schema:
-                    for col in self.schema[table]:
-                        if col_term in col or col in col_term:
-                            if agg_func:
-                                condition = template.format(f"{agg_func}({table}.{col})", val)
-                            else:
-                                # Try to infer aggregation from text
-                                if 'total' in text.lower() and text.lower().index('total') < text.lower().index(col_term):
-                                    condition = template.format(f"SUM({table}.{col})", val)
-                                elif 'average' in text.lower() and text.lower().index('average') < text.lower().index(col_term):
-                                    condition = template.format(f"AVG({table}.{col})", val)
-                                elif 'count' in text.lower() and text.lower().index('count') < text.lower().index(col_term):
-                                    condition = template.format(f"COUNT({table}.{col})", val)
-                                else:
-                                    condition = template.format(f"{table}.{col}", val)
-                            having_conditions.append(condition)
-                            break
+        for (operator, agg_func), (col_term, val) in RULE_SETS["having"].finditer(text):
+            value = Literal(parse_number(val))
+            # Try to map column to an actual column of each candidate table
+            for table in self.candidate_tables(analysis):
+                col = self.normalize_column_name(col_term, table)
+                if not self.column_index.has_column(table, col):
+                    continue
+                ref = self.model.ref(table, col)
+                if not agg_func:
+                    # Try to infer aggregation from text
+                    if 'total' in lower and lower.index('total') < lower.index(col_term):
+                        agg_func = "SUM"
+                    elif 'average' in lower and lower.index('average') < lower.index(col_term):
+                        agg_func = "AVG"
+                    elif 'count' in lower and lower.index('count') < lower.index(col_term):
+                        agg_func = "COUNT"
+                expr = FunctionCall(agg_func, (ref,)) if agg_func else ref
+                having_conditions.append(Comparison(expr, operator, value))
 
         # Handle "more/less than X items/orders" patterns for COUNT aggregates
-        count_patterns = [
-            (r'with\s+more than\s+(\d+)\s+(\w+)', "COUNT({}) > {}"),
-            (r'with\s+at least\s+(\d+)\s+(\w+)', "COUNT({}) >= {}"),
-            (r'with\s+less than\s+(\d+)\s+(\w+)', "COUNT({}) < {}"),
-            (r'who\s+ordered\s+more than\s+(\d+)\s+times', "COUNT(orders.order_id) > {}")
-        ]
-
-        for pattern, template in count_patterns:
-            matches = re.finditer(pattern, text, re.IGNORECASE)
-            for match in matches:
-                groups = match.groups()
-                val = groups[0]
-
-                if len(groups) > 1:
-                    item_term = groups[1]
-                    # Map item term to table
-                    if item_term in ['order', 'orders', 'purchase', 'purchases']:
-                        having_conditions.append(template.format("orders.order_id", val))
-                    elif item_term in ['item', 'items', 'product', 'products']:
-                        having_conditions.append(template.format("order_items.item_id", val))
+        for (operator, counted), groups in RULE_SETS["having_count"].finditer(text):
+            value = Literal(parse_number(groups[0]))
+
+            if counted:
+                target = ColumnRef(*counted)
+            elif len(groups) > 1:
+                item_term = groups[1]
+                # Map item term to table
+                if item_term in ['order', 'orders', 'purchase', 'purchases']:
+                    target = ColumnRef("orders", "order_id")
+                elif item_term in ['item', 'items', 'product', 'products']:
+                    target = ColumnRef("order_items", "item_id")
                 else:
-                    # Default count condition
-                    having_conditions.append(template.format("*", val))
+                    continue
+            else:
+                # Default count condition
+                target = STAR
+            having_conditions.append(Comparison(FunctionCall("COUNT", (target,)), operator, value))
 
-        return " AND ".join(having_conditions) if having_conditions else None
+        return having_conditions or None
 
     def extract_limit(self, text):
         """Extract LIMIT clause if present"""
-        limit_patterns = [
-            r'\blimit\s+(\d+)\b',
-            r'\btop\s+(\d+)\b',
-            r'\bfirst\s+(\d+)\b',
-            r'\bbottom\s+(\d+)\b',
-            r'\blast\s+(\d+)\b',
-            r'\bhighest\s+(\d+)\b',
-            r'\blowest\s+(\d+)\b',
-            r'\bbest\s+(\d+)\b',
-            r'\bworst\s+(\d+)\b',
-        ]
-        
-        for pattern in limit_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(1)
+        analysis = self.analyze(text)
+        for word in self.LIMIT_WORDS:
+            limit = analysis.number_after(word)
+            if limit:
+                return limit
         
         return None
 
     def extract_order(self, text, columns):
         """Extract ORDER BY clause if present"""
         order_columns = []
-        
-        # Direction patterns
-        asc_patterns = [r'\bascending\b', r'\bincrease\b', r'\bascend\b', r'\brise\b']
-        desc_patterns = [r'\bdescending\b', r'\bdecrease\b', r'\bdescend\b', r'\bdrop\b', r'\bhighest\b', r'\bbest\b', r'\btop\b']
+        analysis = self.analyze(text)
+        text = analysis.text
+        lower = analysis.lower
         
         # Detect default direction
-        direction = "ASC"  # Default
-        for pattern in desc_patterns:
-            if re.search(pattern, text, re.IGNORECASE):
-                direction = "DESC"
-                break
-        
-        # Order by patterns
-        order_patterns = [
-            r'order\s+by\s+(\w+)',
-            r'sort\s+by\s+(\w+)',
-            r'arranged\s+by\s+(\w+)',
-            r'ranked\s+by\s+(\w+)',
-        ]
+        direction = "DESC" if "descending" in analysis.flags else "ASC"
         
         # Extract explicit order columns
         explicit_order = False
-        for pattern in order_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
+        for _, (col_term,) in RULE_SETS["order"].finditer(text):
+            explicit_order = True
+            
+            # Try to map to a real column
+            match = self.column_index.locate(col_term, self.candidate_tables(analysis))
             if match:
-                explicit_order = True
-                col_term = match.group(1)
-                
-                # Try to map to a real column
-                matched = False
-                for table in self.schema:
-                    for col in self.schema[table]:
-                        if col_term in col or col in col_term:
-                            order_columns.append(f"\"{table}\".\"{col}\" {direction}")
-                            matched = True
-                            break
-                    if matched:
-                        break
-                
-                # If not matched to a column, check for aggregates
-                if not matched:
-                    agg_indicators = {
-                        'total': 'SUM',
-                        'sum': 'SUM',
-                        'average': 'AVG',
-                        'avg': 'AVG',
-                        'count': 'COUNT',
-                        'number': 'COUNT',
-                    }
-                    
-                    for indicator, agg_func in agg_indicators.items():
-                        if indicator in text.lower():
-                            for table in self.schema:
-                                for col in self.schema[table]:
-                                    if col_term in col or col in col_term:
-                                        order_columns.append(f"{agg_func}(\"{table}\".\"{col}\") {direction}")
-                                        matched = True
-                                        break
-                                if matched:
-                                    break
-        
+                order_columns.append(OrderItem(self.model.ref(*match), direction))
+
         # If not explicit but we have indicators for ordering
         if not explicit_order:
-            # Top/Bottom indicators
-            top_patterns = [r'top\s+\d+', r'highest\s+\d+', r'best\s+\d+', r'most\s+\d+']
-            bottom_patterns = [r'bottom\s+\d+', r'lowest\s+\d+', r'worst\s+\d+', r'least\s+\d+']
+            # Top/Bottom indicators ("top 10", "lowest 5", ...)
+            top_words = ('top', 'highest', 'best', 'most')
+            bottom_words = ('bottom', 'lowest', 'worst', 'least')
             
-            for pattern in top_patterns:
-                if re.search(pattern, text, re.IGNORECASE):
-                    # Find measure to sort by
-                    for metric in ['revenue', 'sales', 'amount', 'price', 'quantity']:
-                        if metric in text.lower():
-                            if metric in ['revenue', 'sales']:
-                                order_columns.append(f"\"orders\".\"total_amount\" DESC")
-                            elif metric == 'amount':
-                                order_columns.append(f"\"orders\".\"total_amount\" DESC")
-                            elif metric == 'price':
-                                if 'products' in text.lower():
-                                    order_columns.append(f"\"products\".\"price\" DESC")
-                                else:
-                                    order_columns.append(f"\"order_items\".\"price\" DESC")
-                            elif metric == 'quantity':
-                                order_columns.append(f"\"order_items\".\"quantity\" DESC")
-                            break
-                    
-                    # If no specific metric found, use a default
-                    if not order_columns:
-                        if 'customer' in text.lower():
-                            order_columns.append(f"COUNT(\"orders\".\"order_id\") DESC")
-                        elif 'product' in text.lower():
-                            order_columns.append(f"SUM(\"order_items\".\"quantity\") DESC")
-                        else:
-                            order_columns.append(f"\"orders\".\"total_amount\" DESC")
-                    break
+            if any(analysis.number_after(word) for word in top_words):
+                # Find measure to sort by
+                for metric in ['revenue', 'sales', 'amount', 'price', 'quantity']:
+                    if metric in lower:
+                        if metric in ['revenue', 'sales']:
+                            order_columns.append(OrderItem(TOTAL_AMOUNT, "DESC"))
+                        elif metric == 'amount':
+                            order_columns.append(OrderItem(TOTAL_AMOUNT, "DESC"))
+                        elif metric == 'price':
+                            if 'products' in lower:
+                                order_columns.append(OrderItem(ColumnRef("products", "price"), "DESC"))
+                            else:
+                                order_columns.append(OrderItem(ColumnRef("order_items", "price"), "DESC"))
+                        elif metric == 'quantity':
+                            order_columns.append(OrderItem(ColumnRef("order_items", "quantity"), "DESC"))
+                        break
+                
+                # If no specific metric found, use a default
+                if not order_columns:
+                    if 'customer' in lower:
+                        order_columns.append(OrderItem(FunctionCall("COUNT", (ColumnRef("orders", "order_id"),)), "DESC"))
+                    elif 'product' in lower:
+                        order_columns.append(OrderItem(FunctionCall("SUM", (ColumnRef("order_items", "quantity"),)), "DESC"))
+                    else:
+                        order_columns.append(OrderItem(TOTAL_AMOUNT, "DESC"))
             
-            for pattern in bottom_patterns:
-                if re.search(pattern, text, re.IGNORECASE):
-                    # Find measure to sort by
-                    for metric in ['revenue', 'sales', 'amount', 'price', 'quantity']:
-                        if metric in text.lower():
-                            if metric in ['revenue', 'sales']:
-                                order_columns.append(f"\"orders\".\"total_amount\" ASC")
-                            elif metric == 'amount':
-                                order_columns.append(f"\"orders\".\"total_amount\" ASC")
-                            elif metric == 'price':
-                                if 'products' in text.lower():
-                                    order_columns.append(f"\"products\".\"price\" ASC")
-                                else:
-                                    order_columns.append(f"\"order_items\".\"price\" ASC")
-                            elif metric == 'quantity':
-                                order_columns.append(f"\"order_items\".\"quantity\" ASC")
-                            break
-                    
-                    # If no specific metric found, use a default
-                    if not order_columns:
-                        if 'customer' in text.lower():
-                            order_columns.append(f"COUNT(\"orders\".\"order_id\") ASC")
-                        elif 'product' in text.lower():
-                            order_columns.append(f"SUM(\"order_items\".\"quantity\") ASC")
-                        else:
-                            order_columns.append(f"\"orders\".\"total_amount\" ASC")
-                    break
+            if any(analysis.number_after(word) for word in bottom_words):
+                # Find measure to sort by
+                for metric in ['revenue', 'sales', 'amount', 'price', 'quantity']:
+                    if metric in lower:
+                        if metric in ['revenue', 'sales']:
+                            order_columns.append(OrderItem(TOTAL_AMOUNT, "ASC"))
+                        elif metric == 'amount':
+                            order_columns.append(OrderItem(TOTAL_AMOUNT, "ASC"))
+                        elif metric == 'price':
+                            if 'products' in lower:
+                                order_columns.append(OrderItem(ColumnRef("products", "price"), "ASC"))
+                            else:
+                                order_columns.append(OrderItem(ColumnRef("order_items", "price"), "ASC"))
+                        elif metric == 'quantity':
+                            order_columns.append(OrderItem(ColumnRef("order_items", "quantity"), "ASC"))
+                        break
+                
+                # If no specific metric found, use a default
+                if not order_columns:
+                    if 'customer' in lower:
+                        order_columns.append(OrderItem(FunctionCall("COUNT", (ColumnRef("orders", "order_id"),)), "ASC"))
+                    elif 'product' in lower:
+                        order_columns.append(OrderItem(FunctionCall("SUM", (ColumnRef("order_items", "quantity"),)), "ASC"))
+                    else:
+                        order_columns.append(OrderItem(TOTAL_AMOUNT, "ASC"))
         
         # If we detected need for ordering but couldn't determine column, use reasonable defaults
-        if (any(term in text.lower() for term in ['top', 'highest', 'best', 'bottom', 'lowest', 'worst']) and 
+        if (any(term in lower for term in ['top', 'highest', 'best', 'bottom', 'lowest', 'worst']) and 
             not order_columns):
             
-            if 'recent' in text.lower() and any(table in ['orders'] for table in self.schema):
-                order_columns.append(f"\"orders\".\"order_date\" DESC")
-            elif any(metric in text.lower() for metric in ['sales', 'revenue', 'amount']):
-                order_columns.append(f"\"orders\".\"total_amount\" DESC")
-            elif 'price' in text.lower():
-                order_columns.append(f"\"products\".\"price\" DESC")
-        
-        return ", ".join(order_columns) if order_columns else None
+            if 'recent' in lower and 'orders' in self.model:
+                order_columns.append(OrderItem(ColumnRef("orders", "order_date"), "DESC"))
+            elif any(metric in lower for metric in ['sales', 'revenue', 'amount']):
+                order_columns.append(OrderItem(TOTAL_AMOUNT, "DESC"))
+            elif 'price' in lower:
+                order_columns.append(OrderItem(ColumnRef("products", "price"), "DESC"))
+        
+        return order_columns or None
     
-    def parse_intent(self, text):
+    @staticmethod
+    def run_stage(stage, *args):
+        return stage(*args)
+
+    @staticmethod
+    def timed_stage(timings, stage, *args):
+        """Run one parser stage, appending its latency under the stage's method name"""
+        started = time.perf_counter()
+        result = stage(*args)
+        timings.append((stage.__name__, time.perf_counter() - started))
+        return result
+
+    def reused_stage(self, stages, run, stage, analysis, *args):
+        """
+        Run an extract stage unless `stages` recorded its output for the same inputs: what
+        it reads from the analysis (see STAGE_INPUTS), its other arguments and, if they had
+        been ranked when it ran, the candidate tables of a pruned schema
+        """
+        read = self.STAGE_INPUTS.get(stage.__name__)
+        inputs = (read(self, analysis) if read else analysis.text, args)
+        recorded = stages.get(stage.__name__)
+        if recorded is not None:
+            recorded_inputs, candidates, result = recorded
+            if recorded_inputs == inputs and (candidates is None or candidates == self.candidate_tables(analysis)):
+                return result
+        result = run(stage, analysis, *args)
+        # Ranking is lazy, so candidates ranked by now may have been read by this stage
+        candidates = analysis.candidate_tables if self.table_ranker.prunes else None
+        stages[stage.__name__] = (inputs, candidates, result)
+        return result
+
+    def parse_intent(self, text, timings=None, stages=None):
+        """
+        Parse text into an intent. Extract stage latencies of sampled parses are appended to
+        `timings` as (stage, seconds) pairs when it is given, so a pool process can hand them
+        back to the serving process; otherwise they are recorded here.
+        `stages` maps each extract stage to its inputs and output from the previous parse of
+        a live transcript; stages whose inputs are unchanged are not run again, and the
+        stages that do run are recorded in it.
+        """
+        sampled = METRICS_ENABLED and next(self._parse_counter) % METRICS_EXTRACTOR_SAMPLE_EVERY == 0
+        stage_timings = [] if timings is None else timings
+        run = functools.partial(self.timed_stage, stage_timings) if sampled else self.run_stage
+
+        # Tokenize and normalize once; every extract stage reads from the same analysis
+        analysis = run(self.analyze, text)
+        if stages is not None:
+            run = functools.partial(self.reused_stage, stages, run)
+
         # Extract action (SELECT, COUNT, etc.)
-        action = self.extract_action(text)
-        
+        action = run(self.extract_action, analysis)
+
         # Extract tables and necessary joins
-        tables, joins = self.extract_tables(text)
+        tables, joins = run(self.extract_tables, analysis)
         
         # Extract columns to select
-        columns = self.extract_columns(text, tables)
+        columns = run(self.extract_columns, analysis, tables)
         
-        # Extract WHERE conditions - with more detailed debugging
-        where_clause = self.extract_conditions(text, tables)
-        print(f"Debug - Final WHERE clause: {where_clause}")
+        # Extract WHERE conditions
+        where_clause = run(self.extract_conditions, analysis, tables)
         
         # Extract GROUP BY clause
-        group_by = self.extract_group_by(text, tables, columns)
+        group_by = run(self.extract_group_by, analysis, tables, columns)
         
         # Extract HAVING clause
-        having_clause = self.extract_having(text, group_by)
+        having_clause = run(self.extract_having, analysis, group_by)
         
         # Extract ORDER BY clause
-        order_by = self.extract_order(text, columns)
+        order_by = run(self.extract_order, analysis, columns)
         
         # Extract LIMIT
-        limit = self.extract_limit(text)
+        limit = run(self.extract_limit, analysis)
         
-        # Build the result dictionary - Force a check that WHERE is included
+        # Build the result dictionary
         result = {
             'action': action,
             'tables': tables,
             'joins': joins,
             'columns': columns,
-            'where': where_clause,  # This must be properly set!
+            'where': where_clause,
             'group_by': group_by,
             'having': having_clause,
             'order_by': order_by,
             'limit': limit
         }
         
-        # Final debug check
-        print(f"Debug - Intent dict 'where' key value: {result.get('where')}")
+        logger.debug("Parsed intent: %s", result)
         
+        if timings is None:
+            for stage, seconds in stage_timings:
+                EXTRACTOR_SECONDS.observe(stage, seconds)
         return result
     
 class EnhancedSQLGenerator:
-    def generate_sql(self, intent):
-        """Generate PostgreSQL query from parsed intent"""
+    def generate_sql(self, intent, params=None):
+        """
+        Generate PostgreSQL query from parsed intent, rendering its nodes in one pass.
+        When a params list is given, literal values are appended to it and the query
+        refers to them as $1..$n.
+        """
         if not intent or not intent.get("tables"):
             return "ERROR: Could not determine target table from input."
-            
-        # Start building the query
-        columns_list = intent.get("columns", ["*"])
-        
-        # Automatically handle GROUP BY alignment
-        agg_functions = ["COUNT(", "SUM(", "AVG(", "MIN(", "MAX("]
-        non_agg_columns = []
-        
-        # Process columns for proper formatting
-        formatted_columns = []
-        for col in columns_list:
-            if any(agg in col.upper() for agg in agg_functions):
-                # Already an aggregation, include as is
-                formatted_columns.append(col)
-            elif "." in col:
-                # Table.column format - add quotes correctly
-                table, column = col.split(".")
-                formatted_columns.append(f"\"{table}\".\"{column}\"")
-                non_agg_columns.append(col)
-            else:
-                # Just a column name
-                formatted_columns.append(f"\"{col}\"")
-                non_agg_columns.append(col)
-        
-        columns = ", ".join(formatted_columns)
-        tables = intent.get("tables", [])
-        joins = intent.get("joins", [])
-        
-        # Build FROM clause with proper quotes
-        from_clause = f"\"{tables[0]}\""
-        
-        # Add JOIN clauses if needed
-        for join in joins:
-            left_table = join.get("left_table")
-            right_table = join.get("right_table")
-            conditions = join.get("conditions", [])
-            
-            if left_table and right_table and conditions:
-                join_condition = " AND ".join([f"\"{left_table}\".\"{cond['left']}\" = \"{right_table}\".\"{cond['right']}\"" 
-                                            for cond in conditions])
-                from_clause += f" JOIN \"{right_table}\" ON {join_condition}"
-        
-        # Start building the query
-        sql = f"SELECT {columns} FROM {from_clause}"
-        
-        # Process WHERE clause if present
+
+        sql = SqlWriter(params)
+        sql.write("SELECT ")
+        sql.nodes(intent.get("columns") or [SelectItem(STAR)], ", ")
+
+        # FROM the first table, joined to the others along the planned join path
+        sql.write(" FROM ")
+        sql.identifier(intent["tables"][0])
+        for join in intent.get("joins") or ():
+            if join.conditions:
+                join.render(sql)
+
         if intent.get("where"):
-            where_clause = intent.get("where")
-            
-            # Handle the case where WHERE clause is already properly formatted
-            if " = " in where_clause or " > " in where_clause or " < " in where_clause or " >= " in where_clause or " <= " in where_clause:
-                # Where clause already has operators, use it as is but format table.column references
-                where_parts = []
-                for part in where_clause.split(" AND "):
-                    # Find operator in the part
-                    operators = [" = ", " > ", " < ", " >= ", " <= ", " != ", " ILIKE ", " BETWEEN "]
-                    current_op = None
-                    for op in operators:
-                        if op in part:
-                            current_op = op
-                            break
-                    
-                    if current_op:
-                        left_side, right_side = part.split(current_op, 1)
-                        
-                        # Format left side if it's a table.column
-                        if "." in left_side:
-                            table, column = left_side.split(".")
-                            left_side = f"\"{table}\".\"{column}\""
-                        
-                        # Keep right side as is (assumes it's already formatted correctly)
-                        where_parts.append(f"{left_side}{current_op}{right_side}")
-                    else:
-                        # No operator found, keep as is
-                        where_parts.append(part)
-                
-                where_clause = " AND ".join(where_parts)
-            
-            sql += f" WHERE {where_clause}"
-        
-        # Handle GROUP BY, HAVING, ORDER BY, and LIMIT
-        # (rest of the function remains the same)
-        # ...
-        
-        # Fix: Handle GROUP BY alignment with SELECT
-        group_by_cols = intent.get("group_by", [])
-        if group_by_cols:
-            # If we have aggregations but no explicit GROUP BY columns, use non-aggregated columns from SELECT
-            if not group_by_cols and any(agg in columns.upper() for agg in agg_functions):
-                group_by_cols = non_agg_columns
-                
-            formatted_group_by = []
-            for col in group_by_cols:
-                if "DATE_TRUNC" in col or "DATE(" in col:
-                    # This is a date function, leave as is
-                    formatted_group_by.append(col)
-                elif "." in col and "(" not in col:
-                    table, column = col.split(".")
-                    formatted_group_by.append(f"\"{table}\".\"{column}\"")
-                elif "(" not in col:  # Don't format expressions
-                    formatted_group_by.append(f"\"{col}\"")
-                else:
-                    formatted_group_by.append(col)
-                    
-            group_by_str = ", ".join(formatted_group_by)
-            sql += f" GROUP BY {group_by_str}"
-        
-        # Handle HAVING, ORDER BY, and LIMIT
+            sql.write(" WHERE ")
+            sql.nodes(intent["where"], " AND ")
+
+        if intent.get("group_by"):
+            sql.write(" GROUP BY ")
+            sql.nodes(intent["group_by"], ", ")
+
         if intent.get("having"):
-            having_clause = intent.get("having")
-            sql += f" HAVING {having_clause}"
-        
+            sql.write(" HAVING ")
+            sql.nodes(intent["having"], " AND ")
+
         if intent.get("order_by"):
-            sql += f" ORDER BY {intent.get('order_by')}"
-        
+            sql.write(" ORDER BY ")
+            sql.nodes(intent["order_by"], ", ")
+
         if intent.get("limit"):
-            sql += f" LIMIT {intent.get('limit')}"
-        
-        return sql
+            sql.write(" LIMIT ")
+            sql.literal(int(intent["limit"]))
 
-    # -------- API ROUTES --------
-    @app.post("/process-query", response_model=QueryResponse)
-    async def process_query(request: QueryRequest):
-        """Process a natural language query and return SQL results"""
-        try:
-            print(f"Received query request: {request}")
-            
-            # Extract schema into the format expected by the processor
-            DB_SCHEMA = {}
-            for table_dict in request.schema:
-                for table_name, columns in table_dict.items():
-                    DB_SCHEMA[table_name] = columns
-            
-            # Convert relationships format - the key needs to be a tuple of strings, not dictionaries
-            TABLE_RELATIONSHIPS = {}
-            print(f"TABLE_RELATIONSHIPS: {TABLE_RELATIONSHIPS}")
-            # Get other parameters
-            for rel in request.relationships:
-        # Convert tables list to a tuple for use as a dictionary key
-                key = (rel.tables[0], rel.tables[1])  # Assuming tables is a list of two table names
-        
-        # Convert joinCondition (dict) to a string or tuple
-                join_condition = tuple(rel.joinCondition.items())  # Convert dict to a tuple of key-value pairs
-                TABLE_RELATIONSHIPS[key] = join_condition
-                
-            TABLE_ALIASES = request.tableAliases or {}
-            COLUMN_ALIASES = request.columnAliases or {}
-            BUSINESS_METRICS = request.businessMetrics or {}
-            
-            
-            print(f"Received query: {request}")
-            
-            # Initialize pipeline components
-            preprocessor = TextPreprocessor()
-            language_processor = LanguageProcessor()
-            intent_parser = EnhancedIntentParser(
-                DB_SCHEMA,
-                TABLE_RELATIONSHIPS,
-                TABLE_ALIASES,
-                COLUMN_ALIASES,
-                BUSINESS_METRICS,
-                TIME_PERIODS
+        return sql.getvalue()
+
+# -------- 4. PARSER CACHE MODULE --------
+def schema_fingerprint(schema, relationships, table_aliases, column_aliases, business_metrics):
+    """Stable hash of a schema context (schema + relationships + aliases + metrics)"""
+    payload = {
+        "schema": schema,
+        "relationships": [[list(rel.tables), rel.joinCondition] for rel in (relationships or [])],
+        "tableAliases": table_aliases or {},
+        "columnAliases": column_aliases or {},
+        "businessMetrics": business_metrics or {},
+    }
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def build_intent_parser(schema, relationships, table_aliases, column_aliases, business_metrics):
+    """Build an EnhancedIntentParser from the request-level schema context"""
+    intern = sys.intern
+    model = SchemaModel(schema)
+
+    # Relationships keyed by (left table, right table), with their joinCondition items
+    table_relationships = {}
+    for rel in relationships or []:
+        key = (intern(rel.tables[0]), intern(rel.tables[1]))  # Assuming tables is a list of two table names
+        table_relationships[key] = tuple(rel.joinCondition.items())
+
+    # Aliases are interned too: they end up as vocabulary terms and dict keys of the parser
+    return EnhancedIntentParser(
+        model,
+        table_relationships,
+        {intern(alias): intern(table) for alias, table in (table_aliases or {}).items()},
+        {intern(col): [intern(alias) for alias in aliases] for col, aliases in (column_aliases or {}).items()},
+        {intern(metric): expr for metric, expr in (business_metrics or {}).items()},
+        TIME_PERIODS
+    )
+
+# Approximate bytes a dict spends per entry on its hash table, beyond the key and value
+MEMO_SLOT_BYTES = 64
+
+def estimate_size(obj, seen=None):
+    """Approximate deep size in bytes of plain containers, arrays, strings, compiled patterns and objects"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, seen) + estimate_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, seen) for item in obj)
+    elif isinstance(obj, re.Pattern):
+        # The compiled program is not visible to getsizeof; the source is a fair proxy
+        size += 2 * len(obj.pattern)
+    elif hasattr(obj, "__dict__"):
+        size += estimate_size(vars(obj), seen)
+    else:
+        for cls in type(obj).__mro__:
+            slots = getattr(cls, "__slots__", ())
+            for name in (slots,) if isinstance(slots, str) else slots:
+                if hasattr(obj, name):
+                    size += estimate_size(getattr(obj, name), seen)
+    return size
+
+class ParserCache:
+    """Bounded LRU cache of ready-built intent parsers, keyed by schema fingerprint"""
+    def __init__(self, max_entries=PARSER_CACHE_MAX_ENTRIES, max_bytes=PARSER_CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # fingerprint -> (parser, size in bytes)
+        self._lock = threading.Lock()
+        self._building = {}  # fingerprint -> lock held while its parser is being built
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, fingerprint):
+        """Return the cached parser for a fingerprint (or None) and mark it recently used"""
+        with self._lock:
+            entry = self._entries.get(fingerprint)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(fingerprint)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, fingerprint, parser):
+        """
+        Insert a parser and evict least recently used entries until within limits. A parser
+        is charged for its memos at their caps, since they only fill once it is in use.
+        """
+        size = estimate_size(parser) + parser.memo_reserve()
+        with self._lock:
+            if fingerprint in self._entries:
+                self.total_bytes -= self._entries.pop(fingerprint)[1]
+            self._entries[fingerprint] = (parser, size)
+            self.total_bytes += size
+
+            # Always keep the newest entry, even if it alone exceeds the byte budget
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes
+            ):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+        return parser
+
+    def get_or_build(self, fingerprint, builder):
+        """
+        Return the cached parser for a fingerprint, building and caching it on a miss.
+        Concurrent misses for the same fingerprint wait for a single build.
+        """
+        parser = self.get(fingerprint)
+        if parser is not None:
+            return parser
+
+        with self._lock:
+            build_lock = self._building.setdefault(fingerprint, threading.Lock())
+        with build_lock:
+            try:
+                # Another thread may have finished the build while this one waited
+                with self._lock:
+                    entry = self._entries.get(fingerprint)
+                if entry is not None:
+                    return entry[0]
+                return self.put(fingerprint, builder())
+            finally:
+                with self._lock:
+                    if self._building.get(fingerprint) is build_lock:
+                        del self._building[fingerprint]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "bytes_per_schema": self.total_bytes // len(self._entries) if self._entries else 0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+class ResultCache:
+    """
+    Bounded LRU cache of generated SQL keyed by (schema fingerprint, cleaned query text,
+    parameterized). Parsing and generation depend on nothing else (time filters are emitted
+    as CURRENT_DATE expressions), so a hit skips both; entries still expire after a TTL.
+    Values are (sql, params, template fingerprint) tuples; the last two are None for plain SQL.
+    """
+    def __init__(self, max_entries=RESULT_CACHE_MAX_ENTRIES, ttl_seconds=RESULT_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # (fingerprint, text, parameterized) -> (result, expires_at)
+        self._keys = {}  # fingerprint -> keys of its entries, for invalidation
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, fingerprint, text, parameterized=False):
+        """Return the cached result for a query (or None) and mark it recently used"""
+        key = (fingerprint, text, parameterized)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, fingerprint, text, parameterized, result):
+        key = (fingerprint, text, parameterized)
+        with self._lock:
+            self._entries[key] = (result, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            self._keys.setdefault(fingerprint, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+        return result
+
+    def _drop(self, key):
+        del self._entries[key]
+        keys = self._keys[key[0]]
+        keys.discard(key)
+        if not keys:
+            del self._keys[key[0]]
+
+    def invalidate(self, fingerprint):
+        """Drop every entry generated for a schema context; returns the number dropped"""
+        with self._lock:
+            keys = self._keys.pop(fingerprint, ())
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "schemas": len(self._keys),
+                "hits": self.hits,
+                "misses": self.misses,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+# Process-wide pipeline components; none of these depend on the schema context
+parser_cache = ParserCache()
+result_cache = ResultCache()
+translation_cache = TranslationCache()
+language_processor = LanguageProcessor(cache=translation_cache)
+query_flight = SingleFlight("query")
+sql_generator = EnhancedSQLGenerator()
+
+# -------- 5. SCHEMA REGISTRY MODULE --------
+class SchemaRegistry:
+    """
+    Server-side store of registered schema contexts.
+    Every registration of a name with new content bumps its version; ids of older
+    versions (and ids evicted or lost on restart) become stale and no longer resolve.
+    on_retire is called with the record of every version replaced or unregistered.
+    """
+    def __init__(self, max_entries=SCHEMA_REGISTRY_MAX_ENTRIES, on_retire=None):
+        self.max_entries = max_entries
+        self.on_retire = on_retire
+        self._records = OrderedDict()  # schema_id -> record
+        self._current = {}  # name -> current schema_id
+        self._versions = {}  # name -> last issued version
+        self._lock = threading.Lock()
+
+    def register(self, registration):
+        """Store a schema context and return its record, reusing the id if nothing changed"""
+        fingerprint = schema_fingerprint(
+            registration.schema,
+            registration.relationships,
+            registration.tableAliases,
+            registration.columnAliases,
+            registration.businessMetrics
+        )
+        name = registration.name or fingerprint[:12]
+
+        with self._lock:
+            current_id = self._current.get(name)
+            if current_id in self._records and self._records[current_id]["fingerprint"] == fingerprint:
+                self._records.move_to_end(current_id)
+                return self._records[current_id]
+
+            # New content for this name: issue the next version and retire the previous one
+            version = self._versions.get(name, 0) + 1
+            schema_id = f"{name}@v{version}.{fingerprint[:12]}"
+            retired = self._records.pop(current_id, None)
+            if retired is not None and self.on_retire:
+                self.on_retire(retired)
+            self._records[schema_id] = {
+                "schema_id": schema_id,
+                "name": name,
+                "version": version,
+                "fingerprint": fingerprint,
+                "registration": registration,
+            }
+            self._current[name] = schema_id
+            self._versions[name] = version
+
+            while len(self._records) > self.max_entries:
+                _, evicted = self._records.popitem(last=False)
+                if self._current.get(evicted["name"]) == evicted["schema_id"]:
+                    del self._current[evicted["name"]]
+            return self._records[schema_id]
+
+    def resolve(self, schema_id):
+        """Return the record for a schema_id, or None if it is unknown or stale"""
+        with self._lock:
+            record = self._records.get(schema_id)
+            if record is not None:
+                self._records.move_to_end(schema_id)
+            return record
+
+    def unregister(self, schema_id):
+        with self._lock:
+            record = self._records.pop(schema_id, None)
+            if record is not None and self._current.get(record["name"]) == schema_id:
+                del self._current[record["name"]]
+            if record is not None and self.on_retire:
+                self.on_retire(record)
+            return record
+
+# Results generated for a schema version are dropped as soon as it is replaced or removed
+schema_registry = SchemaRegistry(on_retire=lambda record: result_cache.invalidate(record["fingerprint"]))
+
+def stale_schema_error(schema_id):
+    return HTTPException(
+        status_code=410,
+        detail=f"schema_id '{schema_id}' is unknown or stale; register the schema again via POST /schemas"
+    )
+
+def resolve_schema_context(request):
+    """
+    Return the schema fingerprint and schema context of a request, from its schema_id or
+    inline schema. The context is the build_intent_parser argument tuple; parsers are built
+    from it on first use by whichever process runs the query.
+    """
+    if request.schema_id:
+        record = schema_registry.resolve(request.schema_id)
+        if record is None:
+            raise stale_schema_error(request.schema_id)
+        registration = record["registration"]
+        return record["fingerprint"], (
+            registration.schema,
+            registration.relationships,
+            registration.tableAliases,
+            registration.columnAliases,
+            registration.businessMetrics
+        )
+
+    if request.schema is None:
+        raise HTTPException(status_code=422, detail="Either schema_id or schema must be provided")
+
+    context = (
+        request.schema,
+        request.relationships,
+        request.tableAliases,
+        request.columnAliases,
+        request.businessMetrics
+    )
+    return schema_fingerprint(*context), context
+
+# -------- 6. WORKER POOL MODULE --------
+class PipelineBusyError(ServiceUnavailableError):
+    """Raised instead of queueing when the worker pool already has queue_depth jobs"""
+
+class SchemaContextMissing(Exception):
+    """A pool process has no parser for a fingerprint and the job was sent without its context"""
+
+def run_pipeline(text, fingerprint, context, parameterized, clean=True, stages=None):
+    """
+    CPU-bound part of a query: clean the (translated) text unless the caller already did,
+    then serve it from the result cache or parse it and generate SQL. Runs inline, on a pool thread or in a pool process;
+    a pool process uses its own NLTK resources, parser cache and result cache.
+    context may be None when the caller expects the parser to be cached already.
+    stages is passed on to parse_intent (see run_session_pipeline).
+    Returns (result, cached, timings) with timings as (histogram, label, seconds) triples,
+    so the stage and extractor histograms are recorded by the serving process (see
+    record_timings) whichever mode is used.
+    """
+    timings = []
+    cleaned_text = text
+    if clean:
+        started = time.perf_counter()
+        cleaned_text = get_preprocessor().clean_text(text)
+        timings.append((STAGE_SECONDS.name, "clean_text", time.perf_counter() - started))
+
+    # Identical questions against the same schema context produce identical SQL
+    result = result_cache.get(fingerprint, cleaned_text, parameterized)
+    if result is not None:
+        return result, True, timings
+
+    def build():
+        if context is None:
+            raise SchemaContextMissing(fingerprint)
+        return build_intent_parser(*context)
+
+    intent_parser = parser_cache.get_or_build(fingerprint, build)
+    extractor_timings = []
+    started = time.perf_counter()
+    intent = intent_parser.parse_intent(cleaned_text, extractor_timings, stages)
+    now = time.perf_counter()
+    timings.append((STAGE_SECONDS.name, "parse_intent", now - started))
+    timings.extend((EXTRACTOR_SECONDS.name, stage, seconds) for stage, seconds in extractor_timings)
+
+    result = result_cache.put(fingerprint, cleaned_text, parameterized, generate_result(intent, parameterized))
+    timings.append((STAGE_SECONDS.name, "generate_sql", time.perf_counter() - now))
+    return result, False, timings
+
+def run_session_pipeline(text, fingerprint, context, parameterized, stages):
+    """
+    run_pipeline for the cleaned text of a live transcript, reusing the extract stages of
+    its previous parse. Returns the updated stages with the result, since a pool process
+    works on a copy of them.
+    """
+    return run_pipeline(text, fingerprint, context, parameterized, False, stages), stages
+
+def record_timings(timings):
+    """Record the (histogram, label, seconds) timings returned by run_pipeline"""
+    for name, label, seconds in timings:
+        PIPELINE_HISTOGRAMS[name].observe(label, seconds)
+
+def init_pipeline_worker():
+    """Warm NLTK resources in a new pool process before it takes jobs"""
+    try:
+        load_nlp_resources()
+    except Exception:
+        # Jobs report the failure; /ready reflects the serving process only
+        pass
+
+class PipelineExecutor:
+    """
+    Runs run_pipeline inline on the event loop, or on a thread or process pool so that one
+    heavy query does not stall every other connection of the worker.
+    Thread workers share this process's caches, but parsing holds the GIL, so thread mode
+    keeps the loop responsive without adding throughput. Process workers (spawned, not
+    forked, since the logging and HTTP client threads are already running) each keep
+    their own warm caches and scale with cores. Jobs are sent to them without the schema
+    context, which can be large; a worker that has no parser for it asks for a resend.
+    """
+    MODES = ("inline", "thread", "process")
+
+    def __init__(self, mode=PIPELINE_EXECUTOR, workers=PIPELINE_WORKERS, queue_depth=PIPELINE_QUEUE_DEPTH):
+        if mode not in self.MODES:
+            raise ValueError(f"PIPELINE_EXECUTOR must be one of {self.MODES}, got {mode!r}")
+        self.mode = mode
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.pending = 0  # jobs queued or running; only touched from the event loop
+        self.completed = 0
+        self.rejected = 0
+        self._pool = None
+
+    async def start(self):
+        if self.mode == "thread":
+            self._pool = concurrent.futures.ThreadPoolExecutor(self.workers, thread_name_prefix="pipeline")
+        elif self.mode == "process":
+            self._pool = concurrent.futures.ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_pipeline_worker
             )
-            sql_generator = EnhancedSQLGenerator()
+            # Spawn the workers now rather than on the first query
+            await asyncio.get_running_loop().run_in_executor(self._pool, os.getpid)
+        if self._pool is not None:
+            logger.info("Pipeline runs on a %s pool of %d workers", self.mode, self.workers)
 
-            # Process the input text
-            text = request.query
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
 
-            # Detect language and translate if necessary
-            detected_lang = language_processor.detect_language(text)
-            if detected_lang != "en":
-                text = language_processor.translate_to_english(text, detected_lang)
+    async def run(self, text, fingerprint, context, parameterized, clean=True):
+        return await self.submit(run_pipeline, text, fingerprint, context, parameterized, clean)
 
-            # Clean and preprocess text
-            cleaned_text = preprocessor.clean_text(text)
+    async def run_session(self, text, fingerprint, context, parameterized, stages):
+        return await self.submit(run_session_pipeline, text, fingerprint, context, parameterized, stages)
 
-            # Parse intent
-            intent = intent_parser.parse_intent(cleaned_text)
+    async def submit(self, job, text, fingerprint, context, *args):
+        """Run job(text, fingerprint, context, *args), a run_pipeline variant, in this executor's mode"""
+        if self._pool is None:
+            self.completed += 1
+            return job(text, fingerprint, context, *args)
 
-            # Generate SQL
-            sql = sql_generator.generate_sql(intent)
+        if self.queue_depth and self.pending >= self.queue_depth:
+            self.rejected += 1
+            raise PipelineBusyError(f"{self.pending} queries are already queued or running; retry shortly")
 
-            return QueryResponse(
-                    query=sql,
-                    success=True
-                )
+        loop = asyncio.get_running_loop()
+        self.pending += 1
+        try:
+            if self.mode == "thread":
+                # Keep the request id on log records written from the pool thread
+                call = functools.partial(contextvars.copy_context().run, job, text, fingerprint, context, *args)
+                return await loop.run_in_executor(self._pool, call)
+            try:
+                return await loop.run_in_executor(self._pool, job, text, fingerprint, None, *args)
+            except SchemaContextMissing:
+                return await loop.run_in_executor(self._pool, job, text, fingerprint, context, *args)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self):
+        return {
+            "mode": self.mode,
+            "workers": self.workers if self._pool is not None else 0,
+            "queue_depth": self.queue_depth,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+pipeline_executor = PipelineExecutor()
+
+# -------- 7. LIVE TRANSCRIPT SESSIONS --------
+class TranscriptSession:
+    """
+    State of one live transcript on /process-query/session.
+    Cleaning works word by word, so the cleaned tokens of every settled word (one followed
+    by whitespace) are kept and only new words and the word still being spoken are cleaned
+    again. Parsing and SQL generation only run when the cleaned text changes; filler and
+    stop words leave the last result in place. The extract stages of the last parse are
+    kept too, and a stage runs again only when what it reads changed (see
+    EnhancedIntentParser.STAGE_INPUTS): tables, joins and columns carry over while the
+    speaker says words that name no table, column or metric. Non-English transcripts are translated as a
+    whole, so they are re-cleaned in full. While the speaker talks they are translated with
+    the phrase tables only, and the provisional result is parsed from that partial
+    translation; the translation API is called for interim transcripts only after a pause
+    (see refresh_loop in process_query_session) and for the final transcript.
+    """
+    def __init__(self, fingerprint, context, parameterized):
+        self.fingerprint = fingerprint
+        self.context = context
+        self.parameterized = parameterized
+        self.transcript = ""
+        self.finished = False
+        self.refreshed_for = None  # transcript the current result reflects
+        self.translation_pending = False  # the current result is parsed from a partial local translation
+        self.cleaned_text = None
+        self.result = None
+        self._words = []  # settled words of the transcript
+        self._tokens = []  # cleaned text of each settled word ("" when it cleans away)
+        self._stages = {}  # extract stage -> inputs and output in the last parse
+        self.updates = 0
+
+    def apply(self, message):
+        """Apply a client message: {"delta": ...} appends, {"transcript": ...} replaces"""
+        if not isinstance(message, dict):
+            raise ValueError("session messages must be JSON objects")
+        if message.get("transcript") is not None:
+            self.transcript = str(message["transcript"])
+        if message.get("delta"):
+            self.transcript += str(message["delta"])
+        if message.get("final"):
+            self.finished = True
+
+    def clean(self, text):
+        """clean_text(text), re-cleaning only the words that changed since the last call"""
+        preprocessor = get_preprocessor()
+        words = text.split()
+        tail = None
+        if words and not text[-1].isspace():
+            tail = words.pop()
+
+        # Keep the common prefix; speech recognisers may revise the last few words
+        keep = 0
+        for old, new in zip(self._words, words):
+            if old != new:
+                break
+            keep += 1
+        del self._words[keep:], self._tokens[keep:]
+        for word in words[keep:]:
+            self._words.append(word)
+            self._tokens.append(preprocessor.clean_text(word))
+
+        parts = [tokens for tokens in self._tokens if tokens]
+        if tail is not None:
+            tail_tokens = preprocessor.clean_text(tail)
+            if tail_tokens:
+                parts.append(tail_tokens)
+        return " ".join(parts)
+
+    async def refresh(self, translate=True):
+        """
+        Bring the result up to date with the transcript; True when the SQL changed.
+        With translate=False a non-English transcript the phrase tables do not cover is
+        parsed from its partial local translation, and translation_pending is set until a
+        refresh with the translation API runs for it.
+        """
+        text = self.transcript
+        if text == self.refreshed_for and not (translate and self.translation_pending):
+            return False
+
+        started = time.perf_counter()
+        detected_lang, _ = language_processor.detect_language(text)
+        started = STAGE_SECONDS.observe_since("detect_language", started)
+        pending = False
+        if detected_lang == "en":
+            cleaned_text = self.clean(text)
+        else:
+            if translate:
+                translated = await language_processor.translate_to_english(text, detected_lang)
+                started = STAGE_SECONDS.observe_since("translate_to_english", started)
+            else:
+                translated, tier = language_processor.translate_locally(text, detected_lang)
+                pending = tier is None
+            cleaned_text = get_preprocessor().clean_text(translated)
+        STAGE_SECONDS.observe_since("clean_text", started)
+
+        # A result parsed from a partial translation is kept as the provisional one until
+        # the translated refresh for the same transcript replaces it
+        self.translation_pending = pending
+        if cleaned_text == self.cleaned_text:
+            self.refreshed_for = text
+            SESSION_UPDATES_TOTAL.inc("unchanged")
+            return False
+
+        (result, _, timings), self._stages = await pipeline_executor.run_session(
+            cleaned_text, self.fingerprint, self.context, self.parameterized, self._stages
+        )
+        record_timings(timings)
+        self.refreshed_for = text
+        self.cleaned_text = cleaned_text
+        SESSION_UPDATES_TOTAL.inc("recomputed")
+        if result == self.result:
+            return False
+        self.result = result
+        self.updates += 1
+        return True
+
+    def message(self, kind):
+        """Provisional or final message pushed to the client"""
+        response = result_response(self.result) if self.result is not None else QueryResponse(success=True)
+        return {"type": kind, "seq": self.updates, "transcript": self.refreshed_for, **jsonable_encoder(response)}
+
+# -------- API ROUTES --------
+def result_response(result):
+    """QueryResponse for a (sql, params, template fingerprint) pipeline result"""
+    sql, params, template = result
+    return QueryResponse(
+        query=sql,
+        success=True,
+        params=params,
+        template_fingerprint=template
+    )
+
+def generate_result(intent, parameterized):
+    """(sql, params, template fingerprint) for a parsed intent, as stored in the result cache"""
+    if not parameterized:
+        return sql_generator.generate_sql(intent), None, None
+    values = []
+    sql = sql_generator.generate_sql(intent, values)
+    params = tuple(SqlParameter(value=value, type=parameter_type(value)) for value in values)
+    return sql, params, template_fingerprint(sql, values)
+
+async def process_text(text, fingerprint, context, parameterized=False):
+    """
+    QueryResponse for a natural language query. Concurrent requests for the same query
+    against the same schema context share one run of the pipeline and its response.
+    """
+    return await query_flight.run(
+        (fingerprint, text, parameterized),
+        lambda: compute_response(text, fingerprint, context, parameterized)
+    )
 
+async def compute_response(text, fingerprint, context, parameterized):
+    """Run one natural language query through the pipeline and wrap the outcome in a QueryResponse"""
+    try:
+        started = time.perf_counter()
+
+        # Detect language and translate if necessary
+        detected_lang, confidence = language_processor.detect_language(text)
+        started = STAGE_SECONDS.observe_since("detect_language", started)
+        if detected_lang != "en":
+            logger.debug("Detected language %s (confidence %.2f)", detected_lang, confidence)
+            text = await language_processor.translate_to_english(text, detected_lang)
+            STAGE_SECONDS.observe_since("translate_to_english", started)
+
+        # Clean, parse and generate SQL, inline or on the worker pool
+        result, cached, timings = await pipeline_executor.run(text, fingerprint, context, parameterized)
+        record_timings(timings)
+
+        QUERIES_TOTAL.inc("cache_hit" if cached else "ok")
+        return result_response(result)
+
+    except ServiceUnavailableError:
+        QUERIES_TOTAL.inc("rejected")
+        raise
+
+    except Exception as e:
+        QUERIES_TOTAL.inc("error")
+        logger.exception("Error processing query")
+        return QueryResponse(
+            query=None,
+            success=False,
+            error=str(e)
+        )
+
+@app.exception_handler(ServiceUnavailableError)
+async def service_unavailable_handler(request, exc):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+@app.post("/process-query", response_model=QueryResponse)
+async def process_query(request: QueryRequest):
+    """Process a natural language query and return SQL results"""
+    # Resolved before processing so a stale schema_id surfaces as HTTP 410
+    fingerprint, context = resolve_schema_context(request)
+    logger.info("Received query request", extra={"schema_id": request.schema_id, "query_chars": len(request.query)})
+    logger.debug("Query request: %s", request)
+
+    return await process_text(request.query, fingerprint, context, request.parameterized)
+
+@app.post("/process-query/batch", response_model=BatchQueryResponse)
+async def process_query_batch(request: BatchQueryRequest):
+    """Process many queries against one schema context, optionally streaming NDJSON results"""
+    # The schema context is resolved once and shared by every query in the batch
+    fingerprint, context = resolve_schema_context(request)
+    logger.info("Received batch of %d queries", len(request.queries), extra={"schema_id": request.schema_id})
+
+    async def process_item(text):
+        try:
+            return await process_text(text, fingerprint, context, request.parameterized)
+        except ServiceUnavailableError as e:
+            # A rejected query fails its own item; results already computed are kept
+            return QueryResponse(success=False, error=str(e))
+
+    if request.stream:
+        async def stream_results():
+            # One at a time, so lines go out in query order as soon as each is ready
+            for index, text in enumerate(request.queries):
+                response = await process_item(text)
+                yield json.dumps({"index": index, **jsonable_encoder(response)}) + "\n"
+
+        return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+    # A few queries run at once, so translation round trips overlap without one batch
+    # filling the worker pool queue
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def bounded_item(text):
+        async with limit:
+            return await process_item(text)
+
+    return BatchQueryResponse(results=await asyncio.gather(*(bounded_item(text) for text in request.queries)))
+
+@app.websocket("/process-query/session")
+async def process_query_session(websocket: WebSocket):
+    """
+    Live transcript session. The first message carries the schema context (the fields of
+    /process-query without query). The client then sends {"delta": "..."} to append to the
+    transcript or {"transcript": "..."} to replace it, and finally {"final": true}, which may
+    carry a last delta. The server pushes {"type": "provisional", ...} whenever the SQL
+    changes and {"type": "final", ...} before closing; both carry the QueryResponse fields.
+    """
+    await websocket.accept()
+    request_id_var.set(websocket.headers.get("x-request-id") or uuid.uuid4().hex)
+    try:
+        start = SessionStart(**await websocket.receive_json())
+        fingerprint, context = resolve_schema_context(start)
+    except (ValidationError, TypeError, ValueError, HTTPException) as e:
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        await websocket.send_json({"type": "error", "error": detail})
+        await websocket.close(code=1008)
+        return
+    except WebSocketDisconnect:
+        return
+
+    session = TranscriptSession(fingerprint, context, start.parameterized)
+    logger.info("Transcript session started", extra={"schema_id": start.schema_id})
+    changed = asyncio.Event()
+
+    async def refresh_loop():
+        # Deltas that arrive while a refresh runs are coalesced into the next one
+        while True:
+            await changed.wait()
+            changed.clear()
+            if session.finished:
+                return
+            try:
+                if await session.refresh(translate=False):
+                    await websocket.send_json(session.message("provisional"))
+                # Call the translation API once per pause in speech rather than once per word
+                if session.translation_pending:
+                    try:
+                        await asyncio.wait_for(changed.wait(), SESSION_TRANSLATE_PAUSE_SECONDS)
+                    except asyncio.TimeoutError:
+                        if await session.refresh():
+                            await websocket.send_json(session.message("provisional"))
+            except ServiceUnavailableError:
+                # Provisional results are best effort; the next delta tries again
+                pass
+            except Exception as e:
+                logger.exception("Error refreshing transcript session")
+                await websocket.send_json({"type": "error", "error": str(e)})
+
+    refresher = asyncio.create_task(refresh_loop())
+    try:
+        while not session.finished:
+            try:
+                session.apply(await websocket.receive_json())
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "error": str(e)})
+            changed.set()
+
+        # Let an in-flight refresh finish; the final result usually reuses it
+        await refresher
+        try:
+            await session.refresh()
+            QUERIES_TOTAL.inc("ok")
+            SESSION_UPDATES_TOTAL.inc("final")
+            await websocket.send_json(session.message("final"))
         except Exception as e:
-            import traceback
-            error_details = traceback.format_exc()
-            print(f"Error processing query: {error_details}")
-            return QueryResponse(
-                query=None,
-                success=False,
-                error=str(e)
-            )
\ No newline at end of file
+            QUERIES_TOTAL.inc("rejected" if isinstance(e, ServiceUnavailableError) else "error")
+            logger.exception("Error finishing transcript session")
+            await websocket.send_json({"type": "final", "success": False, "error": str(e)})
+        await websocket.close()
+    except WebSocketDisconnect:
+        logger.info("Transcript session disconnected")
+    finally:
+        refresher.cancel()
+
+@app.post("/schemas", response_model=SchemaRegistrationResponse)
+async def register_schema(registration: SchemaRegistration):
+    """Register a schema context and return the schema_id to send with /process-query"""
+    record = schema_registry.register(registration)
+    return SchemaRegistrationResponse(
+        schema_id=record["schema_id"],
+        name=record["name"],
+        version=record["version"],
+        fingerprint=record["fingerprint"]
+    )
+
+@app.get("/schemas/{schema_id}", response_model=SchemaRegistrationResponse)
+async def get_schema(schema_id: str):
+    """Check whether a schema_id is still current"""
+    record = schema_registry.resolve(schema_id)
+    if record is None:
+        raise stale_schema_error(schema_id)
+    return SchemaRegistrationResponse(
+        schema_id=record["schema_id"],
+        name=record["name"],
+        version=record["version"],
+        fingerprint=record["fingerprint"]
+    )
+
+@app.delete("/schemas/{schema_id}")
+async def delete_schema(schema_id: str):
+    """Drop a registered schema context"""
+    if schema_registry.unregister(schema_id) is None:
+        raise stale_schema_error(schema_id)
+    return {"success": True}
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: OK only once the tokenizer, stopwords and lemmatizer are warm"""
+    is_ready = preprocessor is not None and all(NLP_STATE[key] for key in ("tokenizer", "stopwords", "lemmatizer"))
+    if not is_ready:
+        raise HTTPException(status_code=503, detail={"ready": False, **NLP_STATE})
+    return {"ready": True, **NLP_STATE}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition of stage latencies, query/translation counters and cache counters"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+
+    # Cache counters are kept by the caches themselves and only read at scrape time
+    caches = {
+        "parser": parser_cache.stats(),
+        "result": result_cache.stats(),
+        "translation": translation_cache.stats(),
+    }
+    hit_fields = {"parser": ["hits"], "result": ["hits"], "translation": ["memory_hits", "disk_hits"]}
+    entry_fields = {"parser": "entries", "result": "entries", "translation": "memory_entries"}
+    lines += ["# HELP nl2sql_cache_hits_total Cache lookups served from the cache",
+              "# TYPE nl2sql_cache_hits_total counter"]
+    for cache, stats in caches.items():
+        lines.append(f"nl2sql_cache_hits_total{format_labels([('cache', cache)])} {sum(stats[f] for f in hit_fields[cache])}")
+    lines += ["# HELP nl2sql_cache_misses_total Cache lookups that missed",
+              "# TYPE nl2sql_cache_misses_total counter"]
+    for cache, stats in caches.items():
+        lines.append(f"nl2sql_cache_misses_total{format_labels([('cache', cache)])} {stats['misses']}")
+    lines += ["# HELP nl2sql_cache_entries Entries currently held in memory",
+              "# TYPE nl2sql_cache_entries gauge"]
+    for cache, stats in caches.items():
+        lines.append(f"nl2sql_cache_entries{format_labels([('cache', cache)])} {stats[entry_fields[cache]]}")
+    translations = language_processor.stats()
+    lines += ["# HELP nl2sql_translations_total Non-English queries translated, by serving tier",
+              "# TYPE nl2sql_translations_total counter"]
+    for source in ("local", "cache", "remote", "fallback"):
+        lines.append(f"nl2sql_translations_total{format_labels([('source', source)])} {translations[source]}")
+    lines += ["# HELP nl2sql_translation_local_share Share of translations served by the local phrase tables",
+              "# TYPE nl2sql_translation_local_share gauge",
+              f"nl2sql_translation_local_share {translations['local_share']}"]
+    lines += ["# HELP nl2sql_parser_cache_bytes Estimated bytes held by cached schema parsers",
+              "# TYPE nl2sql_parser_cache_bytes gauge",
+              f"nl2sql_parser_cache_bytes {caches['parser']['bytes']}"]
+    lines += ["# HELP nl2sql_log_records_dropped_total Log records dropped because the log queue was full",
+              "# TYPE nl2sql_log_records_dropped_total counter",
+              f"nl2sql_log_records_dropped_total {log_handler.dropped}"]
+    lines += ["# HELP nl2sql_pipeline_pending Queries queued or running on the worker pool",
+              "# TYPE nl2sql_pipeline_pending gauge",
+              f"nl2sql_pipeline_pending {pipeline_executor.pending}"]
+
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss counters and occupancy of the parser, result and translation caches, the
+    translations served by each tier, the lemma cache occupancy, and the worker pool state
+    (in process mode the parser, result and lemma caches live in the workers)
+    """
+    return {
+        "parser_cache": parser_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "translation_cache": translation_cache.stats(),
+        "translation_sources": language_processor.stats(),
+        "lemma_cache": preprocessor.stats() if preprocessor is not None else None,
+        "pipeline": pipeline_executor.stats()
+    }